@@ -0,0 +1,637 @@
+#
+# mkFixture.py
+#
+# Usage:
+#       % python mkFixture.py [options] --sqlite FILE
+#       % python mkFixture.py [options] -p PROPERTIES
+#
+# Builds a synthetic MGI database, for benchmarking the dumpers without access to the
+# production database (see runBench.py). Only the tables and columns the dumpers read
+# are created (see libdump/mgischema.py), and filled with made up but plausible data: markers
+# (mouse and human), homology clusters, references, strains, alleles, cell lines,
+# genotypes, GO/MP/DO annotations with evidence, relationships, GXD assays (gel and
+# in situ), HT experiments, accession ids, synonyms and notes.
+#
+# The shapes follow production: most objects have a few references, annotations or
+# notes and a few have very many (skewed, zipf-like choices), notes are split into
+# 255 character chunks, ids are a mix of preferred and secondary, etc. Row counts grow
+# linearly with the scale factor; at scale 1, there are 2500 mouse markers, 2000 alleles,
+# 6000 annotations and 800 assays (about 60,000 items dumped). The data are random but
+# reproducible: the same scale and seed always give the same database.
+#
+# The database is either a SQLite file (for dumpMgiItemXml.py --sqlite), or a scratch
+# Postgres database, given by a mousemine.properties style file (as for -p). Existing
+# tables of the same names are dropped first. Don't point this at a real MGI database.
+#
+# Options:
+#       -s, --scale F    scale factor (default: 1)
+#       --seed N         random seed (default: 1)
+#       --sqlite FILE    write a SQLite database (the file is replaced)
+#       -p, --properties FILE   load into the Postgres database in this properties file
+#       --source NAME    the data source in the properties file (default: as the dumper)
+#
+
+import sys
+import os
+import io
+import time
+import random
+import string
+import getopt
+import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from libdump.mgischema import TABLES
+from libdump.Snapshot import SqliteWriter, indexedColumns
+
+MOUSE_CHRS = [str(i) for i in range(1,20)] + ['X','Y']
+HUMAN_CHRS = [str(i) for i in range(1,23)] + ['X','Y']
+MCV_TERMS = ['protein coding gene','gene','pseudogene','lncRNA gene','miRNA gene','QTL',
+             'other genome feature','DNA segment','transgene','complex/cluster/region']
+
+# Rows go to the sink in batches of this many, per table.
+BATCH = 20000
+
+class Generator:
+    def __init__(self, sink, scale=1.0, seed=1):
+        self.sink = sink
+        self.sf = scale
+        self.rnd = random.Random(seed)
+        self.rows = {}          # table -> rows not yet written
+        self.counts = {}        # table -> rows generated
+        self.nextTerm = 5000000
+        self.nextAcc = 1
+        self.base = datetime.datetime(2020,1,1)
+
+    def n(self, base):
+        return max(1, int(base * self.sf))
+
+    def add(self, table, *row):
+        rows = self.rows.setdefault(table, [])
+        rows.append(row)
+        self.counts[table] = self.counts.get(table, 0) + 1
+        if len(rows) >= BATCH:
+            self.sink.write(table, rows)
+            self.rows[table] = []
+
+    def flush(self):
+        for table, rows in self.rows.items():
+            if rows:
+                self.sink.write(table, rows)
+        self.rows = {}
+
+    def date(self):
+        return self.base + datetime.timedelta(days=self.rnd.randint(0, 1500), seconds=self.rnd.randint(0,86399))
+
+    def word(self, k=6):
+        return ''.join(self.rnd.choice(string.ascii_lowercase) for _ in range(k))
+
+    def text(self, nwords):
+        return ' '.join(self.word(self.rnd.randint(2,9)) for _ in range(nwords))
+
+    def zipf(self, n, s=1.3):
+        # skewed choice in 0..n-1
+        x = int(n * (self.rnd.random() ** (s*2)))
+        return min(x, n-1)
+
+    def term(self, vocab, term, key=None, abbrev=None):
+        if key is None:
+            key = self.nextTerm
+            self.nextTerm += 1
+        self.add('VOC_Term', key, vocab, term, abbrev, 1)
+        return key
+
+    def acc(self, accid, ldb, okey, mgitype, preferred=1, private=0, prefix=None):
+        k = self.nextAcc
+        self.nextAcc += 1
+        if prefix is None:
+            prefix = accid.split(':')[0]+':' if ':' in accid else ''
+        num = int(''.join(c for c in accid if c.isdigit()) or 0)
+        self.add('ACC_Accession', k, accid, prefix, num, ldb, okey, mgitype, private, preferred, self.date())
+        return k
+
+    def mgiid(self, okey, mgitype, offset):
+        return self.acc('MGI:%d' % (offset + okey), 1, okey, mgitype)
+
+    def note(self, okey, mgitype, notetype, text):
+        self.noteKey = getattr(self, 'noteKey', 0) + 1
+        self.add('MGI_Note', self.noteKey, okey, mgitype, notetype)
+        chunks = [text[i:i+255] for i in range(0, len(text), 255)] or ['']
+        for i, c in enumerate(chunks):
+            self.add('MGI_NoteChunk', self.noteKey, i+1, c)
+
+    def generate(self):
+        r = self.rnd
+        for k, nm in [(1,'Reference'),(2,'Marker'),(3,'Probe'),(6,'Antibody'),(8,'Assay'),(9,'Image'),
+                      (10,'Strain'),(11,'Allele'),(12,'Genotype'),(13,'Vocabulary Term'),(19,'Sequence'),
+                      (20,'Organism'),(25,'Annotation Evidence'),(27,'Chromosome'),(28,'Cell Line'),
+                      (42,'GXD HT Experiment'),(43,'GXD HT Sample')]:
+            self.add('ACC_MGIType', k, nm)
+        self.add('MGI_dbinfo', 'MGI 6.24', 'mgd', datetime.datetime(2026,10,1,4,0,0))
+        for k, cn, ln in [(1,'mouse, laboratory','Mus musculus/domesticus'),(2,'human','Homo sapiens'),
+                          (40,'rat','Rattus'),(97,'mouse, Mus caroli','Mus caroli'),
+                          (98,'mouse, Mus spretus','Mus spretus'),(130,'mouse, Mus pahari','Mus pahari')]:
+            self.add('MGI_Organism', k, cn, ln)
+        ldbs = [(1,'MGI'),(13,'SWISS-PROT'),(29,'PubMed'),(31,'GO'),(32,'Taxonomy'),(34,'MP'),(41,'TrEMBL'),
+                (55,'Entrez Gene'),(65,'Journal Link'),(169,'EMAPA'),(190,'GEO'),(189,'ArrayExpress'),
+                (191,'Disease Ontology'),(9,'Sequence DB'),(60,'Ensembl Gene Model')]
+        for i,(k,nm) in enumerate(ldbs):
+            self.add('ACC_LogicalDB', k, nm, nm + ' database', 1)
+            self.add('ACC_ActualDB', i+1, k, nm, 'http://example.org/%s/@@@@' % nm.lower().replace(' ','_'))
+        self.add('ACC_ActualDB', 100, 9, 'GenBank', 'http://genbank.example/@@@@')
+        # vocabularies
+        vocabs = [(4,31,'GO'),(5,34,'MP'),(125,191,'DO'),(90,169,'EMAPA'),(3,1,'GO Evidence'),
+                  (2,1,'MP Evidence'),(43,1,'DO Evidence'),(36,1,'Allele Molecular Mutation'),
+                  (92,1,'Allele Collection'),(93,1,'Allele Attribute'),(27,1,'Strain Attribute'),
+                  (122,1,'HT Variables'),(38,1,'Allele Type'),(35,1,'Inheritance'),(61,1,'Transmission'),
+                  (52,1,'GO Qualifier'),(53,1,'MP Qualifier'),(54,1,'DO Qualifier'),(39,1,'Pair State'),
+                  (42,1,'Compound'),(60,1,'Exists As'),(55,1,'Strain Type'),(62,1,'Cell Line Type'),
+                  (72,1,'Vector'),(64,1,'Vector Type'),(66,1,'Derivation Type'),(65,1,'Creator'),
+                  (94,1,'Rel Term'),(95,1,'Rel Qual'),(96,1,'Rel Evidence'),(97,1,'Rel Property'),
+                  (116,1,'HT Eval'),(117,1,'HT Curation'),(124,1,'HT Study'),(121,1,'HT Expt Type'),
+                  (119,1,'HT Source'),(120,1,'HT Relevance'),(17,1,'Sex'),(119+100,1,'Evidence Property')]
+        for vk, ldb, nm in vocabs:
+            self.add('VOC_Vocab', vk, ldb, nm)
+        T = {}
+        T['peer'] = self.term(131, 'Peer Reviewed Article', 31576687)
+        T['review'] = self.term(131, 'Review')
+        T['done'] = self.term(117, 'Done', 20475421)
+        T['notdone'] = self.term(117, 'Not Done')
+        T['hybrid'] = self.term(89, 'hybrid homology', 13764519)
+        T['compoundNA'] = self.term(42, 'Not Applicable', 847167)
+        T['hom'] = self.term(39, 'Homozygous', 847138)
+        T['het'] = self.term(39, 'Heterozygous', 847137)
+        T['normal'] = self.term(53, 'normal', 2181424)
+        T['NOT'] = self.term(54, 'NOT', 1614157)
+        alleleTypes = [self.term(38, 'Transgenic', 847127), self.term(38, 'Transgenic (Cre)', 847128),
+                       self.term(38, 'Transgenic (Reporter)', 847129), self.term(38, 'Endonuclease', 2327160),
+                       self.term(38, 'Targeted'), self.term(38, 'Gene trapped'), self.term(38, 'Spontaneous'),
+                       self.term(38, 'Chemically induced (ENU)')]
+        modes = [self.term(35, x) for x in ['Recessive','Dominant','Not Applicable','Codominant']]
+        trans = [self.term(61, x) for x in ['Germline','Chimeric','Not Applicable','Cell Line']]
+        colls = [self.term(92, x) for x in ['Not Specified','KOMP','EUCOMM','Sanger']]
+        mutations = [self.term(36, x) for x in ['Insertion','Intragenic deletion','Single point mutation','Not Applicable']]
+        aattrs = [self.term(93, x) for x in ['Null/knockout','Reporter','Recombinase','Not applicable','Conditional ready']]
+        sattrs = [self.term(27, x) for x in ['inbred strain','mutant strain','congenic','transgenic']]
+        stypes = [self.term(55, x) for x in ['Inbred Strain','Coisogenic','Not Specified']]
+        existsAs = [self.term(60, x) for x in ['Mouse Line','Cell Line','Chimeric']]
+        cltypes = [self.term(62, x) for x in ['Embryonic Stem Cell','Fibroblast']]
+        vectors = [self.term(72, x) for x in ['Not Specified','pGT0lxf','L1L2_Bact_P']]
+        vtypes = [self.term(64, x) for x in ['Gene trap','Targeting']]
+        dtypes = [self.term(66, x) for x in ['Gene trapped','Targeted']]
+        creators = [self.term(65, x) for x in ['KOMP','EUCOMM','Lexicon']]
+        relterms = [self.term(94, x) for x in ['interacts_with','has_member','mutation_involves','expresses']]
+        relquals = [self.term(95, x) for x in ['Not Specified','predicted']]
+        relevs = [self.term(96, x, abbrev=x) for x in ['IDA','TAS','IC']]
+        relprops = [self.term(97, x) for x in ['score','data_source','Non-mouse_Organism']]
+        hteval = [self.term(116, x) for x in ['Yes','No']]
+        htstudy = [self.term(124, x) for x in ['Baseline','WT vs. Mutant']]
+        httype = [self.term(121, x) for x in ['RNA-Seq','transcription profiling by array']]
+        htsrc = [self.term(119, x) for x in ['GEO','ArrayExpress']]
+        htrel = [self.term(120, x) for x in ['Yes','No','Not Specified']]
+        sexes = [self.term(17, x) for x in ['Female','Male','Pooled','Not Specified']]
+        htvars = [self.term(122, x) for x in ['age','genotype','sex','strain','treatment']]
+        T['pubmedprop'] = self.term(1100, 'PubMed ID')
+        T['sourceannot'] = self.term(1101, '_SourceAnnot_key')
+        T['sexprop'] = self.term(1101, 'sex')
+        # evidence vocab terms
+        goEv = [self.term(3, x, abbrev=x) for x in ['IDA','IEA','ISO','IMP','TAS']]
+        mpEv = [self.term(2, x, abbrev=x) for x in ['EXP']]
+        doEv = [self.term(43, x, abbrev=x) for x in ['TAS','ISS']]
+        goQual = [self.term(52, '', ), self.term(52, 'NOT')]
+        mpQual = [self.term(53, '')]
+        doQual = [self.term(54, '')]
+        # annotation types
+        for atk, mgt, vk, evk, qvk, nm in [(1000,2,4,3,52,'GO/Marker'),(1002,12,5,2,53,'Mammalian Phenotype/Genotype'),
+                (1020,12,125,43,54,'DO/Genotype'),(1022,2,125,43,54,'DO/Human Marker'),(1021,11,125,43,54,'DO/Allele'),
+                (1015,2,5,2,53,'MP/Marker (Derived)'),(1023,2,125,43,54,'DO/Marker (Derived)'),
+                (1014,11,93,None,None,'Allele/Attribute'),(1009,10,27,None,None,'Strain/Attribute')]:
+            self.add('VOC_AnnotType', atk, mgt, vk, evk, qvk, nm)
+        # ontology terms
+        goTerms = [self.term(4, 'go term %d' % i) for i in range(self.n(300))]
+        mpTerms = [self.term(5, 'mp term %d' % i) for i in range(self.n(300))]
+        doTerms = [self.term(125, 'do term %d' % i) for i in range(self.n(100))]
+        emapaTerms = [self.term(90, 'emapa term %d' % i) for i in range(self.n(200))]
+        for i,k in enumerate(goTerms): self.acc('GO:%07d'%(i+1), 31, k, 13)
+        for i,k in enumerate(mpTerms): self.acc('MP:%07d'%(i+1), 34, k, 13)
+        for i,k in enumerate(doTerms): self.acc('DOID:%d'%(i+1), 191, k, 13)
+        for i,k in enumerate(emapaTerms):
+            self.acc('EMAPA:%d'%(16000+i), 169, k, 13)
+            self.add('VOC_Term_EMAPA', k, 1, 28)
+        for st in range(1, 29):
+            self.add('GXD_TheilerStage', st, st)
+        # references
+        nrefs = self.n(2000)
+        for rk in range(1, nrefs+1):
+            nauth = r.randint(0, 8)
+            authors = '; '.join('%s %s' % (self.word(7).capitalize(), self.word(2).upper()) for _ in range(nauth)) if nauth else None
+            rtype = T['peer'] if r.random() < 0.85 else T['review']
+            title = self.text(r.randint(3, 12)).capitalize() + r.choice(['.', ''])
+            abstract = self.text(r.randint(20, 120)) if r.random() < 0.7 else None
+            self.add('BIB_Refs', rk, rtype, authors, title, r.choice(['J Biol Chem','Nature','Genesis','Dev Biol']),
+                     str(r.randint(1, 300)), str(r.randint(1,12)) if r.random() < .8 else None, str(r.randint(1970,2025)),
+                     r.randint(1970, 2025), '%d-%d' % (r.randint(1,100), r.randint(101,200)), abstract, self.date())
+            self.mgiid(rk, 1, 1000000)
+            self.acc('J:%d' % rk, 1, rk, 1)
+            if r.random() < 0.8:
+                self.acc(str(10000000 + rk), 29, rk, 1, prefix='')
+            if r.random() < 0.5:
+                self.acc('10.1000/%d' % rk, 65, rk, 1, prefix='')
+        # a duplicated pubmed id
+        self.acc(str(10000000 + 1), 29, 2, 1, prefix='')
+        self.nrefs = nrefs
+        # chromosomes
+        ck = 0
+        self.chr = {}
+        for ok, chrs in [(1, MOUSE_CHRS), (2, HUMAN_CHRS)]:
+            for i, c in enumerate(chrs):
+                ck += 1
+                self.add('MRK_Chromosome', ck, ok, c, i+1)
+                self.chr[(ok, c)] = ck
+        # markers
+        for k, nm in [(1,'Gene'),(2,'DNA Segment'),(3,'Cytogenetic Marker'),(6,'QTL'),(7,'Pseudogene'),
+                      (9,'Other Genome Feature'),(10,'Complex/Cluster/Region'),(12,'Transgene')]:
+            self.add('MRK_Types', k, nm)
+        nmouse = self.n(2500)
+        nhuman = self.n(600)
+        self.mouseMarkers = []
+        self.humanMarkers = []
+        mk = 0
+        for i in range(nmouse + nhuman):
+            mk += 1
+            ok = 1 if i < nmouse else 2
+            status = 1 if (ok == 2 or r.random() < 0.95) else 2
+            chrs = MOUSE_CHRS if ok == 1 else HUMAN_CHRS
+            c = r.choice(chrs)
+            mtype = 1 if r.random() < 0.8 else r.choice([2,3,6,7,9,10,12] if ok == 1 else [2,6,9])
+            sym = ('%s%d' % (self.word(3).capitalize(), i)) if ok == 1 else ('%s%d' % (self.word(3).upper(), i))
+            self.add('MRK_Marker', mk, ok, status, mtype, sym, 'name of ' + sym, c, self.date())
+            start = r.randint(1, 190000000) if r.random() < 0.95 else None
+            end = start + r.randint(100, 200000) if start is not None else None
+            gc = c if r.random() < 0.98 else r.choice(chrs)
+            self.add('MRK_Location_Cache', mk, ok, c, gc if start else None, start, end,
+                     r.choice(['+','-']) if start else None, 'GRCm39' if ok == 1 else 'GRCh38')
+            if ok == 1:
+                self.mgiid(mk, 2, 2000000)
+                if status == 1:
+                    self.mouseMarkers.append(mk)
+                self.add('MRK_MCV_Cache', mk, 1, r.choice(MCV_TERMS), 'D')
+                if r.random() < 0.02:
+                    self.add('MRK_MCV_Cache', mk, 1, r.choice(MCV_TERMS), 'D')
+                if r.random() < 0.01:
+                    # withdrawn-looking secondary MGI id
+                    self.acc('MGI:%d' % (9000000 + mk), 1, mk, 2, preferred=0)
+            else:
+                self.humanMarkers.append(mk)
+            if ok == 2 or r.random() < 0.7:
+                self.acc(str(100000 + mk), 55, mk, 2, prefix='')
+            if ok == 1 and r.random() < 0.3:
+                self.acc('ENSMUSG%011d' % mk, 60, mk, 2, prefix='')
+            # references
+            if ok == 1:
+                for j in range(self.zipf(20)):
+                    rk = 1 + self.zipf(nrefs)
+                    self.add('MRK_Reference', mk, rk, rk)
+            # labels
+            for j in range(r.randint(0, 3)):
+                self.add('MRK_Label', self.counts.get('MRK_Label', 0)+1, mk, ok, None,
+                         sym + '-syn%d' % j, r.choice(['MS','MN','MY','MS']))
+            # proteins
+            if ok == 1 and mtype == 1 and r.random() < 0.5:
+                for j in range(r.randint(1, 3)):
+                    self.add('SEQ_Marker_Cache', mk, 1, r.choice([13, 41]), 1, 'P%05d' % r.randint(1, nmouse*2))
+            # notes
+            if ok == 1 and r.random() < 0.3:
+                self.note(mk, 2, 1014, '<hr><B>Summary from NCBI RefSeq</B><BR><BR>' + self.text(r.randint(5, 100)))
+            if ok == 1 and r.random() < 0.2:
+                self.add('MRK_Notes', mk, self.text(r.randint(5, 40)))
+            if ok == 1 and r.random() < 0.05:
+                self.note(mk, 2, 1035, self.text(r.randint(5, 20)))
+        self.nmarkers = mk
+        # homology clusters
+        ck = 0
+        hm = list(self.humanMarkers)
+        r.shuffle(hm)
+        mm = list(self.mouseMarkers)
+        r.shuffle(mm)
+        cmk = 0
+        for i in range(min(len(hm), len(mm)) - 5):
+            ck += 1
+            self.add('MRK_Cluster', ck, 13764519)
+            members = [mm[i], hm[i]]
+            if r.random() < 0.05:
+                members.append(mm[-(i+1)])
+            for j, m in enumerate(members):
+                cmk += 1
+                self.add('MRK_ClusterMember', cmk, ck, m, j+1)
+        # strains
+        nstrains = self.n(300)
+        for sk in range(1, nstrains+1):
+            name = r.choice(['C57BL/6J','129S1','BALB/c','DBA/2J','CAROLI/EiJ','SPRET/EiJ','PAHARI/EiJ']) + '-%d' % sk
+            if sk <= 3:
+                name = ['CAROLI/EiJ','SPRET/EiJ','PAHARI/EiJ'][sk-1]
+            self.add('PRB_Strain', sk, name, r.choice(stypes), r.randint(0,1))
+            if r.random() < 0.8:
+                self.mgiid(sk, 10, 3000000)
+            for t in r.sample(sattrs, r.randint(0, 2)):
+                self.add('VOC_Annot', self.annotKey(), 1009, sk, t, mpQual[0], self.date())
+            for j in range(r.randint(0, 2)):
+                self.add('MGI_Reference_Assoc', self.assocKey(), 1 + self.zipf(nrefs), sk, 10, r.choice([1009, 1010]))
+            if r.random() < 0.3:
+                self.add('MGI_Synonym', self.synKey(), sk, 10, name + '-alias')
+        self.add('MGI_RefAssocType', 1009, 10, 'Selected')
+        self.add('MGI_RefAssocType', 1010, 10, 'Original')
+        self.add('MGI_RefAssocType', 1011, 11, 'Original')
+        self.add('MGI_RefAssocType', 1012, 11, 'Used-FC')
+        self.add('MGI_RefAssocType', 1013, 11, 'Indexed')
+        # alleles
+        nalleles = self.n(2000)
+        self.alleles = []
+        for ak in range(1, nalleles+1):
+            mk = r.choice(self.mouseMarkers) if r.random() < 0.95 else None
+            wt = 1 if r.random() < 0.05 else 0
+            sym = 'A%d<tm%d>' % (ak, r.randint(1,9))
+            self.add('ALL_Allele', ak, mk, 1 + self.zipf(nstrains), sym, 'allele ' + sym, wt, 0, 0,
+                     r.choice(alleleTypes), r.choice(modes), r.choice(trans), r.choice(colls), self.date())
+            self.mgiid(ak, 11, 4000000)
+            if r.random() < 0.05:
+                self.acc('MGI:%d' % (8000000 + ak), 1, ak, 11, preferred=0)
+            self.alleles.append((ak, mk))
+            for m in r.sample(mutations, r.randint(0, 2)):
+                self.add('ALL_Allele_Mutation', ak, m)
+            for t in r.sample(aattrs, r.randint(0, 2)):
+                self.add('VOC_Annot', self.annotKey(), 1014, ak, t, mpQual[0], self.date())
+            for j in range(self.zipf(8) + 1):
+                self.add('MGI_Reference_Assoc', self.assocKey(), 1 + self.zipf(nrefs), ak, 11, r.choice([1011,1012,1013]))
+            if r.random() < 0.3:
+                self.add('ALL_Label', ak, sym + '-syn', 'synonym')
+            if r.random() < 0.2:
+                self.add('MGI_Synonym', self.synKey(), ak, 11, sym + '-alias')
+            if r.random() < 0.3:
+                self.add('PRB_Strain_Marker', self.smKey(), 1 + self.zipf(nstrains), mk, ak)
+            if r.random() < 0.4:
+                self.note(ak, 11, 1020, self.text(r.randint(5, 150)))
+            if r.random() < 0.3:
+                self.note(ak, 11, 1021, self.text(r.randint(5, 60)))
+            if r.random() < 0.05:
+                self.note(ak, 11, 1032, 'Induced by ' + self.word(6) + '.')
+            if r.random() < 0.05:
+                self.note(ak, 11, 1034, 'driver')
+                self.add('MGI_Relationship', self.relKey(), 1006, ak, r.choice(self.mouseMarkers),
+                         relterms[3], relquals[0], relevs[0], 1 + self.zipf(nrefs))
+        # cell lines
+        ncl = self.n(400)
+        for dk in range(1, self.n(40)+1):
+            self.add('ALL_CellLine_Derivation', dk, 'deriv %d' % dk, r.choice(vectors), r.choice(vtypes),
+                     r.randint(1, ncl), r.choice(dtypes), r.choice(creators), (1 + self.zipf(nrefs)) if r.random() < .5 else None)
+        for ck in range(1, ncl+1):
+            self.add('ALL_CellLine', ck, 'CL-%d' % ck, 1, r.choice(cltypes), 1 + self.zipf(nstrains),
+                     r.randint(1, self.n(40)) if r.random() < 0.7 else None)
+        for i in range(self.n(500)):
+            self.add('ALL_Allele_CellLine', i+1, r.randint(1, nalleles), r.randint(1, ncl))
+        # genotypes
+        ngeno = self.n(1500)
+        apk = 0
+        self.genotypes = list(range(1, ngeno+1))
+        for gk in self.genotypes:
+            cond = 1 if r.random() < 0.1 else 0
+            self.add('GXD_Genotype', gk, 1 + self.zipf(nstrains), cond, self.text(4) if r.random() < 0.1 else None,
+                     r.choice(existsAs), self.date())
+            self.mgiid(gk, 12, 5000000)
+            for j in range(1 + self.zipf(3)):
+                ak, mk = r.choice(self.alleles)
+                if mk is None:
+                    continue
+                ak2 = r.choice(self.alleles)[0] if r.random() < 0.3 else None
+                apk += 1
+                self.add('GXD_AllelePair', apk, gk, ak, ak2, r.randint(1, ncl) if r.random() < 0.2 else None, None,
+                         mk, r.choice([T['hom'], T['het']]), r.choice([T['compoundNA'], T['compoundNA'], 847168]), j+1)
+                self.add('GXD_AlleleGenotype', gk, ak, mk)
+                if ak2:
+                    self.add('GXD_AlleleGenotype', gk, ak2, mk)
+        # annotations
+        for i in range(self.n(6000)):
+            atk = r.choice([1000,1000,1000,1002,1002,1020,1022,1021])
+            if atk == 1000:
+                obj, term, q, ev = r.choice(self.mouseMarkers), r.choice(goTerms), r.choice(goQual), goEv
+            elif atk == 1002:
+                obj, term, q, ev = r.choice(self.genotypes), r.choice(mpTerms), r.choice([mpQual[0], mpQual[0], T['normal']]), mpEv
+            elif atk == 1020:
+                obj, term, q, ev = r.choice(self.genotypes), r.choice(doTerms), r.choice([doQual[0], T['NOT']]), doEv
+            elif atk == 1022:
+                obj, term, q, ev = r.choice(self.humanMarkers), r.choice(doTerms), doQual[0], doEv
+            else:
+                obj, term, q, ev = r.choice(self.alleles)[0], r.choice(doTerms), doQual[0], doEv
+            ak = self.annotKey()
+            self.add('VOC_Annot', ak, atk, obj, term, q, self.date())
+            for j in range(1 + self.zipf(3)):
+                ek = self.evKey()
+                self.add('VOC_Evidence', ek, ak, r.choice(ev), 1 + self.zipf(nrefs),
+                         ('MGI:%d' % r.randint(1,999999)) if r.random() < 0.2 else None, self.date(), self.date())
+                if atk == 1002 and r.random() < 0.2:
+                    self.add('VOC_Evidence_Property', self.epKey(), ek, T['sexprop'], 1, 1, r.choice(['M','F','NA']))
+                if r.random() < 0.05:
+                    self.note(ek, 25, r.choice([1008, 1015, 1031]), self.text(r.randint(3, 30)))
+        # relationships
+        self.add('MGI_Relationship_Category', 1001, 'interacts_with', 2, 2)
+        self.add('MGI_Relationship_Category', 1002, 'cluster_has_member', 2, 2)
+        self.add('MGI_Relationship_Category', 1003, 'mutation_involves', 11, 2)
+        self.add('MGI_Relationship_Category', 1004, 'expresses_component', 11, 2)
+        self.add('MGI_Relationship_Category', 1006, 'driver_component', 11, 2)
+        for cat in [1001, 1002, 1003, 1004]:
+            for i in range(self.n(150)):
+                if cat in (1001, 1002):
+                    o1 = r.choice(self.mouseMarkers)
+                else:
+                    o1 = r.choice(self.alleles)[0]
+                rk = self.relKey()
+                self.add('MGI_Relationship', rk, cat, o1, r.choice(self.mouseMarkers), r.choice(relterms),
+                         r.choice(relquals), r.choice(relevs), 1 + self.zipf(nrefs))
+                for j in range(r.randint(0, 2)):
+                    self.add('MGI_Relationship_Property', self.rpKey(), rk, r.choice(relprops), self.word(5), j+1)
+        # expression
+        for k, nm in [(1,'RNA In Situ'),(2,'Northern blot'),(3,'Nuclease S1'),(4,'RNase protection'),
+                      (5,'RT-PCR'),(6,'Immunohistochemistry'),(8,'Western blot'),(9,'In situ reporter (knock in)'),
+                      (10,'In situ reporter (transgenic)'),(11,'Recombinase reporter')]:
+            self.add('GXD_AssayType', k, nm)
+        strengths = [(-2,'Not Applicable'),(-1,'Not Specified'),(1,'Absent'),(2,'Present'),(3,'Ambiguous'),
+                     (4,'Trace'),(5,'Weak'),(6,'Moderate'),(7,'Strong'),(8,'Very strong')]
+        for k, s in strengths:
+            self.add('GXD_Strength', k, s)
+        for k, p in enumerate(['Not Specified','Homogeneous','Regionally restricted','Not Applicable']):
+            self.add('GXD_Pattern', k+1, p)
+        nassays = self.n(800)
+        ipk = 0
+        for ik in range(1, self.n(200)+1):
+            self.add('IMG_Image', ik, r.randint(100, 800) if r.random() < 0.9 else None, ('Fig %d' % ik) if r.random() < 0.9 else None)
+            for j in range(r.randint(1, 3)):
+                ipk += 1
+                self.add('IMG_ImagePane', ipk, ik)
+        sk = rk_ = glk = gbk = 0
+        for ak in range(1, nassays+1):
+            atype = r.choice([1,1,1,2,5,6,8,9,10])
+            probe = antibody = None
+            if atype in (1,2,5):
+                probe = ak
+                self.add('GXD_ProbePrep', ak, ak)
+                self.acc('MGI:%d' % (6000000+ak), 1, ak, 3)
+            elif atype in (6,8):
+                antibody = ak
+                self.add('GXD_AntibodyPrep', ak, ak)
+                self.acc('MGI:%d' % (6500000+ak), 1, ak, 6)
+            self.add('GXD_Assay', ak, atype, r.choice(self.mouseMarkers), 1 + self.zipf(nrefs), probe, antibody,
+                     r.randint(1, ipk) if r.random() < 0.5 else None, self.date())
+            self.mgiid(ak, 8, 7000000)
+            if atype in (2, 8):
+                for j in range(r.randint(1, 6)):
+                    glk += 1
+                    self.add('GXD_GelLane', glk, ak, r.choice(self.genotypes), r.choice([1,1,1,2]),
+                             r.choice(['Female','Male','Pooled']), 'postnatal day %d' % r.randint(1,30), j+1)
+                    for s in r.sample(emapaTerms, r.randint(1, 3)):
+                        self.add('GXD_GelLaneStructure', glk, s, r.randint(1, 28))
+                    for b in range(r.randint(0, 3)):
+                        gbk += 1
+                        self.add('GXD_GelBand', gbk, glk, r.choice([k for k, s in strengths]))
+            else:
+                for j in range(r.randint(1, 5)):
+                    sk += 1
+                    self.add('GXD_Specimen', sk, ak, r.choice(self.genotypes), r.choice(['Female','Male','Pooled']),
+                             'embryonic day %d.5' % r.randint(1, 18), j+1, '%d%s' % (j+1, r.choice('ABC')))
+                    for k in range(r.randint(1, 4)):
+                        rk_ += 1
+                        self.add('GXD_InSituResult', rk_, sk, r.choice([k for k, s in strengths if k != -2]),
+                                 r.randint(1, 4), self.text(5) if r.random() < 0.2 else None)
+                        for s in r.sample(emapaTerms, r.randint(1, 2)):
+                            self.add('GXD_ISResultStructure', rk_, s, r.randint(1, 28))
+                        if r.random() < 0.3:
+                            self.add('GXD_InSituResultImage', rk_, r.randint(1, ipk))
+        # HT experiments
+        nexp = self.n(60)
+        for ek in range(1, nexp+1):
+            cs = T['done'] if r.random() < 0.7 else T['notdone']
+            self.add('GXD_HTExperiment', ek, 'Experiment %d' % ek, self.text(20), self.date(), self.date(), self.date(),
+                     r.choice(hteval), cs, r.choice(htstudy), r.choice(httype), r.choice(htsrc))
+            self.acc('GSE%d' % (1000+ek), 190, ek, 42, preferred=1, prefix='GSE')
+            if r.random() < 0.5:
+                self.acc('E-GEOD-%d' % (1000+ek), 189, ek, 42, preferred=0, prefix='E-GEOD-')
+            for j in range(r.randint(0, 2)):
+                pm = str(10000000 + r.randint(1, nrefs * 2))
+                self.add('MGI_Property', self.propKey(), ek, 1002, T['pubmedprop'], pm)
+            for v in r.sample(htvars, r.randint(0, 3)):
+                self.add('GXD_HTExperimentVariable', self.evarKey(), ek, v)
+            if r.random() < 0.5:
+                self.note(ek, 42, 1047, self.text(10))
+            for j in range(r.randint(1, 8)):
+                smk = self.sampleKey()
+                self.add('GXD_HTSample', smk, ek, r.choice(htrel), 'sample %d' % smk,
+                         r.choice([1, 1, 1, 2, 40, 76]), r.choice(sexes), r.choice(emapaTerms), r.randint(1, 28),
+                         r.choice(self.genotypes), 'postnatal', '21.0', '21.0')
+                if r.random() < 0.3:
+                    self.note(smk, 43, 1048, self.text(6))
+        self.flush()
+        return self.counts
+
+    def _counter(name):
+        def f(self):
+            v = getattr(self, name, 0) + 1
+            setattr(self, name, v)
+            return v
+        return f
+    annotKey = _counter('_annotKey')
+    assocKey = _counter('_assocKey')
+    synKey = _counter('_synKey')
+    smKey = _counter('_smKey')
+    relKey = _counter('_relKey')
+    rpKey = _counter('_rpKey')
+    evKey = _counter('_evKey')
+    epKey = _counter('_epKey')
+    propKey = _counter('_propKey')
+    evarKey = _counter('_evarKey')
+    sampleKey = _counter('_sampleKey')
+
+#
+# Sinks: where the generated rows go. Each creates the tables, takes batches of rows
+# with write(), and indexes the tables in finish().
+#
+
+# Columns indexed after loading: the keys the dumpers join and select on.
+class PostgresSink:
+    def __init__(self, connection):
+        self.con = connection
+        cur = self.con.cursor()
+        for t, cols in TABLES.items():
+            cur.execute('DROP TABLE IF EXISTS %s' % t)
+            cur.execute('CREATE TABLE %s (%s)' % (t, ', '.join(['%s %s' % c for c in cols])))
+        cur.close()
+
+    def copyValue(self, v):
+        if v is None:
+            return '\\N'
+        if isinstance(v, datetime.datetime):
+            return v.isoformat(' ')
+        return str(v).replace('\\', '\\\\').replace('\n', '\\n').replace('\r', '\\r').replace('\t', '\\t')
+
+    def write(self, table, rows):
+        buf = io.StringIO()
+        for r in rows:
+            buf.write('\t'.join([self.copyValue(v) for v in r]))
+            buf.write('\n')
+        buf.seek(0)
+        cur = self.con.cursor()
+        cur.copy_expert('COPY %s FROM STDIN' % table, buf)
+        cur.close()
+
+    def finish(self):
+        cur = self.con.cursor()
+        for t, cols in TABLES.items():
+            for c in indexedColumns(cols):
+                cur.execute('CREATE INDEX idx_%s_%s ON %s (%s)' % (t, c, t, c))
+        self.con.commit()
+        # ANALYZE cannot run inside a transaction block
+        self.con.autocommit = True
+        cur.execute('ANALYZE')
+        cur.close()
+        self.con.close()
+
+def main():
+    opts, args = getopt.getopt(sys.argv[1:], 's:p:', ['scale=', 'seed=', 'sqlite=', 'properties=', 'source='])
+    scale = 1.0
+    seed = 1
+    sqlite = None
+    pfile = None
+    source = None
+    for o, v in opts:
+        if o in ('-s', '--scale'):
+            scale = float(v)
+        elif o == '--seed':
+            seed = int(v)
+        elif o == '--sqlite':
+            sqlite = v
+        elif o in ('-p', '--properties'):
+            pfile = v
+        elif o == '--source':
+            source = v
+    if (sqlite is None) == (pfile is None):
+        sys.stderr.write('Usage: python mkFixture.py [-s SCALE] [--seed N] (--sqlite FILE | -p PROPERTIES [--source NAME])\n')
+        sys.exit(2)
+
+    if sqlite:
+        sink = SqliteWriter(sqlite)
+    else:
+        from libdump import mgidbconnect as db
+        db.setConnectionFromPropertiesFile(source, pfile)
+        sink = PostgresSink(db.connect())
+
+    t0 = time.time()
+    counts = Generator(sink, scale, seed).generate()
+    t1 = time.time()
+    sink.finish()
+    t2 = time.time()
+    for t in sorted(counts):
+        print('%-32s %10d' % (t, counts[t]))
+    print('%-32s %10d' % ('TOTAL', sum(counts.values())))
+    sys.stderr.write('Generated in %.1fs, indexed in %.1fs.\n' % (t1 - t0, t2 - t1))
+
+#
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+#
+# runBench.py
+#
+# Usage:
+#       % python runBench.py [options] [-- dumpMgiItemXml.py options]
+#
+# Benchmarks the dumpers against a (synthetic) MGI database, e.g., one made by
+# mkFixture.py, so revisions can be compared offline. The database is a SQLite file
+# (--sqlite) or a Postgres database (-p).
+#
+# Runs the full pipeline (all dumpers, as dumpMgiItemXml.py does by default), and
+# optionally each dumper on its own. Each run is a separate dumpMgiItemXml.py process
+# writing to a scratch directory; the numbers come from its metrics.json (see
+# libdump/Metrics.py) and from the operating system. Reported, for the pipeline and
+# per dumper:
+#       wall time, CPU time, peak RSS, rows fetched, items written, rows/s, items/s
+# and, per output file, items and bytes. Query caching is turned off.
+#
+# A dumper run on its own is run with --norefcheck, since the items it refers to are
+# not there (with reference checking, records referring to them would be skipped).
+#
+# Options:
+#       --sqlite FILE          the benchmark database is this SQLite file
+#       -p, --properties FILE  connection to the benchmark database (as for
+#                              dumpMgiItemXml.py -p). Never benchmark against production.
+#       -r, --repeat N         run the pipeline N times and report the fastest (default: 1)
+#       -c, --class NAME       also run this dumper on its own (as for -c; repeatable)
+#       --each                 also run every dumper on its own
+#       -d, --dir DIR          scratch directory for the outputs (default: a temporary
+#                              directory, removed afterwards)
+#       -o, --output FILE      write the results as JSON
+#       --compare FILE         compare with the results (JSON) of an earlier run
+#
+# Anything after -- is passed on to dumpMgiItemXml.py (e.g., -- -j 4 --compress gzip).
+#
+
+import sys
+import os
+import re
+import json
+import time
+import shutil
+import getopt
+import tempfile
+import subprocess
+
+BINDIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+DUMPER = os.path.join(BINDIR, 'dumpMgiItemXml.py')
+MB = float(1 << 20)
+
+def log(m):
+    sys.stderr.write(m + '\n')
+
+# Returns the names of all dumpers (without the Dumper suffix), in pipeline order, as
+# listed in dumpMgiItemXml.py's allDumpers.
+def allDumperNames():
+    with open(DUMPER) as fd:
+        src = fd.read()
+    block = re.search(r'^allDumpers = \[(.*?)^    \]', src, re.M | re.S).group(1)
+    return re.findall(r'^\s*\((\w+)Dumper,', block, re.M)
+
+def revision():
+    try:
+        return subprocess.check_output(['git', 'describe', '--always', '--dirty'], cwd=BINDIR,
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Runs dumpMgiItemXml.py with the given arguments, writing to directory out.
+# Returns the metrics report, plus the process's wall time and peak RSS.
+def runDumper(args, out):
+    if os.path.exists(out):
+        shutil.rmtree(out)
+    os.makedirs(out)
+    cmd = [sys.executable, DUMPER, '-d', out, '-L', os.path.join(out, 'dump.log'), '--no-cache'] + args
+    t0 = time.time()
+    p = subprocess.Popen(cmd, cwd=BINDIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    pid, status, ru = os.wait4(p.pid, 0)
+    wall = time.time() - t0
+    if status != 0:
+        raise RuntimeError('%s failed (status %d). See %s.' % (' '.join(cmd), status, os.path.join(out, 'dump.log')))
+    with open(os.path.join(out, 'metrics.json')) as fd:
+        report = json.load(fd)
+    # ru_maxrss is in kilobytes (bytes on macOS)
+    maxrss = ru.ru_maxrss if sys.platform == 'darwin' else ru.ru_maxrss * 1024
+    report['process'] = {'wallTime' : wall, 'peakRss' : max(maxrss, report['peakRss'])}
+    return report
+
+def rates(r):
+    t = r['wallTime']
+    r['rowsPerSec'] = r['rows'] / t if t else None
+    r['itemsPerSec'] = r['items'] / t if t else None
+    return r
+
+# Summarizes a metrics report: totals, and per (top level) dumper.
+def summarize(report):
+    rows = {}
+    for q in report['queries']:
+        rows[q['dumper']] = rows.get(q['dumper'], 0) + q['rows']
+    # rows fetched by nested dumpers count for their top level dumper
+    top = {}
+    for d in report['dumpers']:
+        top[d['name']] = top.get(d['parent'], d['parent']) or d['name']
+    dumpers = {}
+    for d in report['dumpers']:
+        name = top[d['name']][:-6]
+        s = dumpers.setdefault(name, {'wallTime':0.0, 'cpuTime':0.0, 'peakRss':0, 'rows':0, 'items':0})
+        s['rows'] += rows.get(d['name'], 0)
+        s['items'] += d.get('items', 0)
+        s['peakRss'] = max(s['peakRss'], d.get('peakRss', 0))
+        if d['parent'] is None:
+            s['wallTime'] += d['wallTime']
+            s['cpuTime'] += d['cpuTime']
+    for s in dumpers.values():
+        rates(s)
+    files = report['files']
+    total = rates({
+        'wallTime' : report['process']['wallTime'],
+        'cpuTime'  : report['cpuTime'] + report['workersCpuTime'],
+        'peakRss'  : report['process']['peakRss'],
+        'rows'     : sum(rows.values()),
+        'items'    : sum([f['items'] for f in files.values()]),
+        'bytes'    : sum([f['bytes'] or 0 for f in files.values()]),
+    })
+    return {'total' : total, 'dumpers' : dumpers, 'files' : files}
+
+#
+# Reporting
+#
+
+COLUMNS = [
+    ('wallTime',    'wall s',   '%10.2f'),
+    ('cpuTime',     'cpu s',    '%10.2f'),
+    ('peakRss',     'RSS MB',   '%10.1f'),
+    ('rows',        'rows',     '%10d'),
+    ('items',       'items',    '%10d'),
+    ('rowsPerSec',  'rows/s',   '%10.0f'),
+    ('itemsPerSec', 'items/s',  '%10.0f'),
+]
+
+def fmtValue(k, fmt, v):
+    if v is None:
+        return '%10s' % '-'
+    if k == 'peakRss':
+        v = v / MB
+    return fmt % v
+
+def printTable(title, named):
+    print(title)
+    print('%-28s' % '' + ''.join(['%10s' % h for k, h, f in COLUMNS]))
+    for name, s in named:
+        print('%-28s' % name + ''.join([fmtValue(k, f, s.get(k)) for k, h, f in COLUMNS]))
+    print('')
+
+def printResults(results):
+    t = results['pipeline']['total']
+    printTable('Pipeline (revision %s, fastest of %d)' % (results['revision'], results['repeat']),
+        [('TOTAL', t)] + list(results['pipeline']['dumpers'].items()))
+    if results['isolated']:
+        printTable('Dumpers run on their own', list(results['isolated'].items()))
+    print('%-28s %10s %12s' % ('Output file', 'items', 'MB'))
+    for f, s in sorted(results['pipeline']['files'].items()):
+        print('%-28s %10d %12.2f' % (f, s['items'], (s['bytes'] or 0) / MB))
+    print('%-28s %10d %12.2f' % ('TOTAL', t['items'], t['bytes'] / MB))
+    print('')
+
+# Prints the ratios new/old of the main numbers.
+def printComparison(old, new):
+    keys = ['wallTime', 'cpuTime', 'peakRss', 'itemsPerSec']
+    print('Compared with revision %s (ratio new/old; below 1 is better, except for items/s)' % old['revision'])
+    print('%-28s' % '' + ''.join(['%10s' % h for k, h, f in COLUMNS if k in keys]))
+    def ratios(a, b):
+        return ''.join(['%10s' % ('%.2f' % (b[k] / a[k]) if a.get(k) and b.get(k) is not None else '-') for k in keys])
+    print('%-28s' % 'TOTAL' + ratios(old['pipeline']['total'], new['pipeline']['total']))
+    for name, s in new['pipeline']['dumpers'].items():
+        if name in old['pipeline']['dumpers']:
+            print('%-28s' % name + ratios(old['pipeline']['dumpers'][name], s))
+    print('')
+
+def main():
+    argv = sys.argv[1:]
+    extra = []
+    if '--' in argv:
+        i = argv.index('--')
+        argv, extra = argv[:i], argv[i+1:]
+    opts, args = getopt.getopt(argv, 'p:r:c:d:o:', ['properties=', 'repeat=', 'class=', 'each', 'dir=', 'output=', 'compare=', 'sqlite='])
+    pfile = None
+    sqlite = None
+    repeat = 1
+    isolated = []
+    each = False
+    dir = None
+    output = None
+    compare = None
+    for o, v in opts:
+        if o in ('-p', '--properties'):
+            pfile = v
+        elif o in ('-r', '--repeat'):
+            repeat = int(v)
+        elif o in ('-c', '--class'):
+            isolated.append(v)
+        elif o == '--each':
+            each = True
+        elif o in ('-d', '--dir'):
+            dir = v
+        elif o in ('-o', '--output'):
+            output = v
+        elif o == '--compare':
+            compare = v
+        elif o == '--sqlite':
+            sqlite = v
+    if each:
+        isolated = allDumperNames()
+    if pfile:
+        extra = ['-p', os.path.abspath(pfile)] + extra
+    if sqlite:
+        extra = ['--sqlite', os.path.abspath(sqlite)] + extra
+
+    work = os.path.abspath(dir) if dir else tempfile.mkdtemp(prefix='runBench.')
+    try:
+        best = None
+        for i in range(repeat):
+            log('Pipeline, run %d of %d...' % (i + 1, repeat))
+            s = summarize(runDumper(extra, os.path.join(work, 'pipeline')))
+            log('    %.2fs, %d items' % (s['total']['wallTime'], s['total']['items']))
+            if best is None or s['total']['wallTime'] < best['total']['wallTime']:
+                best = s
+        alone = {}
+        for name in isolated:
+            log('%s on its own...' % name)
+            s = summarize(runDumper(['-c', name, '--norefcheck'] + extra, os.path.join(work, name)))
+            alone[name] = s['total']
+    finally:
+        if not dir:
+            shutil.rmtree(work, ignore_errors=True)
+
+    results = {
+        'revision' : revision(),
+        'date'     : time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'args'     : extra,
+        'repeat'   : repeat,
+        'pipeline' : best,
+        'isolated' : alone,
+    }
+    printResults(results)
+    if compare:
+        with open(compare) as fd:
+            printComparison(json.load(fd), results)
+    if output:
+        with open(output, 'w') as fd:
+            json.dump(results, fd, indent=1)
+
+#
+if __name__ == '__main__':
+    main()
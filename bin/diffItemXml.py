@@ -0,0 +1,265 @@
+#
+# diffItemXml.py
+#
+# Usage:
+#       % python diffItemXml.py [options] OLD NEW
+#
+# Reports what changed between two ItemXML sources, e.g., the mgi-base "latest"
+# directory and the new one made by refresh.py. OLD and NEW are each a directory
+# (all files in it, nonrecursive) or a single file. Inputs may be gzip or zstd
+# compressed (as written by dumpMgiItemXml.py --compress).
+#
+# Items are matched by class plus natural key: the primaryIdentifier attribute, or
+# failing that, identifier or primaryAccession. Items with none of these are keyed by
+# their content, so they can only be added or removed, not changed. With --ids, items
+# are matched by their ids instead, which is only meaningful if both sources were
+# dumped with the same --stable-ids map.
+#
+# Ids are not stable from run to run (unless --stable-ids was used), so by default
+# items are compared with their ids and reference ids blanked out: a changed reference
+# is not seen, only changed attributes and collection sizes. With --ids, items are
+# compared as they are.
+#
+# The inputs are never held in memory. Each file is scanned (in parallel, one process
+# per file) into (class, key, content hash) records, which are sorted in runs of
+# --runsize records and spilled to temporary files. The runs are then merged, and the
+# two sides compared in a single pass.
+#
+# Options:
+#       -j, --jobs N     number of processes scanning files (default: number of cores)
+#       -l, --list       also list the keys of the items added (+), removed (-) and changed (~)
+#       --ids            match and compare items by id (see above)
+#       -T, --tmpdir D   where to spill sorted runs (default: system temp directory)
+#       --runsize N      records per sorted run (default: 500000)
+#
+# Prints a table of the number of items per class in each source, and the numbers
+# added, removed and changed. Exits with a status of 0 if there are no differences,
+# 1 if there are, as diff does.
+#
+
+import sys
+import os
+import re
+import io
+import gzip
+import getopt
+import heapq
+import shutil
+import hashlib
+import tempfile
+import itertools
+import collections
+import multiprocessing
+
+BLOCKSIZE = 1 << 20
+
+item_re = re.compile(r'<item\b.*?</item>', re.S)
+class_re = re.compile(r'<item\b[^>]*?\bclass *= *"([^"]*)"')
+itemid_re = re.compile(r'<item\b[^>]*?\bid *= *"([^"]*)"')
+# natural keys, in order of preference
+key_res = [re.compile(r'<attribute\s+name="%s"\s+value="([^"]*)"' % n) \
+    for n in ('primaryIdentifier', 'identifier', 'primaryAccession')]
+# ids and reference ids, blanked out for comparing
+ids_re = re.compile(r'\b((?:ref_)?id *= *)"[^"]*"')
+space_re = re.compile(r'\s+')
+
+def log(m):
+    sys.stderr.write(m)
+
+# Returns a text stream for binary stream bfd, decompressing if needed.
+def openInput( bfd ):
+    magic = bfd.peek(4)[:4]
+    if magic[:2] == b'\x1f\x8b':
+        bfd = gzip.GzipFile(fileobj=bfd, mode='rb')
+    elif magic == b'\x28\xb5\x2f\xfd':
+        import zstandard
+        bfd = zstandard.ZstdDecompressor().stream_reader(bfd, read_across_frames=True)
+    return io.TextIOWrapper(bfd, encoding='utf-8')
+
+# Yields the items (as strings) in text stream fd, reading a block at a time.
+def iterItems( fd ):
+    buf = ''
+    while True:
+        block = fd.read(BLOCKSIZE)
+        if not block:
+            break
+        buf += block
+        end = buf.rfind('</item>')
+        if end < 0:
+            continue
+        end += len('</item>')
+        for m in item_re.finditer(buf, 0, end):
+            yield m.group(0)
+        buf = buf[end:]
+
+# Returns the (class, key, content hash) record for item s.
+def itemRecord( s, byId ):
+    s = space_re.sub(' ', s)
+    m = class_re.match(s)
+    cls = m.group(1) if m else ''
+    if not byId:
+        s = ids_re.sub(r'\1""', s)
+    h = hashlib.blake2b(s.encode('utf-8'), digest_size=12).hexdigest()
+    key = None
+    if byId:
+        m = itemid_re.match(s)
+        key = m and m.group(1)
+    else:
+        for r in key_res:
+            m = r.search(s)
+            if m:
+                key = m.group(1)
+                break
+    if key is None:
+        key = '#' + h
+    return (cls, key.replace('\t', ' '), h)
+
+def writeRun( records, tmpdir ):
+    records.sort()
+    fd, path = tempfile.mkstemp(suffix='.run', dir=tmpdir)
+    with os.fdopen(fd, 'w', encoding='utf-8') as out:
+        for r in records:
+            out.write('%s\t%s\t%s\n' % r)
+    return path
+
+# Scans one input file into sorted runs. Runs in a worker process.
+# Returns (side, file name, number of items, list of run files).
+def scanFile( args ):
+    side, fname, byId, tmpdir, runsize = args
+    runs = []
+    records = []
+    n = 0
+    with openInput(open(fname, 'rb')) as fd:
+        for s in iterItems(fd):
+            records.append(itemRecord(s, byId))
+            n += 1
+            if len(records) >= runsize:
+                runs.append(writeRun(records, tmpdir))
+                records = []
+    if records:
+        runs.append(writeRun(records, tmpdir))
+    return (side, fname, n, runs)
+
+def readRun( path ):
+    with open(path, encoding='utf-8') as fd:
+        for line in fd:
+            yield tuple(line.rstrip('\n').split('\t'))
+
+# Yields ((class, key), [content hashes]) for a side, in (class, key) order.
+def groups( runs ):
+    merged = heapq.merge(*[readRun(p) for p in runs])
+    for ck, rs in itertools.groupby(merged, key=lambda r: r[:2]):
+        yield ck, [r[2] for r in rs]
+
+# Compares the groups of the two sides. Calls report(what, class, key, count) for the
+# differences, where what is '+' (added), '-' (removed) or '~' (changed).
+# Counts (per class) of items in old and new are returned.
+def compare( oldRuns, newRuns, report ):
+    nOld = {}
+    nNew = {}
+    END = (None, None)
+    og = groups(oldRuns)
+    ng = groups(newRuns)
+    o = next(og, END)
+    n = next(ng, END)
+    while o is not END or n is not END:
+        if n is END or (o is not END and o[0] < n[0]):
+            cls, key = o[0]
+            nOld[cls] = nOld.get(cls, 0) + len(o[1])
+            report('-', cls, key, len(o[1]))
+            o = next(og, END)
+        elif o is END or n[0] < o[0]:
+            cls, key = n[0]
+            nNew[cls] = nNew.get(cls, 0) + len(n[1])
+            report('+', cls, key, len(n[1]))
+            n = next(ng, END)
+        else:
+            cls, key = o[0]
+            nOld[cls] = nOld.get(cls, 0) + len(o[1])
+            nNew[cls] = nNew.get(cls, 0) + len(n[1])
+            # match up identical items; what's left over is changed (pairwise), then
+            # removed or added
+            olds = collections.Counter(o[1])
+            news = collections.Counter(n[1])
+            nOlds = sum((olds - news).values())
+            nNews = sum((news - olds).values())
+            nChanged = min(nOlds, nNews)
+            if nChanged:
+                report('~', cls, key, nChanged)
+            if nOlds > nChanged:
+                report('-', cls, key, nOlds - nChanged)
+            if nNews > nChanged:
+                report('+', cls, key, nNews - nChanged)
+            o = next(og, END)
+            n = next(ng, END)
+    return nOld, nNew
+
+def listFiles( a ):
+    if os.path.isdir(a):
+        return sorted([os.path.join(a, f) for f in os.listdir(a) \
+            if os.path.isfile(os.path.join(a, f)) and not f.startswith('.')])
+    return [a]
+
+def main():
+    opts, args = getopt.getopt(sys.argv[1:], 'j:lT:', ['jobs=', 'list', 'ids', 'tmpdir=', 'runsize='])
+    jobs = multiprocessing.cpu_count()
+    listKeys = False
+    byId = False
+    tmpdir = None
+    runsize = 500000
+    for o, v in opts:
+        if o in ('-j', '--jobs'):
+            jobs = int(v)
+        elif o in ('-l', '--list'):
+            listKeys = True
+        elif o == '--ids':
+            byId = True
+        elif o in ('-T', '--tmpdir'):
+            tmpdir = v
+        elif o == '--runsize':
+            runsize = int(v)
+    if len(args) != 2:
+        log('Usage: python diffItemXml.py [options] OLD NEW\n')
+        sys.exit(2)
+
+    work = tempfile.mkdtemp(prefix='diffItemXml.', dir=tmpdir)
+    try:
+        tasks = [(side, f, byId, work, runsize) for side, a in enumerate(args) for f in listFiles(a)]
+        # biggest files first, so one big file doesn't finish last
+        tasks.sort(key=lambda t: -os.path.getsize(t[1]))
+        runs = ([], [])
+        with multiprocessing.Pool(max(1, min(jobs, len(tasks)))) as pool:
+            for side, fname, n, fruns in pool.imap_unordered(scanFile, tasks):
+                log('%s: %d items\n' % (fname, n))
+                runs[side].extend(fruns)
+
+        added = {}
+        removed = {}
+        changed = {}
+        counts = {'+':added, '-':removed, '~':changed}
+        def report(what, cls, key, count):
+            c = counts[what]
+            c[cls] = c.get(cls, 0) + count
+            if listKeys:
+                print('%s %s %s' % (what, cls, key))
+        nOld, nNew = compare(runs[0], runs[1], report)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    # summary
+    if listKeys:
+        print('')
+    fmt = '%-40s %10s %10s %10s %10s %10s'
+    print(fmt % ('class', 'old', 'new', 'added', 'removed', 'changed'))
+    tot = [0, 0, 0, 0, 0]
+    for cls in sorted(set(nOld) | set(nNew)):
+        row = [nOld.get(cls, 0), nNew.get(cls, 0), added.get(cls, 0), removed.get(cls, 0), changed.get(cls, 0)]
+        tot = [a + b for a, b in zip(tot, row)]
+        print(fmt % tuple([cls] + row))
+    print(fmt % tuple(['TOTAL'] + tot))
+
+    sys.exit(1 if sum(tot[2:]) else 0)
+
+#
+if __name__ == '__main__':
+    main()
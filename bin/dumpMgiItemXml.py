@@ -8,40 +8,21 @@
 
 import sys
 import getopt
-from libdump import *
+from libdump import getDumper, installMethods, ALL_DUMPERS
+from libdump.DumperContext import DumperContext
 import types
 import os
 from libdump import mgidbconnect as db
+from libdump import Snapshot
+from libdump import Preloads
 
 ##########################################
 VERSION = "0.1"
 
 ##########################################
-# The order of dumpers is important. The objects dumped later
-# in the process may refer to objects dumped earlier.
-# It is assumed that all ontologies have already been loaded.
-allDumpers = [
-    (PublicationDumper,         ()),
-    (DataSourceDumper,          ()),
-    (OrganismDumper,            ()),
-    (ChromosomeDumper,          ()),
-    (StrainDumper,              ()),
-    (FeatureDumper,             ()),
-    (ProteinDumper,             ()),
-    (LocationDumper,            ()),
-    (HomologyDumper,            ()),
-    (SyntenyDumper,             ()),
-    (AlleleDumper,              ()),
-    (CellLineDumper,            ()),
-    (GenotypeDumper,            ()),
-    (ExpressionDumper,          ()),
-    (HTIndexDumper,             ()),
-    (AnnotationCommentDumper,   ()),
-    (AnnotationDumper,          ()),
-    (RelationshipDumper,        ()),
-    (SynonymDumper,             ()),
-    (CrossReferenceDumper,      ()),
-    ]
+# The dumpers a full run runs, in order (see libdump.ALL_DUMPERS), with their default
+# arguments. Only those a run selects are imported.
+allDumpers = [(n, ()) for n in ALL_DUMPERS]
 
 defaultParams = dict(allDumpers)
 
@@ -49,8 +30,8 @@ defaultParams = dict(allDumpers)
 ##########################################
 def parseArgs(argv):
     opts,args = getopt.getopt(argv, 
-        'c:d:D:l:vL:p:', 
-        ['class=', 'dir=','define','debug', 'limit=','version','logfile=','norefcheck','install=','properties='])
+        'c:d:D:l:vL:p:j:', 
+        ['class=', 'dir=','define','debug', 'limit=','version','logfile=','norefcheck','install=','properties=','jobs=','poolsize=','writequeue=','compress=','no-cache','cache-dir=','resume=','since=','stable-ids=','keep-idmap','profile=','sqlite=','snapshot=','explain','memory-budget='])
     return opts,args
 
 def main(argv):
@@ -61,7 +42,23 @@ def main(argv):
     clcs = []
     defs = {}
     logfile=None
+    pfile = "~/.intermine/mousemine.properties"
+    sqlite = None
+    snapshot = None
     checkRefs = True
+    jobs = 1
+    poolSize = 4
+    writeQueueSize = 64
+    compress = None
+    cache = None
+    cacheDir = None
+    resume = False
+    since = None
+    stableIds = None
+    keepIdMap = False
+    profile = None
+    explain = False
+    memoryBudget = None
     for o,v in opts:
         if o == '--debug':
             debug=True
@@ -79,24 +76,76 @@ def main(argv):
             checkRefs = False
         elif o in ('-L','--logfile'):
             logfile = v
+        elif o in ('-j','--jobs'):
+            jobs = int(v)
+        elif o == '--poolsize':
+            poolSize = int(v)
+        elif o == '--writequeue':
+            writeQueueSize = int(v)
+        elif o == '--compress':
+            compress = v
+        elif o == '--no-cache':
+            cache = False
+        elif o == '--cache-dir':
+            # where query results are cached (default: see libdump/QueryCache.py)
+            cacheDir = v
+        elif o == '--since':
+            since = v
+        elif o == '--stable-ids':
+            stableIds = v
+        elif o == '--keep-idmap':
+            # key generated items by content, so a later --since run keeps their ids
+            keepIdMap = True
+        elif o == '--profile':
+            # cpu or mem, optionally with the dumpers to profile, e.g. mem:Allele,Expression
+            profile = v
+        elif o == '--explain':
+            # plan the dumpers' queries instead of running them (see libdump/Explainer.py)
+            explain = True
+        elif o == '--memory-budget':
+            # preload indexes beyond this size (e.g., 8G) are moved to disk (see libdump/Preloads.py)
+            memoryBudget = Preloads.parseSize(v)
+        elif o == '--resume':
+            dir = v
+            resume = True
         elif o in ('-p','--properties'):
             pfile = v
+        elif o == '--sqlite':
+            # read a local SQLite snapshot of the MGI tables instead (see snapshotMgi.py)
+            sqlite = v
+        elif o == '--snapshot':
+            # read the snapshot in this directory for the current MGI dump date, taking
+            # it first if there isn't one (see libdump/Snapshot.py)
+            snapshot = v
         elif o == '--install':
             m = __import__(v)
             installMethods(m)
         elif o in ('-c', '--class'):
             i=v.find("(")
             if i == -1:
-                cls=eval(v+"Dumper")
-                args=defaultParams[cls]
+                cls=getDumper(v+"Dumper")
+                args=defaultParams[cls.__name__]
             else:
-                cls=eval(v[0:i]+"Dumper")
+                cls=getDumper(v[0:i]+"Dumper")
                 args=eval(v[i:])
                 if type(args) is not tuple:
                     args= (args,)
             clcs.append( (cls,args) )
     if len(clcs) == 0:
-        clcs = allDumpers[:]
+        clcs = [(getDumper(n),a) for n,a in allDumpers]
+    if explain:
+        # with no rows, the items referred to are never written
+        checkRefs = False
+    if cache is None:
+        # a snapshot is already on local disk: caching its results gains nothing,
+        # unless asked for with --cache-dir
+        cache = cacheDir is not None or not (sqlite or snapshot)
+    if not sqlite:
+        db.setConnectionFromPropertiesFile(fname=pfile)
+        if snapshot:
+            sqlite = Snapshot.snapshotFor(snapshot)
+    if sqlite:
+        db.setBackend(db.SqliteBackend(sqlite))
                 
 
     dcx = DumperContext(
@@ -105,17 +154,86 @@ def main(argv):
         limit=limit, 
         defs = defs, 
         logfile=logfile, 
-        checkRefs=checkRefs)
+        checkRefs=checkRefs,
+        poolSize=poolSize,
+        writeQueueSize=writeQueueSize,
+        compress=compress,
+        cache=cache,
+        cacheDir=cacheDir,
+        since=since,
+        stableIds=stableIds,
+        keepIdMap=keepIdMap,
+        profile=profile,
+        explain=explain,
+        memoryBudget=memoryBudget)
     dcx.log("\n============================================================")
     dcx.log("Starting MGI item dump...")
     dcx.log("Command line parameters = %s" % str(argv))
 
-    db.setConnectionFromPropertiesFile()
-    dcx.log("Database connection:" + str(db.getConnection()))
+    if sqlite:
+        dcx.log("Database: SQLite snapshot " + db.getBackend().path)
+    else:
+        dcx.log("Database connection:" + str(db.getConnection()))
+    if jobs > 1 and not checkRefs:
+        # without ref checking, references allocate ids, so nothing can be run concurrently
+        dcx.log("Ignoring --jobs because of --norefcheck.")
+        jobs = 1
+    if jobs > 1 and since:
+        # the bookkeeping for deleted ids is not carried back from worker processes
+        dcx.log("Ignoring --jobs because of --since.")
+        jobs = 1
+    if explain:
+        # The dumpers run as usual, but get no rows, so the output files are empty.
+        for c,a in clcs:
+            dcx.notes.register(c.NOTES)
+        failed = dcx.explainer.run(clcs)
+        dcx.closeOutputs()
+        dcx.closePool()
+        dcx.log("Finished MGI query plan audit.")
+        dcx.log("============================================================")
+        if failed:
+            sys.exit(1)
+        return
+    # A checkpoint is taken after each dumper. --resume picks up after the last one.
+    dcx.runSignature = repr(([(c.__name__, a) for c,a in clcs], limit, checkRefs, sorted(defs.items()), dcx.since, dcx.stableIds, dcx.contentKeys))
+    start = 0
     total = 0
-    for cls,args in clcs:
-        total += cls(dcx, *args).dump(fname=cls.__name__[:-6]+".xml")
+    if resume:
+        start, total = dcx.loadCheckpoint()
+    for c,a in clcs[start:]:
+        dcx.notes.register(c.NOTES)
+    dcx.preloads.plan([c for c,a in clcs[start:]])
+    if jobs > 1:
+        from libdump.DumperScheduler import DumperScheduler
+        total += DumperScheduler(dcx, clcs[start:], jobs,
+            checkpoint=lambda n, count, parts, states: dcx.saveCheckpoint(start+n, total+count, parts, states)).run()
+    else:
+        for i,(cls,args) in enumerate(clcs[start:], start):
+            total += cls(dcx, *args).dump(fname=cls.__name__[:-6]+".xml")
+            dcx.saveCheckpoint(i+1, total)
+    if dcx.since:
+        produced = set([n for c,a in clcs for n in (c.PRODUCES or dcx.TYPE_KEYS)])
+        partial = set([n for c,a in clcs if c.SINCE_KEYS for n in (c.PRODUCES or dcx.TYPE_KEYS)])
+        dcx.writeDeleted(produced, partial)
     dcx.closeOutputs()
+    dcx.saveIdMap()
+    if dcx.stableIds:
+        dcx.saveStableIds()
+    dcx.removeCheckpoint()
+    dcx.closePool()
+    dcx.logQueryCache()
+    dcx.logIdRegistry()
+    dcx.logAccessionIndex()
+    # per-dumper, per-query and per-file metrics, next to the outputs
+    dcx.writeMetrics({
+        'argv'       : argv,
+        'jobs'       : jobs,
+        'resumed'    : resume,
+        'items'      : total,
+        'mgiDumpDate': str(dcx.mgi_dbinfo['lastdump_date']),
+        'pool'       : dcx.pool.getStats(),
+        'queryCache' : dcx.cache.getStats() if dcx.cache else None,
+    })
     dcx.log("Finished MGI item dump.")
     dcx.log("Grand total: %d items written."%total)
     dcx.log("============================================================")
@@ -15,6 +15,8 @@
 # Inputs to the script may comprise any combination of file names and/or directory names;
 # directories are expanded to the list of its files (nonrecursive, single level). 
 # If no inputs are specified, the script reads from standard input.
+# Inputs may be gzip or zstd compressed (as written by dumpMgiItemXml.py --compress);
+# this is detected from their contents. (zstd needs the zstandard package.)
 # The universe of objects to be checked is defined by the union of the contents of all the inputs.
 # 
 # If no problems are detected, the script produces no output and exits with a
@@ -26,6 +28,8 @@
 import sys
 import os
 import re
+import io
+import gzip
 
 # regex that looks for patterns like 'ref_id="xxxx"' and 'id="xxxx"'.
 # Captures the id as group 2, the 'ref_' part (or '') as group 1.
@@ -42,13 +46,23 @@ errors = False
 def log(m):
     sys.stderr.write(m)
 
-def process( ifd ):
+# Returns a text stream for binary stream bfd, decompressing if needed.
+def openInput( bfd ):
+    magic = bfd.peek(4)[:4]
+    if magic[:2] == b'\x1f\x8b':
+        bfd = gzip.GzipFile(fileobj=bfd, mode='rb')
+    elif magic == b'\x28\xb5\x2f\xfd':
+        import zstandard
+        bfd = zstandard.ZstdDecompressor().stream_reader(bfd, read_across_frames=True)
+    return io.TextIOWrapper(bfd, encoding='utf-8')
+
+def process( ifd, name ):
     global errors, idx, refidx
     lineNum = 0
-    log("Reading from file: %s\n"%ifd.name)
+    log("Reading from file: %s\n"%name)
     for line in ifd:
         lineNum += 1
-        val = (ifd.name, lineNum)
+        val = (name, lineNum)
         for m in id_re.finditer(line):
             id = m.group(2)
             if m.group(1):
@@ -70,10 +84,10 @@ def checkRefs( ):
     # Any remaining xrefs are dangling.
     global errors, idx, refidx
     log("Checking xrefs\n")
-    errors = len(refidx) > 0
+    errors = errors or len(refidx) > 0
     # Sort the items by filename and line number for printing.
     items = list(refidx.items())
-    items.sort(None, lambda i:(i[1][0],i[1][1]))
+    items.sort(key=lambda i:(i[1][0],i[1][1]))
     for (refid, val) in items:
         print("Dangling reference: id=%s file=%s line=%d" %(refid, val[0], val[1]))
 
@@ -91,11 +105,11 @@ def main():
 
     # if no files, read from stdin. Otherwise, open/process/close each file.
     if len(files) == 0:
-        process(sys.stdin)
+        process(openInput(sys.stdin.buffer), '<stdin>')
     else:
         for f in files:
-            fd = open(f,'r')
-            process(fd)
+            fd = openInput(open(f,'rb'))
+            process(fd, f)
             fd.close()
 
     # final check
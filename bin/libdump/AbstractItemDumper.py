@@ -1,6 +1,29 @@
 from .common import *
 from .DumperContext import DumperContext
+from .ItemTemplate import ItemTemplate
 import re
+from contextlib import nullcontext
+
+# A record to render: computed fields on top of a (read-only) query row.
+# Fields set on the record take precedence; anything else is looked up in the row.
+# This saves copying every row into a dict just to add a few fields.
+#   e.g., ItemRecord(row, id=..., subject=...)
+#
+class ItemRecord(dict):
+    __slots__ = ('row',)
+
+    def __init__(self, row, **fields):
+        dict.__init__(self, fields)
+        self.row = row
+
+    def __missing__(self, k):
+        return self.row[k]
+
+    def __contains__(self, k):
+        return dict.__contains__(self, k) or k in self.row
+
+    def get(self, k, default=None):
+        return self[k] if k in self else default
 
 class AbstractItemDumper:
     SUPER_RE = re.compile(r'<([^>]+)>')
@@ -8,6 +31,9 @@ class AbstractItemDumper:
     NV_RE = re.compile(r'^ *<(attribute|reference).* (value|ref_id)=""\s*/> *$', re.M|re.I)
     BAD_XML_CHARS_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1F\uD800-\uDFFF\uFFFE\uFFFF]')
 
+    # compiled item templates: (template, NA regex, NV regex) -> ItemTemplate
+    COMPILED_TEMPLATES = {}
+
     def __init__(self, context, parentDumper = None):
         self.context = context
         self.dumpArgs = None
@@ -62,31 +88,53 @@ class AbstractItemDumper:
     def getDefaultFileName(self):
         return self.getClassName() + '.xml'
 
-    def constructQuery(self, qtmplt=None, params=None):
+    def constructQuery(self, qtmplt=None, params=None, iQuery=None):
         if qtmplt is None:
             qtmplt = self.QTMPLT
         if params is None:
             params = self.context.QUERYPARAMS
+            if '%(SINCE_CLAUSE)s' in qtmplt:
+                params = dict(params, SINCE_CLAUSE=self.sinceClause(iQuery))
         return qtmplt % params
 
+    # Returns the condition that restricts query iQuery to changed rows in a delta
+    # dump (see SINCE), or an empty string.
+    #
+    def sinceClause(self, iQuery=None):
+        cols = self.SINCE
+        if cols and iQuery is not None:
+            cols = cols[iQuery]
+        if not cols or self.context.since is None:
+            return ''
+        d = self.context.QUERYPARAMS['SINCE_DATE']
+        return 'AND (%s)' % ' OR '.join(['%s > %s' % (c, d) for c in cols])
+
+    # Returns the preload queries, instantiated from PRELOADS.
+    def preloads(self):
+        return [self.constructQuery(t) for t in self.PRELOADS]
+
+    def compileTemplate(self, tmplt):
+        key = (tmplt, self.suppressNA and self.NA_RE or None, self.suppressNV and self.NV_RE or None)
+        ct = self.COMPILED_TEMPLATES.get(key)
+        if ct is None:
+            ct = self.COMPILED_TEMPLATES[key] = ItemTemplate(tmplt, key[1:])
+        return ct
+
     def writeItem(self, r, tmplt=None, i=None):
         if tmplt is None:
             tmplt=self.ITMPLT
-        if type(tmplt) is str:
-             s = tmplt % r
-        else:
-            s = tmplt[i] % r
-        if self.filter(r, s) is not False:
-            if self.suppressNA:
-                s = self.NA_RE.sub('',s)
-            if self.suppressNV:
-                s = self.NV_RE.sub('',s)
-            self.context.writeOutput(r['id'],s)
-            self.writeCount += 1
-            if self.dotEvery > 0 and self.writeCount % self.dotEvery == 0:
-                self.context.log('.',timestamp=False,newline=False)
-                if (self.writeCount % (self.dotEvery*self.dotsPerLine) == 0):
-                    self.context.log(' %d'% self.writeCount,timestamp=False,newline=True)
+        if type(tmplt) is not str:
+            tmplt = tmplt[i]
+        # filter() gets the item before suppression. Only build that if filter is overridden.
+        if self.filter.__func__ is not AbstractItemDumper.filter and self.filter(r, tmplt % r) is False:
+            return
+        s = self.compileTemplate(tmplt).render(r)
+        self.context.writeOutput(r['id'],s)
+        self.writeCount += 1
+        if self.dotEvery > 0 and self.writeCount % self.dotEvery == 0:
+            self.context.log('.',timestamp=False,newline=False)
+            if (self.writeCount % (self.dotEvery*self.dotsPerLine) == 0):
+                self.context.log(' %d'% self.writeCount,timestamp=False,newline=True)
 
     def _processRecord(self, r, qIndex=None):
         try:
@@ -108,30 +156,51 @@ class AbstractItemDumper:
             if rr is not None:
                 self.writeItem(rr, None, qIndex)
 
-    def mainDump(self):
+    # Yields the main queries, instantiated from QTMPLT as they are needed, as (index,
+    # query). The index is None if QTMPLT is a single template. Empty queries are skipped.
+    def queries(self):
         if type(self.QTMPLT) is str:
-            self.recordCount = 0
             q = self.constructQuery()
             if len(q.strip()) > 0:
-                self.context.sql(q, self._processRecord)
-        else:
-            for i,qt in enumerate(self.QTMPLT):
-                self.recordCount = 0
-                q = self.constructQuery(qt)
-                if len(q.strip()) > 0:
-                    self.context.sql(q, self._processRecord, args={'qIndex':i})
+                yield None, q
+            return
+        for i,qt in enumerate(self.QTMPLT):
+            q = self.constructQuery(qt, iQuery=i)
+            if len(q.strip()) > 0:
+                yield i, q
+
+    def mainDump(self):
+        for i,q in self.queries():
+            self.recordCount = 0
+            if i is None:
+                self.context.sql(q, self._processRecord, rows=self.ROWS, copy=self.COPY)
+            else:
+                self.context.sql(q, self._processRecord, args={'qIndex':i}, rows=self.ROWS, copy=self.COPY)
 
     def dump(self, **kwargs):
         self.context.log('%s: Starting dump. args=%s' %(self.__class__.__name__, str(kwargs)))
         self.dumpArgs = kwargs
         self.fname = kwargs.get('fname',None)
         self.writeCount = 0
-        if self.fname:
-            self.context.openOutput(self.fname)
-        if self.preDump() == False:
-            return
-        self.mainDump()
-        self.postDump()
+        prof = self.context.profiler
+        with self.context.metrics.dumper(self) as m, (prof.dumper(self) if prof else nullcontext()), \
+                self.context.preloads.scope(self), \
+                self.context.prefetching(self.preloads()), self.context.notes.using(self.NOTES):
+            if self.fname:
+                self.context.openOutput(self.fname)
+            if self.context.since is not None and self.SINCE_KEYS:
+                self.context.clearChanged(dict([(n, self.constructQuery(q)) for n,q in self.SINCE_KEYS.items()]))
+            with m.phase('preDump'):
+                cancelled = self.preDump() == False
+            if cancelled:
+                return
+            with m.phase('mainDump'):
+                self.mainDump()
+            if prof:
+                prof.afterMainDump(self)
+            with m.phase('postDump'):
+                self.postDump()
+            m.rec['items'] = self.writeCount
         self.context.log('', timestamp=False)
         self.context.log('%s: Finished dump. Total items written: %d' % (self.__class__.__name__, self.writeCount))
         return self.writeCount
@@ -151,6 +220,27 @@ class AbstractItemDumper:
     #
     QTMPLT = ''
 
+    # Preload queries: templates (as for QTMPLT) of the queries preDump builds its indexes
+    # from. When the dump starts, they are all sent off at once (see
+    # DumperContext.prefetching), and preDump gets the rows of each when it runs it,
+    # so preDump takes about as long as the slowest of them, rather than all of them in
+    # turn. preDump must run them exactly as listed: self.constructQuery(template),
+    # through self.context.sql, with the default row type.
+    #
+    # OVERRIDE ME (optional).
+    #
+    PRELOADS = []
+
+    # Notes: the (_notetype_key, _mgitype_key) pairs whose notes this dumper, or any dumper
+    # it runs, gets from self.context.notes. They are registered when the run starts, so
+    # the notes of dumpers that run back to back are loaded in one pass, and dropped when
+    # the dumper is done (see NoteUtils.NoteLoader). Dumpers run by another dumper leave
+    # this empty.
+    #
+    # OVERRIDE ME (optional).
+    #
+    NOTES = []
+
     # Defines the item template for the dumper class. Each value returned by
     # self.processRecord() is used as a dict to instantiate this template
     # (the results of which are written out).
@@ -163,6 +253,41 @@ class AbstractItemDumper:
     #
     ITMPLT = ''
 
+    # Declare the item types (names, as in context.TYPE_KEYS) this dumper produces, i.e.,
+    # writes items for or allocates ids in, and the item types it references.
+    # The scheduler (see DumperScheduler.py) uses these to decide which dumpers
+    # can run at the same time. A dumper that leaves them as None is never run
+    # concurrently with any other dumper.
+    #
+    # OVERRIDE ME.
+    #
+    PRODUCES = None
+    REFERENCES = None
+
+    # The type of rows processRecord gets from the query: 'dict' (a dict per row), or
+    # 'tuple' (a lightweight, read-only Row; see mgidbconnect). For big scans, 'tuple'
+    # is much cheaper. processRecord then returns an ItemRecord (see above) holding
+    # the computed fields, rather than modifying the row.
+    #
+    ROWS = 'dict'
+
+    # Delta dumps (--since). SINCE lists the modification date columns of the objects the
+    # query returns (a list of such lists if QTMPLT is a list; None for queries that always
+    # return everything). In a delta dump, the query's %(SINCE_CLAUSE)s becomes a condition
+    # selecting rows where any of them is later than the previous run's dump date.
+    # SINCE_KEYS maps each item type so dumped to a query returning every current object's
+    # local key and modification date(s), for finding what changed or was deleted
+    # (see DumperContext.clearChanged). Dumpers without them dump everything.
+    #
+    SINCE = None
+    SINCE_KEYS = None
+
+    # If True, the dumper's queries are run with COPY ... TO STDOUT and the output
+    # parsed as it streams in, rather than fetched through a cursor (see mgidbconnect).
+    # Worth it for queries returning millions of rows. Records are the same either way.
+    #
+    COPY = False
+
     # Process/modify a record, r, returned by the query.
     # Returns a dict (e.g. r), or None. The dict is used to
     # instantiate the ITMPLT to write to the output.
@@ -0,0 +1,155 @@
+#
+# AccessionIndex.py
+#
+# A run-wide, in-memory index of ACC_Accession, so dumpers that need ids for a type and
+# logical db can look them up rather than each scanning the table again.
+#
+# The index is split into sets, one per (MGI type key, logical db key), each loaded from
+# the database the first time it is asked for, through the context (so the query is
+# logged, cached and recorded in the metrics like any other). A set holds, for each
+# accession row: the object key, the accid, and the preferred and private flags. Rows
+# are kept in columns backed by arrays: object keys (sorted) in an array of ints, the
+# accids in a single utf-8 buffer with an array of offsets, and the flags in a
+# bytearray. Lookup by object key is a binary search; lookup by accid uses a second
+# array of row numbers in accid order, built when first needed.
+# Rows for an object are in accid order, whatever order the database returns them in,
+# so picking the first of several ids gives the same answer every run.
+# With --jobs, a worker process starts with the sets the parent had loaded when it was
+# forked; sets it loads itself stay in the worker.
+#
+# Example: Entrez gene ids of markers, and the marker(s) with a given Entrez id:
+#       ents = context.accessions.get(2, 55)
+#       ents.first(mk)                  # -> '12345', or None
+#       ents.find('12345')              # -> [mk]
+#
+
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+
+PREFERRED = 1
+PRIVATE   = 2
+
+class AccessionSet:
+    __slots__ = ('mgitype', 'ldb', 'keys', 'offsets', 'accids', 'flags', 'byAccid')
+
+    def __init__(self, mgitype, ldb):
+        self.mgitype = mgitype
+        self.ldb = ldb
+        self.keys = array('i')       # object key of each row, sorted (MGI keys are int4)
+        self.offsets = array('I', [0]) # row i's accid is accids[offsets[i]:offsets[i+1]]
+        self.accids = bytearray()
+        self.flags = bytearray()     # PREFERRED | PRIVATE bits
+        self.byAccid = None          # row numbers, in accid order (see find)
+
+    # Adds rows (object key, accid, preferred, private). Rows must be added in
+    # object key order.
+    def extend(self, rows):
+        for k, accid, preferred, private in rows:
+            self.keys.append(k)
+            self.accids += accid.encode('utf-8')
+            self.offsets.append(len(self.accids))
+            self.flags.append((PREFERRED if preferred else 0) | (PRIVATE if private else 0))
+
+    # Frees any spare capacity once loaded.
+    def freeze(self):
+        self.accids = bytes(self.accids)
+        self.flags = bytes(self.flags)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def accid(self, i):
+        return self.accids[self.offsets[i]:self.offsets[i+1]].decode('utf-8')
+
+    def _matches(self, i, preferred, private):
+        f = self.flags[i]
+        return (preferred is None or bool(f & PREFERRED) == preferred) \
+            and (private is None or bool(f & PRIVATE) == private)
+
+    # Returns the accids of object k, optionally only those that are (or are not)
+    # preferred, or private.
+    def get(self, k, preferred=None, private=None):
+        i, j = bisect_left(self.keys, k), bisect_right(self.keys, k)
+        return [self.accid(x) for x in range(i, j) if self._matches(x, preferred, private)]
+
+    # Returns the first accid of object k (as for get), or None.
+    def first(self, k, preferred=None, private=None):
+        keys = self.keys
+        i = bisect_left(keys, k)
+        while i < len(keys) and keys[i] == k:
+            if self._matches(i, preferred, private):
+                return self.accid(i)
+            i += 1
+        return None
+
+    # Returns the keys of the objects having accid (as for get).
+    def find(self, accid, preferred=None, private=None):
+        if self.byAccid is None:
+            self.byAccid = array('I', sorted(range(len(self.keys)), key=self.accid))
+        ix = self.byAccid
+        lo, hi = 0, len(ix)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.accid(ix[mid]) < accid:
+                lo = mid + 1
+            else:
+                hi = mid
+        keys = []
+        while lo < len(ix) and self.accid(ix[lo]) == accid:
+            if self._matches(ix[lo], preferred, private):
+                keys.append(self.keys[ix[lo]])
+            lo += 1
+        return keys
+
+    # Iterates over (object key, accid), for all rows (as for get).
+    def items(self, preferred=None, private=None):
+        for i in range(len(self.keys)):
+            if self._matches(i, preferred, private):
+                yield self.keys[i], self.accid(i)
+
+    def memoryUsage(self):
+        return sum([sys.getsizeof(x) for x in (self.keys, self.offsets, self.accids, self.flags)]) \
+            + (sys.getsizeof(self.byAccid) if self.byAccid is not None else 0)
+
+class AccessionIndex:
+    QTMPLT = '''
+        SELECT _object_key, accid, preferred, private
+        FROM ACC_Accession
+        WHERE _mgitype_key = %d
+        AND _logicaldb_key = %d
+        ORDER BY _object_key
+        '''
+
+    def __init__(self, context):
+        self.context = context
+        self.sets = {}  # (mgitype, ldb) -> AccessionSet
+
+    # Returns the AccessionSet for MGI type key mgitype and logical db key ldb,
+    # loading it if needed.
+    def get(self, mgitype, ldb):
+        s = self.sets.get((mgitype, ldb))
+        if s is None:
+            s = self.sets[(mgitype, ldb)] = self.load(mgitype, ldb)
+        return s
+
+    def load(self, mgitype, ldb):
+        s = AccessionSet(mgitype, ldb)
+        group = []
+        for r in self.context.sqliter(self.QTMPLT % (mgitype, ldb), rows='tuple'):
+            if group and r[0] != group[0][0]:
+                group.sort()
+                s.extend(group)
+                group = []
+            group.append(tuple(r))
+        group.sort()
+        s.extend(group)
+        s.freeze()
+        return s
+
+    # Returns a list of (MGI type key, logical db key, rows, bytes used), one per
+    # set loaded, sorted by bytes used (largest first).
+    def memoryReport(self):
+        rpt = [(s.mgitype, s.ldb, len(s), s.memoryUsage()) for s in self.sets.values()]
+        rpt.sort(key=lambda x: -x[3])
+        return rpt
@@ -1,9 +1,15 @@
 from .AbstractItemDumper import *
 from .DataSourceDumper import DataSetDumper
-from .NoteUtils import iterNotes
 import re
 
 class AlleleDumper(AbstractItemDumper):
+    PRODUCES   = ['Allele', 'AlleleMolecularMutation', 'AlleleAttribute', 'AllelePublication', 'Synonym', 'DataSet']
+    REFERENCES = ['Marker', 'Organism', 'Reference', 'Strain', 'DataSource']
+    SINCE = ['a.modification_date']
+    SINCE_KEYS = {
+        'Allele' : 'SELECT _allele_key, modification_date FROM ALL_Allele',
+    }
+
     QTMPLT = '''
     SELECT 
         a._allele_key, 
@@ -37,6 +43,7 @@ class AlleleDumper(AbstractItemDumper):
     AND a._mode_key = t2._term_key
     AND a._transmission_key = t3._term_key
     AND a._collection_key = t4._term_key
+    %(SINCE_CLAUSE)s
 
     %(LIMIT_CLAUSE)s
     '''
@@ -65,23 +72,56 @@ class AlleleDumper(AbstractItemDumper):
       </item>
     '''
 
-    def loadAllele2StrainMap(self):
-        self.ak2sk = {}
-        q = '''
+    STRAIN_QTMPLT = '''
         SELECT pm._strain_key, pm._allele_key
         FROM PRB_Strain_Marker pm
         WHERE pm._allele_key is not null
         '''
+
+    MUTATION_QTMPLT = '''
+            SELECT _allele_key, _mutation_key
+            FROM ALL_Allele_Mutation
+            '''
+
+    ATTRIBUTE_QTMPLT = '''
+            SELECT va._object_key AS _allele_key, va._term_key AS _attribute_key, vt.term
+            FROM VOC_Annot va, VOC_Term vt
+            WHERE va._annottype_key = %(ALLELE_ATTRIBUTE_AKEY)d
+            AND va._term_key = vt._term_key
+            ORDER BY _allele_key, term
+            '''
+
+    DRIVER_QTMPLT = '''
+        select r._object_key_1, m.symbol
+        from mgi_relationship r, mrk_marker m
+        where r._category_key = 1006
+        and r._object_key_2 = m._marker_key
+        '''
+
+    EARLIEST_PUBS_QTMPLT = '''
+           select distinct aa._allele_key AS _allele_key, br._refs_key AS _refs_key, br.year
+           from MGI_Reference_Assoc ra, BIB_Refs br, ALL_Allele aa
+           where ra._refs_key = br._refs_key
+           and ra._object_key = aa._allele_key
+           and ra._mgitype_key = 11
+           order by aa._allele_key, br.year, br._refs_key
+           '''
+
+    PRELOADS = [STRAIN_QTMPLT, MUTATION_QTMPLT, ATTRIBUTE_QTMPLT, DRIVER_QTMPLT, EARLIEST_PUBS_QTMPLT]
+
+    # general, molecular and inducible notes
+    NOTES = [(1020, None), (1021, None), (1032, None)]
+
+    def loadAllele2StrainMap(self):
+        self.ak2sk = {}
+        q = self.constructQuery(self.STRAIN_QTMPLT)
         for r in self.context.sql(q):
             iref = self.context.makeItemRef('Strain', r['_strain_key'])
             self.ak2sk.setdefault(r['_allele_key'],[]).append(iref)
 
     def loadAllele2MutationMap(self):
         self.ak2mk = {}
-        q  = '''
-            SELECT _allele_key, _mutation_key
-            FROM ALL_Allele_Mutation
-            '''
+        q = self.constructQuery(self.MUTATION_QTMPLT)
         for r in self.context.sql(q):
             iref = self.context.makeItemRef('AlleleMolecularMutation',r['_mutation_key'])
             self.ak2mk.setdefault(r['_allele_key'],[]).append(iref)
@@ -89,13 +129,7 @@ class AlleleDumper(AbstractItemDumper):
     def loadAllele2AttributeMap(self):
         self.ak2atrs = {}
         self.ak2atrss= {}
-        q = '''
-            SELECT va._object_key AS _allele_key, va._term_key AS _attribute_key, vt.term
-            FROM VOC_Annot va, VOC_Term vt
-            WHERE va._annottype_key = %(ALLELE_ATTRIBUTE_AKEY)d
-            AND va._term_key = vt._term_key
-            ORDER BY _allele_key, term
-            ''' % self.context.QUERYPARAMS
+        q = self.constructQuery(self.ATTRIBUTE_QTMPLT)
         for r in self.context.sql(q):
             iref = self.context.makeItemRef('AlleleAttribute',r['_attribute_key'])
             self.ak2atrs.setdefault(r['_allele_key'],[]).append(iref)
@@ -104,7 +138,8 @@ class AlleleDumper(AbstractItemDumper):
 
     def _loadNotes(self, _notetype_key, parser=None):
         ak2notes = {}
-        for n in iterNotes(_notetype_key=_notetype_key):
+        for n in self.context.notes.iterate(_notetype_key):
+            n['note'] = n['note'].strip()
             n['note'] = parser(n['note']) if parser else n['note']
             k = n['_object_key']
             if k in ak2notes:
@@ -114,12 +149,7 @@ class AlleleDumper(AbstractItemDumper):
         return ak2notes
 
     def _loadDrivers(self):
-        q = '''
-        select r._object_key_1, m.symbol
-        from mgi_relationship r, mrk_marker m
-        where r._category_key = 1006
-        and r._object_key_2 = m._marker_key
-        '''
+        q = self.constructQuery(self.DRIVER_QTMPLT)
         ix = {}
         for r in self.context.sql(q):
             ix[r['_object_key_1']] = r['symbol']
@@ -156,14 +186,7 @@ class AlleleDumper(AbstractItemDumper):
 
     def loadEarliestPublications(self):
        self.earliest_publications = {}
-       q = '''
-           select distinct aa._allele_key AS _allele_key, br._refs_key AS _refs_key, br.year
-           from MGI_Reference_Assoc ra, BIB_Refs br, ALL_Allele aa
-           where ra._refs_key = br._refs_key
-           and ra._object_key = aa._allele_key
-           and ra._mgitype_key = 11
-           order by aa._allele_key, br.year, br._refs_key
-           '''
+       q = self.constructQuery(self.EARLIEST_PUBS_QTMPLT)
        current_allele_key = 0;
        found_citeable = False
        for r in self.context.sql(q):
@@ -193,6 +216,9 @@ class AlleleDumper(AbstractItemDumper):
         self.loadNotes()
         # self.loadAllelePublications()
         self.loadEarliestPublications()
+        for name in ('ak2sk', 'ak2mk', 'ak2atrs', 'ak2atrss', 'ak2generalnotes', 'ak2molecularnotes',
+                     'ak2drivernotes', 'ak2induciblenotes', 'earliest_publications'):
+            setattr(self, name, self.context.preloads.add(self, name, getattr(self, name)))
 
 
     def processRecord(self, r):
@@ -212,7 +238,7 @@ class AlleleDumper(AbstractItemDumper):
         dsid = DataSetDumper(self.context).dataSet(name="Mouse Allele Catalog from MGI")
         r['dataSets'] = '<reference ref_id="%s"/>'%dsid
         r['mutations'] = ''.join(['<reference ref_id="%s" />'%x for x in self.ak2mk.get(ak,[])])
-        r['publications'] = ''.join(['<reference ref_id="%s"/>'%x for x in self.apd.ak2pubrefs.get(ak,[])])
+        r['publications'] = ''.join(['<reference ref_id="%s"/>'%x for x in sorted(self.apd.ak2pubrefs.get(ak,[]))])
         r['publications2'] = ''.join(['<reference ref_id="%s"/>'%x for x in self.apd.ak2apk.get(ak,[])])
         r['carriedBy'] = ''.join(['<reference ref_id="%s"/>'%x for x in self.ak2sk.get(ak,[])])
 
@@ -251,8 +277,6 @@ class AlleleDumper(AbstractItemDumper):
 
     def postDump(self):
         self.writeCount += AlleleSynonymDumper(self.context).dump(fname="Synonym.xml")
-        self.ak2generalnotes = None
-        self.ak2mk = None
 
 class AlleleAttributeDumper(AbstractItemDumper):
     QTMPLT = '''
@@ -317,6 +341,10 @@ class AllelePublicationDumper(AbstractItemDumper):
         self.ak2pubrefs.setdefault(ak, set()).add(r['publication'])
         return r
 
+    def postDump (self):
+        self.ak2apk = self.context.preloads.add(self, 'ak2apk', self.ak2apk)
+        self.ak2pubrefs = self.context.preloads.add(self, 'ak2pubrefs', self.ak2pubrefs)
+
 
 class AlleleSynonymDumper(AbstractItemDumper):
     QTMPLT = '''
@@ -332,7 +360,7 @@ class AlleleSynonymDumper(AbstractItemDumper):
       </item>
     '''
     def processRecord(self, r):
-        r['id'] = self.context.makeItemId('Synonym')
+        r['id'] = self.context.makeItemId('Synonym', content=('Allele', r['_allele_key'], r['label']))
         r['value'] = self.quote(r['label'])
         r['subject'] = self.context.makeItemRef('Allele', r['_allele_key'])
         return r
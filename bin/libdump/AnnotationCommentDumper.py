@@ -1,8 +1,10 @@
 from .AbstractItemDumper import *
-from libdump import NoteUtils
 
 
 class AnnotationCommentDumper(AbstractItemDumper):
+  PRODUCES   = ['Comment']
+  REFERENCES = []
+
   ITMPLT = '''
      <item class="Comment" id="%(id)s">
        <attribute name="type" value="%(type)s" />
@@ -10,23 +12,27 @@ class AnnotationCommentDumper(AbstractItemDumper):
      </item>
      '''
 
+  # general, background sensitivity and normal notes, of annotation evidence
+  NOTES = [(1008, 25), (1015, 25), (1031, 25)]
+
   recordCount = 0
 
   def mainDump(self):
-      for n in NoteUtils.iterNotes(_notetype_key=1008, _mgitype_key=25):
+      self.context.annotationComments = {}
+      for n in self.context.notes.iterate(1008, 25):
           n['type'] = 'MGI:General'
           self.preProcess(n)
 
-      for n in NoteUtils.iterNotes(_notetype_key=1015, _mgitype_key=25):
+      for n in self.context.notes.iterate(1015, 25):
           n['type'] = 'MGI:Background sensitivity'
           self.preProcess(n)
 
-      for n in NoteUtils.iterNotes(_notetype_key=1031, _mgitype_key=25):
+      for n in self.context.notes.iterate(1031, 25):
           n['type'] = 'MGI:Normal'
           self.preProcess(n)
 
   def preProcess(self, n):
           n['id'] = self.context.makeItemId('Comment',n['_note_key'])
-          n['note'] = self.quote(n['note'])
+          n['note'] = self.quote(n['note'].strip())
           self.context.annotationComments.setdefault(n['_object_key'],[]).append('<reference ref_id="%s"/>'%n['id'])
           self._processRecord(n)
@@ -8,6 +8,34 @@ import re
 from .DerivedAnnotationHelper import DerivedAnnotationHelper
 
 class AnnotationDumper(AbstractItemDumper):
+    PRODUCES   = ['OntologyAnnotation', 'OntologyAnnotationEvidence', 'OntologyAnnotationEvidenceCode', 'Vocabulary Term', 'DataSet']
+    REFERENCES = ['Marker', 'Genotype', 'Allele', 'Reference', 'Comment', 'DataSource']
+    COPY = True
+
+    # Delta dumps: annotations whose VOC_Annot record changed, and evidence whose
+    # VOC_Evidence or VOC_Annot record changed. Evidence codes are always dumped, so
+    # their query has no dates: it only lists the current ones, to find deleted codes.
+    SINCE = [['va.modification_date'], None, ['ve.modification_date', 'va.modification_date']]
+    SINCE_KEYS = {
+        'OntologyAnnotation' : '''
+            SELECT _annot_key, modification_date
+            FROM VOC_Annot
+            WHERE _annottype_key in (%(ANNOTTYPEKEYS)s)
+            ''',
+        'OntologyAnnotationEvidence' : '''
+            SELECT ve._annotevidence_key, ve.modification_date, va.modification_date
+            FROM VOC_Evidence ve, VOC_Annot va
+            WHERE ve._annot_key = va._annot_key
+            AND va._annottype_key in (%(ANNOTTYPEKEYS)s)
+            ''',
+        'OntologyAnnotationEvidenceCode' : '''
+            SELECT v._term_key
+            FROM VOC_Term v, VOC_AnnotType vat
+            WHERE vat._evidencevocab_key = v._vocab_key
+            AND vat._annottype_key in (%(ANNOTTYPEKEYS)s)
+            ''',
+    }
+
     QTMPLT = [
         #
         # Get data for each annotation.
@@ -38,6 +66,7 @@ class AnnotationDumper(AbstractItemDumper):
         AND aa.private = 0
         AND vt._vocab_key = vv._vocab_key
         AND aa._logicaldb_key = vv._logicaldb_key
+        %(SINCE_CLAUSE)s
         %(LIMIT_CLAUSE)s
         ''',
         #
@@ -76,6 +105,7 @@ class AnnotationDumper(AbstractItemDumper):
             VOC_Annot va 
         WHERE ve._annot_key = va._annot_key
         AND va._annottype_key in (%(ANNOTTYPEKEYS)s)
+        %(SINCE_CLAUSE)s
         %(LIMIT_CLAUSE)s
         ''']
 
@@ -285,7 +315,7 @@ class AnnotationDumper(AbstractItemDumper):
     def postDump(self):
         # Write out stub items for OntologyTerms.
         tmplt = '''<item class="%(class)s" id="%(id)s"> <attribute name="identifier" value="%(identifier)s" /> </item>\n'''
-        for t in self.termsToWrite:
+        for t in sorted(self.termsToWrite):
             r = { 'class':t[0], 'id':t[1], 'identifier':t[2] }
             self.writeItem(r, tmplt)
 
@@ -294,7 +324,7 @@ class AnnotationDumper(AbstractItemDumper):
 
         # need one more evidence code 
         c = {}
-        c['id'] = self.context.makeItemId('OntologyAnnotationEvidenceCode')
+        c['id'] = self.context.makeItemId('OntologyAnnotationEvidenceCode', content=('DOA',))
         c['class']= "OntologyAnnotationEvidenceCode"
         c['code'] = "DOA"
         c['name'] = "derived from other annotations"
@@ -323,7 +353,7 @@ class AnnotationDumper(AbstractItemDumper):
                 if arks['existing']:
                     r['id'] = self.context.makeItemRef('OntologyAnnotation', arks['existing'])
                 else:
-                    r['id'] = self.context.makeItemId('OntologyAnnotation') # start auto-assigning.
+                    r['id'] = self.context.makeItemId('OntologyAnnotation', content=(type, k, tk)) # start auto-assigning.
                     r['class'] = "OntologyAnnotation"
                     r['subject'] = self.context.makeItemRef(type, k)
                     r['ontologyterm'] = self.context.makeItemRef('Vocabulary Term', tk)
@@ -331,14 +361,14 @@ class AnnotationDumper(AbstractItemDumper):
                     r['dataSets'] = '<reference ref_id="%s"/>' % dsref
                 #
                 s = {}
-                s['id'] = self.context.makeItemId('OntologyAnnotationEvidence') # start auto-assigning
+                s['id'] = self.context.makeItemId('OntologyAnnotationEvidence', content=(type, k, tk)) # start auto-assigning
                 s['class'] = 'OntologyAnnotationEvidence'
                 s['annotation'] = r['id']
                 s['inferredfrom'] = ''
                 s['code'] = c['id']
                 #
                 ars = []
-                for ak in arks['annots']:
+                for ak in sorted(arks['annots']):
                     try:
                         ar = self.context.makeItemRef("OntologyAnnotation", ak)
                         ars.append('<reference ref_id="%s" />'%ar)
@@ -347,7 +377,7 @@ class AnnotationDumper(AbstractItemDumper):
                 s['baseAnnotations'] = ''.join(ars)
                 #
                 rrs = []
-                for rk in arks['refs']:
+                for rk in sorted(arks['refs']):
                     try:
                         rr = self.context.makeItemRef("Reference", rk)
                         rrs.append('<reference ref_id="%s" />'%rr)
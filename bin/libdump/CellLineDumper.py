@@ -1,6 +1,9 @@
 from .AbstractItemDumper import *
 
 class CellLineDumper(AbstractItemDumper):
+    PRODUCES   = ['CellLine', 'CellLineDerivation']
+    REFERENCES = ['Allele', 'Reference', 'Strain']
+
     QTMPLT = '''
     SELECT 
         cl._cellline_key,
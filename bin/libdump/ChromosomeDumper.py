@@ -1,6 +1,9 @@
 from .AbstractItemDumper import *
 
 class ChromosomeDumper(AbstractItemDumper):
+    PRODUCES   = ['Chromosome', 'SOTerm']
+    REFERENCES = ['Organism']
+
     QTMPLT = '''
     SELECT c._organism_key, c.chromosome, o.commonname, mc._chromosome_key, max(c.endcoordinate) AS length
     FROM mrk_location_cache c, mgi_organism o, mrk_chromosome mc
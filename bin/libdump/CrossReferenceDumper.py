@@ -3,6 +3,11 @@ from .AbstractItemDumper import *
 
 
 class CrossReferenceDumper(AbstractItemDumper):
+    PRODUCES   = ['CrossReference']
+    REFERENCES = ['DataSource']
+    ROWS = 'tuple'
+    COPY = True
+
     QTMPLT = '''
     SELECT a._accession_key, a.accid, a._logicaldb_key, a._object_key, a._mgitype_key
     FROM ACC_Accession a
@@ -25,6 +30,10 @@ class CrossReferenceDumper(AbstractItemDumper):
         clauses = []
         if mgiTypeKeys :
             clauses.append('a._mgitype_key in (%s)'%fmt(mgiTypeKeys))
+            self.REFERENCES = self.REFERENCES + [self.context.TK2TNAME[k] for k in mgiTypeKeys]
+        else:
+            # could reference anything
+            self.REFERENCES = None
         if ldbKeys:
             clauses.append('a._logicaldb_key in (%s)'%fmt(ldbKeys))
         if notLdbKeys:
@@ -40,10 +49,11 @@ class CrossReferenceDumper(AbstractItemDumper):
 
     def processRecord(self, r):
         try:
-            r['subject'] = self.context.makeItemRef(r['_mgitype_key'], r['_object_key'])
+            subject = self.context.makeItemRef(r['_mgitype_key'], r['_object_key'])
         except:
             return None;
-        r['identifier'] = self.quote(r['accid'])
-        r['source'] = self.context.makeItemRef('DataSource', r['_logicaldb_key'])
-        r['id'] = self.context.makeItemId('CrossReference', r['_accession_key'])
-        return r
+        return ItemRecord(r,
+            subject = subject,
+            identifier = self.quote(r['accid']),
+            source = self.context.makeItemRef('DataSource', r['_logicaldb_key']),
+            id = self.context.makeItemId('CrossReference', r['_accession_key']))
@@ -2,6 +2,9 @@
 from .AbstractItemDumper import *
 
 class DataSourceDumper(AbstractItemDumper):
+    PRODUCES   = ['DataSource']
+    REFERENCES = []
+
     QTMPLT = '''
     SELECT db._logicaldb_key, db.name, db.description, ab.name AS aname, ab.url
     FROM ACC_LogicalDB db
@@ -66,9 +69,10 @@ class DataSetDumper(AbstractItemDumper):
             self.context.dataSetByName = {}
         n = rec['name']
         id = self.context.dataSetByName.get(n, None)
-        if id:
+        if id and self.context.writtenThisRun(id):
             return id
-        id = self.context.makeItemId('DataSet')
+        if not id:
+            id = self.context.makeItemId('DataSet', content=(n,))
         rec['id'] = id
         if 'dataSource' not in rec:
             # if not specified, assume source is MGI
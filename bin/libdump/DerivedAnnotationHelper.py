@@ -86,6 +86,9 @@ class DerivedAnnotationHelper:
         self._loadGenotypeIndexes()
         self._loadGenotypeAnnotations()
         self._loadAlleleAnnotations()
+        if hasattr(context, 'preloads'):
+            for t in list(self.k2annots):
+                self.k2annots[t] = context.preloads.add(self, 'k2annots.' + t, self.k2annots[t])
 
     def __addkeys__(self, type, k, vk, tk, rk,ak):
         vti = self.k2annots.setdefault(type,{}).setdefault(k,{}).setdefault(vk,{})
@@ -110,7 +113,7 @@ class DerivedAnnotationHelper:
     #      }
     #
     def iterAnnots(self, which):
-        for k, kdata  in self.k2annots[which].items():
+        for k, kdata  in self.k2annots.get(which, {}).items():
             for vk, tdata in kdata.items():
                 for tk, arks in tdata.items():
                     yield (k, vk, tk, arks)
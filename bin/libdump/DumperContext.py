@@ -1,6 +1,19 @@
 from .common import *
 from . import mgidbconnect as db
+from .IdRegistry import IdRegistry, iterBits
+from .AccessionIndex import AccessionIndex
+from .NoteUtils import NoteLoader
+from .Preloads import Preloads
+from .OutputWriter import OutputWriter
+from .QueryCache import QueryCache
+from .Metrics import Metrics
+from .Explainer import Explainer
 import time
+import pickle
+import shutil
+import hashlib
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 
 class DumperContext:
 
@@ -13,13 +26,45 @@ class DumperContext:
     class DanglingReferenceError(ItemError):
         pass
 
-    def __init__(self, debug=False, dir=".", limit=None, defs={}, logfile=None, logconsole=True, checkRefs=True):
+    # Context attributes, other than the id maps, that hold state belonging
+    # to an item type. When a dumper runs in a worker process, this state travels
+    # back to the parent along with the type's id map (see DumperScheduler).
+    TYPE_STATE = {
+        'DataSet'    : ['dataSetByName'],
+        'DataSource' : ['dataSourceByName'],
+        'SOTerm'     : ['soIds'],
+        'Comment'    : ['annotationComments'],
+    }
+
+    def __init__(self, debug=False, dir=".", limit=None, defs={}, logfile=None, logconsole=True, checkRefs=True, poolSize=4, writeQueueSize=64, compress=None, cache=True, cacheDir=None, since=None, stableIds=None, keepIdMap=False, profile=None, explain=False, memoryBudget=None):
         self.debug=debug
         self.dir = dir
         self.limit=limit
         self.fname = None
         self.checkRefs = checkRefs
-        db.setConnectionFromPropertiesFile()
+        # run metrics, reported in <dir>/metrics.json (see Metrics)
+        self.metrics = Metrics()
+        # dumper profiling, if asked for (see Profiler; only imported then)
+        self.profiler = None
+        if profile:
+            from .Profiler import Profiler
+            self.profiler = Profiler(profile, dir)
+        # query plan audit (see Explainer); set up once the context has loaded what it needs
+        self.explainer = None
+        # items written to the current output file, not yet added to the metrics
+        self.nFileItems = 0
+        if db.HOST is None and db.getBackend().name == 'postgres':
+            db.setConnectionFromPropertiesFile()
+        # database connections, shared by all queries run through this context
+        self.pool = db.ConnectionPool(maxsize=poolSize)
+        # query result cache; opened once the dump date is known
+        self.cache = None
+        # footprints of the dumpers' preload indexes, and the budget for them (see Preloads)
+        self.preloads = Preloads(self, memoryBudget)
+        # results of queries being prefetched: (query, rows) -> (future, query record)
+        self.prefetched = {}
+        # output files are written (and optionally compressed) by a background thread (see OutputWriter)
+        self.writer = OutputWriter(queueSize=writeQueueSize, compress=compress)
         self.fd = sys.stdout
         if logfile:
             self.logfile = os.path.abspath(os.path.join(os.getcwd(), logfile))
@@ -142,6 +187,9 @@ class DumperContext:
             #
             'TAXAIDS' : COMMA.join(["'%d'"%o for o in TAXAIDS]),
             'LIMIT_CLAUSE' : limit and (' LIMIT %d '%limit) or '',
+            # in a delta dump, restricts a query to rows changed since the previous run
+            # (see AbstractItemDumper.SINCE)
+            'SINCE_CLAUSE' : '',
 
             #
             'ORGANISMKEYS' : '1,2',
@@ -192,21 +240,69 @@ class DumperContext:
         # load MGI datadump timestamp from the database
         self.loadMgiDbinfo()
 
+        # Query results are cached on disk, by dump date, for reruns (see QueryCache).
+        # The cache is shared by runs writing to different directories.
+        if cache:
+            self.cache = QueryCache(cacheDir or QueryCache.defaultDir(), self.mgi_dbinfo['lastdump_date'])
+            self.log('Query cache: %s' % self.cache.tagdir)
+            for t in self.cache.evicted:
+                self.log('Query cache: removed results for dump date %s' % t)
+
         # map integer type ids to type names
         self.TK2TNAME = dict([(x[1],x[0]) for x in list(self.TYPE_KEYS.items())])
 
-        # Maps type name to next-id for allocating IDs.
+        # Id allocation, key mapping, and which ids have been written out (see IdRegistry).
         # Generally, for a given type, either all IDs are generated
         # or all IDs are constructed from existing MGI keys.
-        self.NEXT_ID = { }
-
-        # Two-level map { type -> { mgi-key -> mapped-key }}
-        self.KEY_MAP = {}
+        self.ids = IdRegistry()
 
         #
         # Keep track of item ids that have been written out.
+        # (The registry supports "id in idsWritten" and idsWritten.add(id), as a set would.)
         #
-        self.idsWritten = set()
+        self.idsWritten = self.ids
+
+        # Accession ids, by MGI type and logical db, loaded as dumpers ask for them (see AccessionIndex).
+        self.accessions = AccessionIndex(self)
+
+        # Notes, for all the note types the run's dumpers register, loaded in one pass (see NoteLoader).
+        self.notes = NoteLoader(self)
+
+        # If not None, output files are written as headerless parts named
+        # <dir>/.parts/<partTag>.<fname>, to be assembled later by the parent process.
+        self.partTag = None
+        self.partFiles = []
+        # If not None, the set of (integer) types makeItemRef has looked up, which a
+        # worker process checks against its dumper's REFERENCES (see DumperScheduler).
+        self.referenced = None
+
+        # Delta dumps. If since is given (the output directory of a previous run), the
+        # previous run's id map is loaded, and dumpers that support it only dump objects
+        # changed since then (see loadIdMap).
+        self.since = None
+        self.runWritten = None
+        # where the id sequences of the previous run ended (delta dumps and stable ids)
+        self.prevNextIds = None
+        if since:
+            self.loadIdMap(since)
+
+        # Stable ids. If stableIds is given (an id map file), the id map is read from it,
+        # and saved back with any new keys at the end (see loadStableIds).
+        self.stableIds = None
+        if stableIds:
+            if since:
+                raise RuntimeError('--stable-ids cannot be combined with --since (a delta dump keeps the previous ids anyway).')
+            self.loadStableIds(stableIds)
+
+        # Items with no local key are keyed by their content (see makeGlobalKey) only if
+        # their ids must carry over to another run: with stable ids, in a delta dump, or
+        # with keepIdMap (a later delta dump will start from this run). Otherwise they
+        # are just numbered, with no hashing and nothing added to the key map.
+        self.contentKeys = bool(stableIds or since or keepIdMap)
+
+        # Identifies the run (dumpers, options) for checkpoints. Set by the caller;
+        # a checkpoint is only resumed by a run with the same signature.
+        self.runSignature = None
 
         # apply command-line definitions to the context
         for n,v in defs.items():
@@ -221,12 +317,17 @@ class DumperContext:
 
         # list of non standard publications  
         # aka private or de-emphasized in MGI
-
-        self.unciteablePubs = {}
-        self.loadUnciteablePubs()
+        # (self.unciteablePubs, loaded by isPubCiteable when first needed)
 
         self.annotationComments = {}
 
+        # freed once the dumpers using them are done (see Preloads)
+        self.preloads.share('unciteablePubs', ['FeatureDumper', 'AlleleDumper'])
+        self.preloads.share('annotationComments', ['AnnotationDumper'])
+
+        # From here on, with explain, queries are only planned, not run.
+        self.explainer = Explainer(self) if explain else None
+
     # query based on PrivateRefSet.py in femover
     #   the Reference Type Key 31576687 is 'Peer Reviewed Article' (_vocab_key = 131)
     def loadUnciteablePubs(self):
@@ -238,12 +339,16 @@ class DumperContext:
               and acc._LogicalDB_key = 1
               and br._referencetype_key != 31576687
               '''
-       for r in db.sql(q):
-         self.unciteablePubs[r['_refs_key']] = 1;
+       self.unciteablePubs = {}
+       for r in self.sqliter(q, rows='tuple'):
+         self.unciteablePubs[r[0]] = 1;
 
     # returns true if the refKey is not in the list of unciteable reference keys
+    # (loading the list the first time, or again if it has been freed; see Preloads)
     #
     def isPubCiteable(self,refKey):
+        if not hasattr(self, 'unciteablePubs'):
+            self.loadUnciteablePubs()
         return refKey not in self.unciteablePubs
 
  
@@ -267,7 +372,7 @@ class DumperContext:
             SELECT _mgitype_key, name
             FROM ACC_MGIType
             '''
-        for r in db.sql(q):
+        for r in db.sql(q, pool=self.pool):
             tkeys[r['name']] = r['_mgitype_key']
         return tkeys
 
@@ -284,82 +389,595 @@ class DumperContext:
     #    mapping for type+localKey. (Used to generate the id values for new items.) If True, there must
     #    be an existing mapping for type+localKey. (Use for generating values for reference and collection
     #    attributes. If None, no existence check is made.
+    #  content (tuple) Only applies if localKey is not provided. Values identifying the item
+    #    (e.g., its subject's key and its text). If contentKeys is set, the item is keyed by
+    #    these, so the id map the run saves gives it the same id in a later delta dump
+    #    (--since), or with stable ids, as long as its content is the same. Otherwise, ignored.
     # Returns:
     #   An identifier string of the form "n_m"
     #
-    def makeGlobalKey(self, itemType, localkey=None, exists=None):
+    def makeGlobalKey(self, itemType, localkey=None, exists=None, content=None):
         # 
         n = self.TYPE_KEYS[itemType] if type(itemType) is str else itemType
-        kmap = self.KEY_MAP.setdefault(n, {})
-        m = self.NEXT_ID.setdefault(n, 1)
+        t = self.ids.get(n)
         if localkey is None:
-            # no local key, so no key mapping worries
-            self.NEXT_ID[n] += 1
+            if content is not None and self.contentKeys:
+                # use (and map) the key derived from the content
+                k = self.contentKey(t, content)
+                m = t.get(k)
+                if not m:
+                    m = t.allocate()
+                    t.put(k, m)
+                t.claim(m)
+            else:
+                # no local key, so no key mapping worries
+                m = t.allocate()
         elif self.checkRefs and exists is True:
             # Generating a reference.
             # Enforce key mapping already exists, and that the object has was actually writtem
             # and use the mapped key
-            m = kmap.get(localkey, None)
-            if not m or ('%d_%d' % (n,m)) not in self.idsWritten:
-                raise DumperContext.DanglingReferenceError('itemType=%d, localkey=%d' % (n, localkey))
+            m = t.getWritten(localkey)
+            if not m:
+                raise DumperContext.DanglingReferenceError('itemType=%d, localkey=%s' % (n, localkey))
+            if self.referenced is not None:
+                self.referenced.add(n)
         elif self.checkRefs and exists is False:
             # Generating an id. 
             # Enforce we haven't already seen it (no duplicates)
             # Increment the counter
-            if localkey in kmap:
-                raise DumperContext.DuplicateIdError('itemType=%d, localkey=%d' % (n, localkey))
-            self.NEXT_ID[n] += 1
-            kmap[localkey] = m
+            # (In a delta dump or with stable ids, an id mapped by the previous run is reused, once.)
+            m = t.get(localkey)
+            if m and not self.isReusable(n, m):
+                raise DumperContext.DuplicateIdError('itemType=%d, localkey=%s' % (n, localkey))
+            if not m:
+                m = t.allocate()
+                t.put(localkey, m)
         else:
             # Don't care, just do the right thing.
             # If already seen, use the mapped key.
             # Otherwise, increment the counter.
-            if localkey in kmap:
-                m = kmap[localkey]
-            else:
-                kmap[localkey] = m
-                self.NEXT_ID[n] += 1
+            m = t.get(localkey)
+            if not m:
+                m = t.allocate()
+                t.put(localkey, m)
         id = '%d_%d' % (n,m)
         return id
 
-    def makeItemId(self, itemType, localKey=None):
-        return self.makeGlobalKey(itemType, localKey, False)
+    def makeItemId(self, itemType, localKey=None, content=None):
+        return self.makeGlobalKey(itemType, localKey, False, content)
 
     def makeItemRef(self, itemType, localKey):
         return self.makeGlobalKey(itemType, localKey, True)
 
+    # Returns the state associated with item type n (an integer type key):
+    # its registry entry (next id, key map, ids written), and any context
+    # attributes listed in TYPE_STATE.
+    #
+    def getTypeState(self, n):
+        attrs = {}
+        for a in self.TYPE_STATE.get(self.TK2TNAME.get(n), []):
+            if hasattr(self, a):
+                attrs[a] = getattr(self, a)
+        return (self.ids.types.get(n), attrs)
+
+    # Replaces the state associated with item type n with a value
+    # returned by getTypeState.
+    #
+    def setTypeState(self, n, state):
+        tids, attrs = state
+        if tids is None:
+            self.ids.types.pop(n, None)
+        else:
+            self.ids.types[n] = tids
+        for a in self.TYPE_STATE.get(self.TK2TNAME.get(n), []):
+            if a in attrs:
+                setattr(self, a, attrs[a])
+            elif hasattr(self, a):
+                delattr(self, a)
+
     # Wrapper that logs sql queries.
     #
-    def sql(self, q, p=None, args={}):
+    # Single SELECT queries go through the query cache, if there is one.
+    #
+    # Runs query q (or a list of queries), as mgidbconnect.sql does. Timings, row counts
+    # and bytes are recorded in the metrics.
+    #
+    # A query being prefetched (see prefetching) gets the prefetched rows.
+    #
+    def sql(self, q, p=None, args={}, rows='dict', copy=False):
+        pf = self.prefetched.pop((q, rows), None) if self.prefetched and type(q) is str else None
         self.log(str(q))
-        return db.sql(q, p, args=args)
-
-    def sqliter(self, q):
+        if pf is not None:
+            return self.takePrefetched(pf, p, args)
+        return self.runSql(q, p, args, rows, copy, self.metrics.query(q))
+
+    def runSql(self, q, p, args, rows, copy, rec):
+        if self.explainer is not None:
+            return self.explainer.sql(q, p, rec)
+        if self.cache is not None and self.cache.cacheable(q):
+            it = self.metrics.timeRows(self.cache.iterate(q, \
+                lambda: db.sqliter(q, pool=self.pool, rows=rows, copy=copy, stats=rec), rows, rec), rec)
+            if p is None:
+                return list(it)
+            for r in it:
+                p(r, **args)
+            return None
+        if callable(p):
+            timed, done = self.metrics.timeParser(p, rec)
+            result = db.sql(q, timed, args=args, pool=self.pool, rows=rows, copy=copy, stats=rec)
+            done()
+            return result
+        t0 = time.perf_counter()
+        result = db.sql(q, p, args=args, pool=self.pool, rows=rows, copy=copy, stats=rec)
+        rec['totalTime'] = rec['fetchTime'] = rec['firstRowTime'] = round(time.perf_counter() - t0, 6)
+        if type(result) is list and type(q) is str:
+            rec['rows'] = len(result)
+        return result
+
+    # Prefetching. Within the block, the given queries run at the same time, each in a
+    # thread of its own (up to PREFETCH_THREADS), on its own pooled connection. When one
+    # of them is then run through sql() with the same row type, it gets the rows as soon
+    # as they are in. Rows are still processed by the caller, in the order it runs the
+    # queries, so the outcome (e.g., ids allocated) is as without prefetching.
+    # Prefetched rows that are not asked for by the end of the block are dropped.
+    #
+    PREFETCH_THREADS = 8
+
+    @contextmanager
+    def prefetching(self, queries, rows='dict'):
+        queries = [q for q in dict.fromkeys(queries) if (q, rows) not in self.prefetched]
+        if not queries or self.explainer is not None:
+            yield
+            return
+        executor = ThreadPoolExecutor(max_workers=min(len(queries), self.PREFETCH_THREADS), thread_name_prefix='prefetch')
+        keys = []
+        for q in queries:
+            rec = self.metrics.query(q)
+            rec['prefetched'] = True
+            self.prefetched[(q, rows)] = (executor.submit(self.runSql, q, None, {}, rows, False, rec), rec)
+            keys.append((q, rows))
+        self.log('Prefetching %d queries.' % len(keys))
+        try:
+            yield
+        finally:
+            for k in keys:
+                if self.prefetched.pop(k, None) is not None:
+                    self.log('Prefetched, but not used:\n%s' % k[0])
+            executor.shutdown(wait=False)
+
+    def takePrefetched(self, pf, p, args):
+        future, rec = pf
+        t0 = time.perf_counter()
+        result = future.result()
+        rec['waitTime'] = round(time.perf_counter() - t0, 6)
+        if p is None:
+            return result
+        for r in result:
+            p(r, **args)
+        return None
+
+    def sqliter(self, q, rows='dict', copy=False):
         self.log(str(q))
-        return db.sqliter(q)
+        rec = self.metrics.query(q)
+        if self.explainer is not None:
+            self.explainer.sql(q, None, rec)
+            return iter(())
+        if self.cache is not None and self.cache.cacheable(q):
+            it = self.cache.iterate(q, lambda: db.sqliter(q, pool=self.pool, rows=rows, copy=copy, stats=rec), rows, rec)
+        else:
+            it = db.sqliter(q, pool=self.pool, rows=rows, copy=copy, stats=rec)
+        return self.metrics.timeRows(it, rec)
+
+    # Closes pooled connections and logs how much connection setup the pool saved. 
+    # The savings estimate assumes every request would otherwise have opened its
+    # own connection, at the average cost observed.
+    #
+    def closePool(self):
+        self.pool.closeAll()
+        s = self.pool.getStats()
+        avg = s['connectTime'] / s['connects'] if s['connects'] else 0.0
+        self.log('Database connections: %d requests, %d connections opened (%d reconnects), %.3fs setup (avg %.1fms/connection).' % \
+            (s['requests'], s['connects'], s['reconnects'], s['connectTime'], 1000*avg))
+        self.log('Estimated connection setup time saved by pooling: %.3fs.' % ((s['requests'] - s['connects']) * avg))
+
+    # Logs how many queries the query cache answered.
+    #
+    def logQueryCache(self):
+        if self.cache is None:
+            return
+        s = self.cache.getStats()
+        self.log('Query cache: %d queries from cache (%d rows), %d queries stored (%d bytes).' % \
+            (s['hits'], s['rows'], s['misses'], s['bytes']))
+
+    # Logs how much memory the id registry uses, per type.
+    #
+    def logIdRegistry(self):
+        rpt = self.ids.memoryReport()
+        self.log('Id registry: %d types, %d keys mapped, %d ids written, %d bytes.' % \
+            (len(rpt), sum([x[1] for x in rpt]), sum([x[2] for x in rpt]), sum([x[4] for x in rpt])))
+        for n, nkeys, nwritten, nextid, nbytes in rpt:
+            self.log('    %-32s keys=%-10d written=%-10d nextid=%-10d bytes=%d' % \
+                (self.TK2TNAME.get(n, str(n)), nkeys, nwritten, nextid, nbytes), timestamp=False)
+
+    # Logs how much memory the accession index uses, per set loaded.
+    #
+    def logAccessionIndex(self):
+        rpt = self.accessions.memoryReport()
+        self.log('Accession index: %d sets, %d rows, %d bytes.' % \
+            (len(rpt), sum([x[2] for x in rpt]), sum([x[3] for x in rpt])))
+        for tk, ldb, nrows, nbytes in rpt:
+            self.log('    %-32s ldb=%-6d rows=%-10d bytes=%d' % \
+                (self.TK2TNAME.get(tk, str(tk)), ldb, nrows, nbytes), timestamp=False)
 
     def openOutput(self, fname):
         if self.fd and not self.fd.closed:
             self.fd.flush()
-        self.fname = os.path.abspath(os.path.join(self.dir, fname))
+        self.countFileItems()
+        self.fname = os.path.abspath(os.path.join(self.dir, fname)) + self.writer.suffix
         if not os.path.exists(self.dir):
             os.makedirs(self.dir)
         self.fd = self.outfiles.get(self.fname, None)
-        if self.fd is None:
+        if self.fd is None and self.partTag is not None:
+            # open a new part file. No header - the parent adds it when assembling.
+            pdir = os.path.join(self.dir, '.parts')
+            if not os.path.exists(pdir):
+                os.makedirs(pdir)
+            pname = os.path.join(pdir, '%s.%s' % (self.partTag, os.path.basename(self.fname)))
+            self.fd = self.writer.open(pname)
+            self.outfiles[self.fname]=self.fd
+            self.partFiles.append((fname, pname))
+        elif self.fd is None:
             # open a new output file
-            self.fd = open(self.fname, 'w')
+            self.fd = self.writer.open(self.fname)
             self.outfiles[self.fname]=self.fd
             self.fd.write('<?xml version="1.0"?>\n')
             self.fd.write('<items>\n')
 
     def writeOutput(self, id, s):
         self.idsWritten.add( id )
+        if self.runWritten is not None:
+            self.runWritten.add( id )
+        self.nFileItems += 1
         self.fd.write(s)
 
+    # Adds the items written to the current output file to the metrics.
+    #
+    def countFileItems(self):
+        if self.nFileItems:
+            f = os.path.basename(self.fname)
+            self.metrics.fileItems[f] = self.metrics.fileItems.get(f, 0) + self.nFileItems
+            self.nFileItems = 0
+
+    # Writes the metrics report, <dir>/metrics.json. run: anything else to report (see Metrics.write).
+    #
+    def writeMetrics(self, run={}):
+        self.countFileItems()
+        path = os.path.join(self.dir, 'metrics.json')
+        self.metrics.write(path, run)
+        self.log('Metrics written to %s.' % path)
+
+    # True if the item with the given id has been written by this run. Ids cached in
+    # TYPE_STATE attributes (e.g., data sets) may come from the previous run in a delta
+    # dump, in which case their items have to be written again.
+    #
+    def writtenThisRun(self, id):
+        return self.runWritten is None or id in self.runWritten
+
     def closeOutputs(self):
+        self.countFileItems()
         for fname,fd in list(self.outfiles.items()):
-            fd.write('\n</items>\n')
+            if self.partTag is None:
+                fd.write('\n</items>\n')
             fd.close()
+        self.writer.stop()
+
+    #
+    # Checkpoints. After each dumper finishes, the state later dumpers depend on (id
+    # registry, TYPE_STATE attributes) is saved in <dir>/.checkpoint, along with the size
+    # of each output file so far. A resumed run restores that state, cuts the output
+    # files back to those sizes, and carries on with the next dumper. Under --jobs, a
+    # checkpoint is taken whenever the first n dumpers have all finished; their part files
+    # are kept and listed in the checkpoint, to be assembled on resume.
+    #
+    CHECKPOINT_FORMAT = 1
+
+    def checkpointPath(self):
+        return os.path.join(self.dir, '.checkpoint', 'state.pkl')
+
+    def checkpointSignature(self):
+        return (self.CHECKPOINT_FORMAT, str(self.mgi_dbinfo['lastdump_date']), self.writer.compress, self.runSignature)
+
+    # Saves a checkpoint after the first 'done' dumpers, which wrote 'total' items.
+    # parts lists part files (fname, partfile) not yet assembled. states maps type keys
+    # to states (see getTypeState) to save in place of the current ones.
+    #
+    def saveCheckpoint(self, done, total, parts=[], states={}):
+        current = dict([(n, self.getTypeState(n)) for n in states])
+        for n, state in states.items():
+            self.setTypeState(n, state)
+        try:
+            self._saveCheckpoint(done, total, parts)
+        finally:
+            for n, state in current.items():
+                self.setTypeState(n, state)
+        self.log('Checkpoint: %d dumpers done, %d items written.' % (done, total))
+
+    def _saveCheckpoint(self, done, total, parts):
+        files = {}
+        for fname,fd in self.outfiles.items():
+            fd.flush()
+            files[fname] = os.path.getsize(fd.name)
+        attrs = {}
+        for names in self.TYPE_STATE.values():
+            for a in names:
+                if hasattr(self, a):
+                    attrs[a] = getattr(self, a)
+        state = {
+            'signature' : self.checkpointSignature(),
+            'done'      : done,
+            'total'     : total,
+            'files'     : files,
+            'parts'     : list(parts),
+            'ids'       : self.ids,
+            'attrs'     : attrs,
+            'delta'     : self.since and (self.runWritten, self.sinceCleared, self.sinceTypes),
+        }
+        path = self.checkpointPath()
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as fd:
+            pickle.dump(state, fd, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    # Restores the last checkpoint. Returns (number of dumpers done, items written).
+    #
+    def loadCheckpoint(self):
+        path = self.checkpointPath()
+        if not os.path.exists(path):
+            raise RuntimeError('No checkpoint to resume from: ' + path)
+        with open(path, 'rb') as fd:
+            state = pickle.load(fd)
+        if state['signature'] != self.checkpointSignature():
+            raise RuntimeError('Checkpoint %s is from a different run (dumpers, options, or MGI dump date). Start over without --resume.' % path)
+        self.ids = self.idsWritten = state['ids']
+        for a,v in state['attrs'].items():
+            setattr(self, a, v)
+        if state['delta']:
+            self.runWritten, self.sinceCleared, self.sinceTypes = state['delta']
+        for fname,size in state['files'].items():
+            os.truncate(fname, size)
+            self.outfiles[fname] = self.writer.open(fname, append=True)
+        done, total = state['done'], state['total']
+        self.log('Resuming from checkpoint: %d dumpers done, %d items written.' % (done, total))
+        if state['parts']:
+            for fname, pname in state['parts']:
+                self.openOutput(fname)
+                self.fd.copyFrom(pname)
+            self.saveCheckpoint(done, total)
+        pdir = os.path.join(self.dir, '.parts')
+        if os.path.isdir(pdir):
+            shutil.rmtree(pdir)
+        return done, total
+
+    # Removes the checkpoint, once the run has finished.
+    #
+    def removeCheckpoint(self):
+        cdir = os.path.dirname(self.checkpointPath())
+        if os.path.isdir(cdir):
+            shutil.rmtree(cdir)
+
+    #
+    # Id maps and delta dumps. At the end of every run, the id registry and TYPE_STATE
+    # attributes are saved in <dir>/.idmap.pkl. A delta run (--since PREVDIR) starts from
+    # the previous run's map, so objects keep their ids, and references to objects
+    # not dumped again still resolve. Dumpers that support it (see AbstractItemDumper.SINCE)
+    # only dump objects modified after the previous run's MGI dump date; the others
+    # dump everything, as usual. Items with no local key are keyed by their content
+    # (see makeGlobalKey), so those dumped again unchanged keep their ids too, provided
+    # the previous run keyed them so as well: a run a delta will start from is run with
+    # --keep-idmap (delta runs themselves always are). Otherwise they all get new ids,
+    # and the old ones are listed as deleted.
+    #
+    # Before such a dumper runs, clearChanged marks its previously written objects that
+    # have changed or gone as not written, so they are dumped again if they still qualify
+    # (and references to them fail if not). At the end, writeDeleted lists the ids written
+    # by the previous run but not this one, for:
+    #   - types handled by clearChanged: the objects it cleared that were not dumped again
+    #   - other types produced by a delta dumper: ids with no local key, or keyed by
+    #     content, not dumped again, except those cached in TYPE_STATE attributes
+    #   - types produced only by other dumpers: everything not dumped again
+    #
+    IDMAP_FORMAT = 1
+
+    def idMapPath(self, dir):
+        return os.path.join(dir, '.idmap.pkl')
+
+    def saveIdMap(self):
+        attrs = {}
+        for names in self.TYPE_STATE.values():
+            for a in names:
+                if hasattr(self, a):
+                    attrs[a] = getattr(self, a)
+        state = {
+            'format'      : self.IDMAP_FORMAT,
+            'dumpdate'    : self.mgi_dbinfo['lastdump_date'],
+            'contentKeys' : self.contentKeys,
+            'ids'         : self.ids,
+            'attrs'       : attrs,
+        }
+        path = self.idMapPath(self.dir)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as fd:
+            pickle.dump(state, fd, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    def loadIdMap(self, dir):
+        path = self.idMapPath(dir)
+        if not os.path.exists(path):
+            raise RuntimeError('No id map from a previous run: ' + path)
+        with open(path, 'rb') as fd:
+            state = pickle.load(fd)
+        if state['format'] != self.IDMAP_FORMAT:
+            raise RuntimeError('Id map %s has an unknown format.' % path)
+        self.since = os.path.abspath(dir)
+        self.sinceDate = state['dumpdate']
+        self.ids = self.idsWritten = state['ids']
+        for t in self.ids.types.values():
+            t.clearClaimed()
+        for a,v in state['attrs'].items():
+            setattr(self, a, v)
+        # what the previous run had written, and where its id sequences ended
+        self.sinceWritten = dict([(n, bytes(t.written)) for n,t in self.ids.types.items()])
+        self.prevNextIds = dict([(n, t.nextId) for n,t in self.ids.types.items()])
+        # ids written by this run
+        self.runWritten = IdRegistry()
+        # type key -> sequence numbers cleared by clearChanged
+        self.sinceCleared = {}
+        self.sinceTypes = set()
+        self.QUERYPARAMS['SINCE_DATE'] = "'%s'" % self.sinceDate
+        self.log('Delta dump: changes since %s (previous run: %s).' % (self.sinceDate, self.since))
+        if not state.get('contentKeys'):
+            self.log('Delta dump: the previous run was not run with --keep-idmap; items with no local key get new ids.')
+
+    # Clears the written marks of changed objects, before a delta dumper runs. keys maps
+    # type names to queries returning, for every current object of that type, its local key
+    # followed by its modification dates (if none, only objects gone are cleared).
+    #
+    def clearChanged(self, keys):
+        for tname, q in keys.items():
+            n = self.TYPE_KEYS[tname]
+            t = self.ids.get(n)
+            current = set()
+            changed = set()
+            for r in self.sql(q, rows='tuple'):
+                k = r[0]
+                current.add(k)
+                for d in r[1:]:
+                    if d is not None and d > self.sinceDate:
+                        changed.add(k)
+                        break
+            cleared = self.sinceCleared.setdefault(n, set())
+            mapped = set()
+            nGone = 0
+            for k, m in t.items():
+                if type(k) is bytes:
+                    continue # keyed by content: generated
+                mapped.add(m)
+                if t.isWritten(m) and (k in changed or k not in current):
+                    cleared.add(m)
+                    nGone += k not in current
+            nGenerated = 0
+            for m in iterBits(t.written):
+                if m not in mapped:
+                    cleared.add(m)
+                    nGenerated += 1
+            for m in cleared:
+                t.unmarkWritten(m)
+            self.sinceTypes.add(n)
+            self.log('Delta dump: %s: %d changed, %d gone, %d generated ids to replace.' % \
+                (tname, len(changed), nGone, nGenerated))
+
+    # Writes the list of ids deleted since the previous run to <dir>/DeletedItems.txt
+    # (one "id<TAB>type" per line). produced is the set of type names produced by
+    # the dumpers run, partial those produced by delta dumpers.
+    #
+    def writeDeleted(self, produced, partial):
+        deleted = []
+        for n, prev in sorted(self.sinceWritten.items()):
+            tname = self.TK2TNAME.get(n)
+            if tname not in produced:
+                continue
+            t = self.ids.get(n)
+            if n in self.sinceTypes:
+                cand = sorted(self.sinceCleared.get(n, ()))
+            elif tname in partial:
+                # ids cached in TYPE_STATE attributes are kept: objects not dumped
+                # again may still refer to them (generated items, keyed by content,
+                # are dumped again if they still exist)
+                mapped = set([m for k,m in t.items() if type(k) is not bytes])
+                for a in self.TYPE_STATE.get(tname, []):
+                    v = getattr(self, a, None)
+                    if isinstance(v, dict):
+                        mapped.update([int(id.split('_')[1]) for id in v.values()])
+                cand = [m for m in iterBits(prev) if m not in mapped]
+            else:
+                cand = iterBits(prev)
+            rw = self.runWritten.types.get(n)
+            for m in cand:
+                if rw is None or not rw.isWritten(m):
+                    deleted.append((n, m))
+                    t.unmarkWritten(m)
+        fname = os.path.join(self.dir, 'DeletedItems.txt')
+        with open(fname, 'w') as fd:
+            for n, m in deleted:
+                fd.write('%d_%d\t%s\n' % (n, m, self.TK2TNAME.get(n)))
+        self.log('Delta dump: %d deleted ids written to %s' % (len(deleted), fname))
+
+    #
+    # Stable ids (--stable-ids FILE). Sequence numbers are handed out in the order rows
+    # come back from the database, so normally the same object can get a different id in
+    # each run. With stable ids, the id map is kept in FILE: it is loaded at the start (if
+    # the file exists), and saved with any new keys at the end. Keys are never removed, so
+    # an object keeps its id for as long as the file is kept, and an id is never reused
+    # for a different object. Items without a local key are keyed by their content (see
+    # makeGlobalKey), so they keep their ids too. Identical input gives identical output.
+    #
+    def loadStableIds(self, path):
+        self.stableIds = os.path.abspath(path)
+        if not os.path.exists(self.stableIds):
+            self.log('Stable ids: starting a new id map in %s' % self.stableIds)
+            self.prevNextIds = {}
+            return
+        with open(self.stableIds, 'rb') as fd:
+            state = pickle.load(fd)
+        if state['format'] != self.IDMAP_FORMAT:
+            raise RuntimeError('Id map %s has an unknown format.' % self.stableIds)
+        self.ids = self.idsWritten = state['ids']
+        for t in self.ids.types.values():
+            t.clearWritten()
+            t.clearClaimed()
+        self.prevNextIds = dict([(n, t.nextId) for n,t in self.ids.types.items()])
+        self.log('Stable ids: %d keys loaded from %s' % (sum([t.nKeys for t in self.ids.types.values()]), self.stableIds))
+
+    def saveStableIds(self):
+        state = {
+            'format' : self.IDMAP_FORMAT,
+            'ids'    : self.ids,
+        }
+        tmp = self.stableIds + '.tmp'
+        with open(tmp, 'wb') as fd:
+            pickle.dump(state, fd, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.stableIds)
+        new = sum([t.nextId - self.prevNextIds.get(n, 1) for n,t in self.ids.types.items()])
+        self.log('Stable ids: id map saved to %s (%d new ids)' % (self.stableIds, new))
+
+    # True if sequence number m of type n was mapped by a previous run (delta dump or
+    # stable ids), and this run has not written it, i.e., makeItemId may hand it out.
+    #
+    def isReusable(self, n, m):
+        if self.prevNextIds is None or m >= self.prevNextIds.get(n, 1):
+            return False
+        w = self.runWritten if self.runWritten is not None else self.ids
+        return not w.get(n).isWritten(m)
+
+    # Returns the local key for an item of type t (a TypeIds) with the given content:
+    # a hash of the content (bytes, unlike any MGI key), plus a count for the second and
+    # later items with the same content in this run. A key counts as taken once this run
+    # has handed out its id, even if the item was then abandoned (e.g., for a dangling
+    # reference), so which key an item gets does not depend on whether an earlier item
+    # with the same content was written.
+    #
+    def contentKey(self, t, content):
+        h = hashlib.sha1(repr(content).encode('utf-8')).digest()[:12]
+        k = h
+        i = 0
+        while True:
+            m = t.get(k)
+            if not m or not t.isClaimed(m):
+                return k
+            i += 1
+            k = h + i.to_bytes(4, 'big')
 
     def log(self, s, timestamp=True, newline=True):
         newline = newline and "\n" or ""
@@ -0,0 +1,263 @@
+#
+# DumperScheduler.py
+#
+# Runs a list of dumpers several at a time, each in its own worker process,
+# producing the same output as running them one after another.
+#
+# Each dumper declares the item types it produces and the item types it references
+# (see PRODUCES and REFERENCES in AbstractItemDumper). A dumper must wait for an
+# earlier dumper in the list if the earlier one produces a type that it produces
+# or references. This defines a DAG. Any dumper whose predecessors have all
+# finished may start, up to the given number of jobs.
+#
+# Workers are forked, so each starts with the parent's context as it stands: the id maps
+# for everything finished so far. If a later dumper has already finished and produced
+# a type the starting dumper references, the worker rolls that type back to how it was
+# before the later dumper ran, so references resolve exactly as in a serial run.
+#
+# A worker checks that its dumper kept to what it declared: it fails if the dumper
+# produced (allocated ids in or wrote items of) a type not in PRODUCES, or looked up a
+# reference (makeItemRef) to a type in neither PRODUCES nor REFERENCES, as the
+# rollback above, and the order the dumpers run in, would not have covered it.
+#
+# When a worker finishes, it sends back the id registry entries (id maps and ids written)
+# and related context state (see DumperContext.TYPE_STATE) for the types it produced.
+# The parent merges these into its own context. Output goes into part files,
+# which the parent concatenates in list order at the end.
+#
+
+from .common import *
+import multiprocessing
+from multiprocessing.connection import wait
+import traceback
+
+class DumperTask:
+    def __init__(self, index, dumper, fname):
+        self.index = index
+        self.dumper = dumper
+        self.name = dumper.__class__.__name__
+        self.fname = fname
+        self.waitsFor = set()   # indexes of tasks that must finish first
+        self.started = False
+        self.done = False
+        self.count = 0
+        self.parts = []         # list of (fname, partfile)
+        # After the task finishes, these record what it changed, for rolling back
+        # in workers started afterwards for earlier tasks. Freed when no longer needed.
+        self.prior = {}         # type key -> state before the merge
+
+class DumperScheduler:
+
+    # checkpoint, if given, is called as checkpoint(n, count, parts, states) whenever
+    # the first n dumpers have all finished (see DumperContext.saveCheckpoint).
+    #
+    def __init__(self, context, dumpers, jobs, checkpoint=None):
+        self.context = context
+        self.jobs = jobs
+        self.checkpoint = checkpoint
+        self.nCheckpointed = 0
+        self.tasks = []
+        for i,(cls,args) in enumerate(dumpers):
+            t = DumperTask(i, cls(context, *args), cls.__name__[:-6]+".xml")
+            t.produces = self.typeKeys(t.dumper.PRODUCES)
+            t.references = self.typeKeys(t.dumper.REFERENCES)
+            if t.produces is None or t.references is None:
+                t.produces = t.references = None
+            self.tasks.append(t)
+        self.addEdges()
+
+    # Maps a list of type names to a set of type keys. None means unknown.
+    #
+    def typeKeys(self, names):
+        if names is None:
+            return None
+        tks = set()
+        for n in names:
+            if n not in self.context.TYPE_KEYS:
+                raise RuntimeError("Unknown item type: %s" % n)
+            tks.add(self.context.TYPE_KEYS[n])
+        return tks
+
+    def addEdges(self):
+        for i,d in enumerate(self.tasks):
+            for e in self.tasks[:i]:
+                if d.produces is None or e.produces is None \
+                or e.produces & (d.produces | d.references):
+                    d.waitsFor.add(e.index)
+            self.context.log('Scheduler: %s waits for: %s' % \
+                (d.name, ', '.join([self.tasks[j].name for j in sorted(d.waitsFor)]) or '-'))
+
+    def run(self):
+        mp = multiprocessing.get_context('fork')
+        pending = list(self.tasks)
+        running = {} # connection -> (task, process)
+        done = set()
+        total = 0
+        try:
+            while pending or running:
+                for t in list(pending):
+                    if len(running) >= self.jobs:
+                        break
+                    if t.waitsFor <= done:
+                        pending.remove(t)
+                        conn = self.start(mp, t)
+                        running[conn] = (t, t.process)
+                        self.context.log('Scheduler: started %s. Running: %s' % \
+                            (t.name, ', '.join([x.name for x,p in running.values()])))
+                self.release()
+                for conn in wait(list(running.keys())):
+                    t, p = running.pop(conn)
+                    try:
+                        result = conn.recv()
+                    except EOFError:
+                        result = {'error' : 'Worker exited with no result.'}
+                    conn.close()
+                    p.join()
+                    if 'error' in result:
+                        raise RuntimeError('%s failed in worker process:\n%s' % (t.name, result['error']))
+                    self.merge(t, result)
+                    done.add(t.index)
+                    total += t.count
+                    self.context.log('Scheduler: finished %s.' % t.name)
+                    self.saveCheckpoint(done)
+        except:
+            for t, p in running.values():
+                p.terminate()
+                p.join()
+            raise
+        self.assemble()
+        return total
+
+    def start(self, mp, t):
+        # flush anything buffered, or the worker will write it again on exit
+        for fd in (sys.stdout, sys.stderr, self.context.logfd):
+            fd.flush()
+        rconn, wconn = mp.Pipe(False)
+        t.process = mp.Process(target=self.work, args=(t, wconn))
+        t.process.start()
+        t.started = True
+        wconn.close()
+        return rconn
+
+    # Runs in the worker process.
+    #
+    def work(self, t, conn):
+        ctx = self.context
+        try:
+            self.rollback(t)
+            before = dict([(n, (x.nextId, x.nWritten, x.nClaimed)) for n,x in ctx.ids.types.items()])
+            ctx.outfiles = {}
+            ctx.partTag = '%02d' % t.index
+            ctx.partFiles = []
+            if ctx.cache:
+                ctx.cache.resetStats()
+            ctx.metrics.reset()
+            ctx.nFileItems = 0
+            ctx.referenced = set()
+            ctx.notes.only(t.dumper.NOTES)
+            count = t.dumper.dump(fname=t.fname) or 0
+            ctx.closeOutputs()
+            ctx.pool.closeAll()
+            changed = set([n for n,x in ctx.ids.types.items() \
+                if (x.nextId, x.nWritten, x.nClaimed) != before.get(n, (1, 0, 0))])
+            undeclared = changed - t.produces
+            if undeclared:
+                raise RuntimeError('%s produced undeclared item types: %s' % \
+                    (t.name, ', '.join([ctx.TK2TNAME[n] for n in sorted(undeclared)])))
+            # references to its own items are fine
+            undeclared = ctx.referenced - t.references - t.produces
+            if undeclared:
+                raise RuntimeError('%s referenced undeclared item types: %s' % \
+                    (t.name, ', '.join([ctx.TK2TNAME[n] for n in sorted(undeclared)])))
+            withState = set([n for n in t.produces if ctx.TK2TNAME[n] in ctx.TYPE_STATE])
+            result = {
+                'count'   : count,
+                'states'  : dict([(n, ctx.getTypeState(n)) for n in changed | withState]),
+                'parts'   : ctx.partFiles,
+                'pool'    : ctx.pool.getStats(),
+                'cache'   : ctx.cache.getStats() if ctx.cache else None,
+                'metrics' : ctx.metrics.getState(),
+            }
+        except:
+            result = {'error' : traceback.format_exc()}
+        conn.send(result)
+        conn.close()
+
+    # Runs in the worker process. Undoes, for the types t references, the effects
+    # of tasks that come after t but have already finished.
+    #
+    def rollback(self, t):
+        if t.references is None:
+            return
+        restored = set()
+        for L in self.tasks[t.index+1:]:
+            if not L.done:
+                continue
+            for n in L.produces & t.references:
+                if n in L.prior and n not in restored:
+                    self.context.setTypeState(n, L.prior[n])
+                    restored.add(n)
+
+    def merge(self, t, result):
+        ctx = self.context
+        for n, state in result['states'].items():
+            t.prior[n] = ctx.getTypeState(n)
+            ctx.setTypeState(n, state)
+        t.parts = result['parts']
+        t.count = result['count']
+        ctx.pool.addStats(result['pool'])
+        if result['cache']:
+            ctx.cache.addStats(result['cache'])
+        ctx.metrics.addState(result['metrics'])
+        ctx.notes.release(t.dumper.NOTES)
+        ctx.preloads.finished(t.dumper.__class__.__name__)
+        t.done = True
+
+    # Checkpoints, if a longer prefix of the list has finished. Later tasks that have
+    # also finished are rolled back, as for a worker, so the checkpoint holds what a
+    # serial run would have after the prefix. (Tasks producing the same type run in list
+    # order, so for each type, the prior state of the first later task to produce
+    # it is the state after the prefix.)
+    #
+    def saveCheckpoint(self, done):
+        if self.checkpoint is None:
+            return
+        n = 0
+        while n < len(self.tasks) and n in done:
+            n += 1
+        if n <= self.nCheckpointed:
+            return
+        states = {}
+        for L in self.tasks[n:]:
+            if L.done:
+                for k, state in L.prior.items():
+                    states.setdefault(k, state)
+        self.checkpoint(n, sum([t.count for t in self.tasks[:n]]), [p for t in self.tasks[:n] for p in t.parts], states)
+        self.nCheckpointed = n
+
+    # Frees rollback data no task can need anymore, i.e., once
+    # every earlier task has started (and, if checkpointing, finished).
+    #
+    def release(self):
+        for t in self.tasks:
+            if t.done and t.prior is not None and \
+            all([x.started for x in self.tasks[:t.index]]) and \
+            (self.checkpoint is None or t.index < self.nCheckpointed):
+                t.prior = None
+
+    # Concatenates the part files, in list order, into the output files.
+    #
+    def assemble(self):
+        ctx = self.context
+        pnames = []
+        for t in self.tasks:
+            for fname, pname in t.parts:
+                ctx.openOutput(fname)
+                ctx.fd.copyFrom(pname)
+                pnames.append(pname)
+        ctx.writer.sync()
+        for pname in pnames:
+            os.remove(pname)
+        pdir = os.path.join(ctx.dir, '.parts')
+        if os.path.isdir(pdir) and not os.listdir(pdir):
+            os.rmdir(pdir)
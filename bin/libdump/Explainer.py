@@ -0,0 +1,232 @@
+#
+# Explainer.py
+#
+# Query plan audit (dumpMgiItemXml.py --explain). The dumpers are run as usual, but each
+# query run through the context (the QTMPLT queries as well as the ad-hoc preload ones)
+# is only planned, not run: its plan is collected with EXPLAIN, and no rows come back.
+# Queries that depend on the rows of earlier ones (e.g., lookups per key) are therefore
+# not reached. A dumper that fails without rows is logged, and its QTMPLT queries are
+# planned anyway, as are its SINCE_KEYS queries (see AbstractItemDumper). The queries the
+# context itself runs when it starts (type keys, dump date, unciteable publications)
+# are run for real, and not audited.
+#
+# Dumpers that failed, and queries that could not be planned (e.g., a column missing
+# from a snapshot), are listed at the top of both reports, and make the audit fail
+# (dumpMgiItemXml.py exits with status 1): the reports are incomplete.
+#
+# Reports are written to <dir>/explain.json (every query, with its full plan) and
+# <dir>/explain.txt (queries by estimated cost, most expensive first), listing:
+#   - the dumper, the query (id as in metrics.json), estimated total cost and rows
+#   - full table scans, with the size of the table; scans of big tables (BIG_ROWS rows
+#     or more) are flagged
+#   - subplans, e.g., correlated subqueries, which are run once per outer row
+#
+# Postgres plans come from EXPLAIN (FORMAT JSON), table sizes from pg_class. SQLite
+# (a snapshot) has no cost estimates: plans come from EXPLAIN QUERY PLAN, table sizes
+# from sqlite_stat1, and queries are ranked by the rows of the tables they scan.
+#
+
+import os
+import re
+import json
+from . import mgidbconnect as db
+
+class Explainer:
+    # tables with at least this many rows are big
+    BIG_ROWS = 100000
+    QUERY_RE = re.compile(r'\s*(select|with)\b', re.I)
+    # SQLite plan details: SCAN <table or alias> [USING [COVERING] INDEX ...]
+    SQLITE_SCAN_RE = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS (\w+))?(?: USING (?:COVERING )?INDEX (\w+))?')
+    SQLITE_SUBPLAN_RE = re.compile(r'^(CORRELATED )?(SCALAR|LIST) SUBQUERY')
+
+    def __init__(self, context):
+        self.context = context
+        self.backend = db.getBackend().name
+        self.plans = {}         # query -> plan record
+        self.records = []       # plan record per query run, in order
+        self.failed = []        # (dumper, error) for dumpers that failed without rows
+        self.tableRows = self.loadTableRows()
+
+    # Runs the dumpers [(class, args)], planning their queries, and writes the reports.
+    # Returns the number of dumpers and queries that failed.
+    def run(self, dumpers):
+        cx = self.context
+        for cls, args in dumpers:
+            d = cls(cx, *args)
+            try:
+                d.dump(fname=cls.__name__[:-6] + '.xml')
+            except Exception as e:
+                self.failed.append((cls.__name__, '%s: %s' % (e.__class__.__name__, e)))
+                cx.log('%s failed without rows: %s' % self.failed[-1])
+            # the main queries, also of a dumper that did not get that far, and the ones
+            # --since runs (already planned ones are not planned again)
+            try:
+                with cx.metrics.dumper(d):
+                    for i, q in d.queries():
+                        cx.sql(q)
+                    for q in (d.SINCE_KEYS or {}).values():
+                        cx.sql(d.constructQuery(q))
+            except Exception as e:
+                self.failed.append((cls.__name__, 'cannot instantiate its queries: %s: %s' % (e.__class__.__name__, e)))
+                cx.log('%s: %s' % self.failed[-1])
+        self.write(cx.dir)
+        return len(self.failed) + len(self.errors())
+
+    # Returns the plan records of the queries that could not be planned.
+    def errors(self):
+        return [r for r in self.records if r['error']]
+
+    # Returns the estimated number of rows of each table (by lower case name).
+    def loadTableRows(self):
+        if self.backend == 'sqlite':
+            try:
+                rows = db.sql('SELECT tbl, stat FROM sqlite_stat1', pool=self.context.pool, rows='tuple')
+            except db.getBackend().Error:
+                # not analyzed
+                return {}
+            # the first number of each index's stat is the table's row count
+            counts = {}
+            for t, s in rows:
+                counts[t.lower()] = max(counts.get(t.lower(), 0), int(s.split()[0]))
+            return counts
+        q = "SELECT relname, reltuples FROM pg_class WHERE relkind = 'r'"
+        return dict([(t.lower(), int(n)) for t, n in db.sql(q, pool=self.context.pool, rows='tuple')])
+
+    # Plans query q (or a list of queries) instead of running it, for query record rec
+    # (see Metrics.query). Returns what DumperContext.sql would return for no rows.
+    def sql(self, q, p, rec):
+        if type(q) in (list, tuple):
+            return [self.sql(qq, p, rec) for qq in q]
+        self.explain(q, rec)
+        return [] if p is None else None
+
+    def explain(self, q, rec):
+        if not self.QUERY_RE.match(q):
+            return
+        r = self.plans.get(q)
+        if r is None:
+            r = {'id' : rec['id'], 'sql' : rec['sql'], 'dumpers' : [], 'cost' : None, 'rows' : None,
+                 'scans' : [], 'subplans' : 0, 'error' : None, 'plan' : None}
+            try:
+                if self.backend == 'sqlite':
+                    self.explainSqlite(q, r)
+                else:
+                    self.explainPostgres(q, r)
+            except db.getBackend().Error as e:
+                r['error'] = str(e).strip()
+            for s in r['scans']:
+                s['big'] = (s['tableRows'] or 0) >= self.BIG_ROWS
+            self.plans[q] = r
+            self.records.append(r)
+        if rec['dumper'] not in r['dumpers']:
+            r['dumpers'].append(rec['dumper'])
+
+    def explainPostgres(self, q, r):
+        plan = db.sql('EXPLAIN (FORMAT JSON) ' + q, pool=self.context.pool, rows='tuple')[0][0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        top = plan[0]['Plan']
+        r['plan'] = plan
+        r['cost'] = top['Total Cost']
+        r['rows'] = top['Plan Rows']
+        todo = [top]
+        while todo:
+            n = todo.pop()
+            todo.extend(n.get('Plans', []))
+            if n.get('Parent Relationship') == 'SubPlan':
+                r['subplans'] += 1
+            if n['Node Type'] == 'Seq Scan':
+                t = n['Relation Name']
+                r['scans'].append({'table' : t, 'alias' : n.get('Alias'), 'index' : None,
+                    'rows' : n['Plan Rows'], 'tableRows' : self.tableRows.get(t.lower())})
+
+    def explainSqlite(self, q, r):
+        rows = db.sql('EXPLAIN QUERY PLAN ' + q, pool=self.context.pool, rows='tuple')
+        r['plan'] = [d for i, parent, x, d in rows]
+        for d in r['plan']:
+            if self.SQLITE_SUBPLAN_RE.match(d):
+                r['subplans'] += 1
+            m = self.SQLITE_SCAN_RE.match(d)
+            if m is None:
+                continue
+            t = self.tableOf(q, m.group(1))
+            r['scans'].append({'table' : t, 'alias' : m.group(2) or m.group(1), 'index' : m.group(3),
+                'rows' : None, 'tableRows' : self.tableRows.get(t.lower())})
+        r['rows'] = None
+        # no cost estimates; rank by the rows scanned
+        r['cost'] = sum([s['tableRows'] or 0 for s in r['scans']])
+
+    # Returns the table that name (a table or an alias) stands for in query q.
+    def tableOf(self, q, name):
+        if name.lower() in self.tableRows:
+            return name
+        for m in re.finditer(r'\b(\w+)\s+(?:as\s+)?%s\b' % re.escape(name), q, re.I):
+            if m.group(1).lower() in self.tableRows:
+                return m.group(1)
+        return name
+
+    #
+    # Reports
+    #
+
+    def write(self, dir):
+        path = os.path.join(dir, 'explain.json')
+        with open(path, 'w') as fd:
+            json.dump({'backend' : self.backend, 'bigRows' : self.BIG_ROWS,
+                'failedDumpers' : [{'dumper' : d, 'error' : e} for d, e in self.failed],
+                'failedQueries' : [r['id'] for r in self.errors()],
+                'queries' : self.records}, fd, indent=1, default=str)
+        tpath = os.path.join(dir, 'explain.txt')
+        with open(tpath, 'w') as fd:
+            self.writeText(fd)
+        self.context.log('Query plans written to %s and %s.' % (tpath, path))
+        if self.failed or self.errors():
+            self.context.log('Query plan audit INCOMPLETE: %d dumper(s) and %d query(ies) failed (see %s).' % \
+                (len(self.failed), len(self.errors()), tpath))
+
+    def writeText(self, fd):
+        recs = sorted(self.records, key=lambda r: -(r['cost'] or 0))
+        nbig = len([r for r in recs if [s for s in r['scans'] if s['big']]])
+        fd.write('%d queries planned (%s), %d with full scans of big tables (%d rows or more), %d failed.\n' % \
+            (len(recs), self.backend, nbig, self.BIG_ROWS, len(self.errors())))
+        if self.failed or self.errors():
+            fd.write('INCOMPLETE: %d dumper(s) failed (their queries past the failure were not planned), '
+                '%d query(ies) could not be planned:\n' % (len(self.failed), len(self.errors())))
+            for d, e in self.failed:
+                fd.write('    dumper %s failed: %s\n' % (d, e))
+            for r in self.errors():
+                fd.write('    query %s (%s) failed: %s\n' % (r['id'], ','.join([d or '-' for d in r['dumpers']]), r['error']))
+        fd.write('Cost is the estimated total cost%s.\n\n' % \
+            (' (SQLite: the rows of the tables scanned)' if self.backend == 'sqlite' else ''))
+        fd.write('%14s %12s  %-12s %-28s %s\n' % ('cost', 'rows', 'query', 'flags', 'dumpers'))
+        for r in recs:
+            fd.write('%14s %12s  %-12s %-28s %s\n' % (self.fmt(r['cost']), self.fmt(r['rows']),
+                r['id'], ' '.join(self.flags(r)), ','.join([d or '-' for d in r['dumpers']])))
+        for r in recs:
+            fd.write('\n%s  cost %s, rows %s, dumpers %s\n' % (r['id'], self.fmt(r['cost']), self.fmt(r['rows']),
+                ', '.join([d or '-' for d in r['dumpers']])))
+            fd.write('    %s\n' % r['sql'])
+            if r['error']:
+                fd.write('    ERROR: %s\n' % r['error'])
+            for s in r['scans']:
+                fd.write('    %s full scan of %s%s (%s rows%s)\n' % ('!!' if s['big'] else '  ', s['table'],
+                    ' as ' + s['alias'] if s['alias'] and s['alias'] != s['table'] else '',
+                    self.fmt(s['tableRows']), ', using index ' + s['index'] if s['index'] else ''))
+            if r['subplans']:
+                fd.write('       %d subplan(s), run per outer row if correlated\n' % r['subplans'])
+
+    def flags(self, r):
+        f = []
+        big = [s['table'] for s in r['scans'] if s['big']]
+        if big:
+            f.append('SEQSCAN:' + ','.join(big))
+        if r['subplans']:
+            f.append('SUBPLANS:%d' % r['subplans'])
+        if r['error']:
+            f.append('ERROR')
+        return f
+
+    def fmt(self, v):
+        if v is None:
+            return '-'
+        return '%.0f' % v
@@ -3,11 +3,23 @@ from collections import defaultdict
 from .OboParser import OboParser
 
 class ExpressionDumper(AbstractItemDumper):
+    PRODUCES   = ['Expression', 'EMAPATerm']
+    REFERENCES = ['Genotype', 'Marker', 'Reference']
+    COPY = True
 
-    # Pre-loads assay information.
-    # The assay structure is a dict of dict.
-    def loadAssay(self):
-        q = self.constructQuery('''
+    EMAPA_QTMPLT = '''
+            SELECT t.term, a.accid AS emapa, a._object_key as _emapa_key
+            FROM voc_term t, acc_accession a
+            WHERE t._vocab_key = 90
+            AND t._term_key = a._object_key
+            AND a._mgitype_key = 13
+            AND a.private = 0
+            AND a.preferred = 1
+            AND a._logicaldb_key = 169
+            AND t._term_key in (select _term_key from voc_term_emapa)
+            '''
+
+    ASSAY_QTMPLT = '''
             SELECT a._assay_key, a._marker_key, a._refs_key, acc.accid, at.assaytype, a.creation_date
             FROM gxd_assay a
               JOIN acc_accession acc 
@@ -19,7 +31,38 @@ class ExpressionDumper(AbstractItemDumper):
             AND acc.preferred = 1
             AND acc.private = 0
             AND NOT a._assaytype_key IN (10, 11)
-            ''')
+            '''
+
+    PROBEPREP_QTMPLT = '''
+            SELECT a._assay_key, acc.accid
+            FROM gxd_assay a, gxd_probeprep pp, acc_accession acc
+            WHERE a._probeprep_key = pp._probeprep_key
+            AND pp._probe_key = acc._object_key
+            AND acc._mgitype_key = %(PROBE_TYPEKEY)d
+            AND acc._logicaldb_key = 1
+            AND acc.preferred = 1
+            AND acc.private = 0
+            AND NOT a._assaytype_key IN (10, 11)
+            '''
+
+    ANTIBODYPREP_QTMPLT = '''
+            SELECT a._assay_key, acc.accid
+            FROM gxd_assay a, gxd_antibodyprep ap, acc_accession acc
+            WHERE a._antibodyprep_key = ap._antibodyprep_key
+            AND ap._antibody_key = acc._object_key
+            AND acc._mgitype_key = %(ANTIBODY_TYPEKEY)d
+            AND acc._logicaldb_key = 1
+            AND acc.preferred = 1
+            AND acc.private = 0
+            AND NOT a._assaytype_key IN (10, 11)
+            '''
+
+    PRELOADS = [EMAPA_QTMPLT, ASSAY_QTMPLT, PROBEPREP_QTMPLT, ANTIBODYPREP_QTMPLT]
+
+    # Pre-loads assay information.
+    # The assay structure is a dict of dict.
+    def loadAssay(self):
+        q = self.constructQuery(self.ASSAY_QTMPLT)
 
         for r in self.context.sql(q):
             ak = r['_assay_key']
@@ -43,17 +86,7 @@ class ExpressionDumper(AbstractItemDumper):
 
 
     def loadProbePrep(self):
-        q = self.constructQuery('''
-            SELECT a._assay_key, acc.accid
-            FROM gxd_assay a, gxd_probeprep pp, acc_accession acc
-            WHERE a._probeprep_key = pp._probeprep_key
-            AND pp._probe_key = acc._object_key
-            AND acc._mgitype_key = %(PROBE_TYPEKEY)d
-            AND acc._logicaldb_key = 1
-            AND acc.preferred = 1
-            AND acc.private = 0
-            AND NOT a._assaytype_key IN (10, 11)
-            ''')
+        q = self.constructQuery(self.PROBEPREP_QTMPLT)
 
         for r in self.context.sql(q):
             self.loadProbe(r['_assay_key'], r['accid'])
@@ -61,17 +94,7 @@ class ExpressionDumper(AbstractItemDumper):
 
 
     def loadAntibodyPrep(self):
-        q = self.constructQuery('''
-            SELECT a._assay_key, acc.accid
-            FROM gxd_assay a, gxd_antibodyprep ap, acc_accession acc
-            WHERE a._antibodyprep_key = ap._antibodyprep_key
-            AND ap._antibody_key = acc._object_key
-            AND acc._mgitype_key = %(ANTIBODY_TYPEKEY)d
-            AND acc._logicaldb_key = 1
-            AND acc.preferred = 1
-            AND acc.private = 0
-            AND NOT a._assaytype_key IN (10, 11)
-            ''')
+        q = self.constructQuery(self.ANTIBODYPREP_QTMPLT)
 
         for r in self.context.sql(q):
             self.loadProbe(r['_assay_key'], r['accid'])
@@ -107,7 +130,8 @@ class ExpressionDumper(AbstractItemDumper):
                  '''
 
         if r['_assay_key'] in self.assay:
-            r['id'] = self.context.makeItemId('Expression')
+            r['id'] = self.context.makeItemId('Expression',
+                content=(r.get('_gellane_key'), r.get('_result_key'), r['_emapa_key'], r['stage']))
             for k, v in list(self.assay[r['_assay_key']].items()):
                 r[k] = v
 
@@ -227,7 +251,8 @@ class ExpressionDumper(AbstractItemDumper):
             AND gl._gelcontrol_key = 1
             '''
 
-        for r in self.context.sqliter(q):
+        for row in self.context.sqliter(q, rows='tuple', copy=self.COPY):
+            r = ItemRecord(row)
             if r['_gellane_key'] in gl2strength:
                 r['strength'] = gl2strength[r['_gellane_key']]
                 r['genotype'] = self.context.makeItemRef('Genotype', r['_genotype_key'])
@@ -298,7 +323,8 @@ class ExpressionDumper(AbstractItemDumper):
             '''
 
 
-        for r in self.context.sqliter(q):
+        for row in self.context.sqliter(q, rows='tuple', copy=self.COPY):
+            r = ItemRecord(row)
             r['genotype'] = self.context.makeItemRef('Genotype', r['_genotype_key'])
                 
             isDetected = self.strengthToBoolean(r['strength'])
@@ -322,17 +348,7 @@ class ExpressionDumper(AbstractItemDumper):
                 </item>
                 '''
 
-        q = self.constructQuery('''
-            SELECT t.term, a.accid AS emapa, a._object_key as _emapa_key
-            FROM voc_term t, acc_accession a
-            WHERE t._vocab_key = 90
-            AND t._term_key = a._object_key
-            AND a._mgitype_key = 13
-            AND a.private = 0
-            AND a.preferred = 1
-            AND a._logicaldb_key = 169
-            AND t._term_key in (select _term_key from voc_term_emapa)
-            ''')
+        q = self.constructQuery(self.EMAPA_QTMPLT)
 
         referenced_emapaids = set()
 
@@ -354,6 +370,7 @@ class ExpressionDumper(AbstractItemDumper):
         self.loadAssay()
         self.loadProbePrep()
         self.loadAntibodyPrep()
+        self.assay = self.context.preloads.add(self, 'assay', self.assay)
 
         self.processGelLane()
         self.processInSitu()
@@ -3,6 +3,15 @@ from .DataSourceDumper import DataSetDumper
 from .DumperContext import DumperContext
 
 class FeatureDumper(AbstractItemDumper):
+    PRODUCES   = ['Marker', 'SOTerm', 'Location', 'DataSet', 'Reference']
+    REFERENCES = ['Organism', 'Chromosome', 'DataSource']
+    SINCE_KEYS = {
+        'Marker' : 'SELECT _marker_key, modification_date FROM MRK_Marker',
+    }
+
+    # gene function overview and strain specificity notes, for AbstractFeatureDumper
+    NOTES = [(1014, 2), (1035, 2)]
+
     ITMPLT = '''
     <item class="SOTerm" id="%(id)s">
         <attribute name="identifier" value="%(soid)s" />
@@ -24,6 +33,7 @@ class FeatureDumper(AbstractItemDumper):
             self.writeItem( {'id':id, 'soid':s}, self.ITMPLT)
         
 class AbstractFeatureDumper(AbstractItemDumper):
+    SINCE = ['m.modification_date']
     ITMPLT = '''
     <item class="%(featureClass)s" id="%(id)s" >
       <attribute name="primaryIdentifier" value="%(primaryidentifier)s" />
@@ -43,35 +53,42 @@ class AbstractFeatureDumper(AbstractItemDumper):
       </item>
     '''
 
+    PHENOTYPE_NOTE_QTMPLT = '''
+            select n._marker_key, n.note
+            from MRK_Notes n, MRK_Marker m
+            where n._marker_key = m._marker_key
+            and m._organism_key = 1
+            order by n._marker_key
+            '''
+
+    REFERENCE_QTMPLT = '''
+            SELECT _marker_key, _refs_key
+            FROM MRK_Reference
+            '''
+
+    EARLIEST_PUBS_QTMPLT = '''
+            select distinct mr._marker_key AS _marker_key, mr._refs_key AS _refs_key, br.year, mr.jnum
+            from mrk_reference mr, bib_refs br
+            where mr._refs_key = br._refs_key
+            order by _marker_key, br.year, mr.jnum
+            '''
+
+    PRELOADS = [REFERENCE_QTMPLT, PHENOTYPE_NOTE_QTMPLT, EARLIEST_PUBS_QTMPLT]
+
     def preloadDescriptions(self):
         # Preload all description notes for mouse markers. Two separate notes from MGI are concatenated
         # into a single note in MouseMine, which goes into the description field. A given gene may have
         # neither, either, or both. Here's an example:
         self.mk2description = {}
         #
-        # First, the gene function overview note
-        q = self.constructQuery('''
-            select n._object_key as _marker_key, c.note
-            from MGI_Note n, MGI_Notechunk c, MRK_Marker m
-            where n._object_key = m._marker_key
-            and n._notetype_key = 1014
-            and n._note_key = c._note_key
-            and m._organism_key = 1
-            order by n._object_key, c.sequenceNum
-            ''')
-        for r in self.context.sql(q):
-            mk = r['_marker_key']
-            note = 'FUNCTION: ' + r['note'].replace("<hr><B>Summary from NCBI RefSeq</B><BR><BR>","").replace("<hr>","")
-            self.mk2description[mk] = self.mk2description.get(mk,'') + note 
+        # First, the gene function overview note (these are only on mouse markers)
+        for mk, notes in self.context.notes.get(1014, self.context.QUERYPARAMS['MARKER_TYPEKEY']).items():
+            for nk, n in notes:
+                note = 'FUNCTION: ' + n.replace("<hr><B>Summary from NCBI RefSeq</B><BR><BR>","").replace("<hr>","")
+                self.mk2description[mk] = self.mk2description.get(mk,'') + note 
         #
         # Second, the phenotype overview note. 
-        q = '''
-            select n._marker_key, n.note
-            from MRK_Notes n, MRK_Marker m
-            where n._marker_key = m._marker_key
-            and m._organism_key = 1
-            order by n._marker_key
-            '''
+        q = self.constructQuery(self.PHENOTYPE_NOTE_QTMPLT)
         for r in self.context.sql(q):
             mk = r['_marker_key']
             note = 'PHENOTYPE: ' + r['note'] + (' [provided by MGI curators]')
@@ -81,48 +98,27 @@ class AbstractFeatureDumper(AbstractItemDumper):
 
     def preloadMarkerReferenceAssociations(self):
         self.mk2refs = {}
-        q = self.constructQuery('''
-            SELECT _marker_key, _refs_key
-            FROM MRK_Reference
-            ''')
+        q = self.constructQuery(self.REFERENCE_QTMPLT)
         for r in self.context.sql(q):
             id = self.context.makeGlobalKey('Reference',r['_refs_key'])
             if id in self.context.idsWritten:
                 self.mk2refs.setdefault(r['_marker_key'],[]).append('<reference ref_id="%s"/>'%id)
 
     def preloadEntrezIds(self):
-        self.mk2entrez = {}
-        q = self.constructQuery('''
-          SELECT accid, _object_key
-          FROM ACC_Accession
-          WHERE _logicaldb_key = %(ENTREZ_LDBKEY)d
-          AND _mgitype_key = %(MARKER_TYPEKEY)d
-          ''')
-        for r in self.context.sql(q):
-            self.mk2entrez[r['_object_key']] = \
-                '<attribute name="ncbiGeneNumber" value="%s" />' % r['accid']
+        # shared with the rest of the run (see DumperContext.accessions)
+        self.entrezIds = self.context.accessions.get(self.context.QUERYPARAMS['MARKER_TYPEKEY'],
+            self.context.QUERYPARAMS['ENTREZ_LDBKEY'])
 
     def preloadStrainSpecificityNotes(self):
         self.mk2specificityNote = {}
-        q = self.constructQuery('''
-            SELECT m._marker_key, nc.note
-            FROM MGI_Note n, MRK_Marker m, MGI_Notechunk nc
-            WHERE n._object_key = m._marker_key
-            AND n._note_key = nc._note_key
-            AND n._notetype_key = %(STRAIN_SPECIFIC_NOTETYPE_KEY)d
-            AND m._marker_status_key = %(OFFICIAL_STATUS)d 
-            ''')
-        for r in self.context.sql(q):
-            self.mk2specificityNote[r['_marker_key']] = r['note']
+        # (these are only on mouse markers; the mouse features are the official markers)
+        notes = self.context.notes.get(self.context.QUERYPARAMS['STRAIN_SPECIFIC_NOTETYPE_KEY'], self.context.QUERYPARAMS['MARKER_TYPEKEY'])
+        for mk, ns in notes.items():
+            self.mk2specificityNote[mk] = ns[-1][1]
 
     def preloadEarliestPubs(self):
         self.earliest_publications = {}
-        q = '''
-            select distinct mr._marker_key AS _marker_key, mr._refs_key AS _refs_key, br.year, mr.jnum
-            from mrk_reference mr, bib_refs br
-            where mr._refs_key = br._refs_key
-            order by _marker_key, br.year, mr.jnum
-            '''
+        q = self.constructQuery(self.EARLIEST_PUBS_QTMPLT)
         current_marker_key = 0
         found_citeable = False
         for r in self.context.sql(q):
@@ -147,6 +143,8 @@ class AbstractFeatureDumper(AbstractItemDumper):
         self.preloadDescriptions()
         self.preloadStrainSpecificityNotes()
         self.preloadEarliestPubs()
+        self.mk2refs = self.context.preloads.add(self, 'mk2refs', self.mk2refs)
+        self.mk2description = self.context.preloads.add(self, 'mk2description', self.mk2description)
 
 
     def getDescription(self, r):
@@ -191,7 +189,8 @@ class AbstractFeatureDumper(AbstractItemDumper):
         fc =  r['featureClass']
         if 'Gene' not in fc or 'Pseudo' in fc or fc == 'GeneSegment':
             return ''
-        return self.mk2entrez.get(r['_marker_key'], '')
+        eid = self.entrezIds.first(r['_marker_key'])
+        return '<attribute name="ncbiGeneNumber" value="%s" />' % eid if eid else ''
 
     def processRecord(self, r):
         fclass, soId = self.getClass(r)
@@ -250,6 +249,7 @@ class MouseFeatureDumper(AbstractFeatureDumper):
     AND c.qualifier = 'D'
     AND m.chromosome = mc.chromosome
     AND m._organism_key = mc._organism_key
+    %(SINCE_CLAUSE)s
     %(LIMIT_CLAUSE)s
     '''
 
@@ -297,6 +297,7 @@ class NonMouseFeatureDumper(AbstractFeatureDumper):
     AND a._logicaldb_key = %(ENTREZ_LDBKEY)d
     AND a.preferred = 1
     AND a.private = 0
+    %(SINCE_CLAUSE)s
     %(LIMIT_CLAUSE)s
     '''
     def getMcvType(self, r):
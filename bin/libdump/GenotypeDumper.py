@@ -1,6 +1,9 @@
 from .AbstractItemDumper import *
 
 class GenotypeDumper(AbstractItemDumper):
+    PRODUCES   = ['Genotype', 'GenotypeAllelePair']
+    REFERENCES = ['Organism', 'Strain', 'Allele', 'Marker', 'CellLine']
+
     QTMPLT= '''
     SELECT g._genotype_key, g._strain_key, s.strain, g.isconditional, g.note, t.term, a.accid
     FROM GXD_Genotype g, VOC_Term t, PRB_Strain s, ACC_Accession a
@@ -184,8 +187,12 @@ class GenotypeAllelePairDumper(AbstractItemDumper):
         self.records.append(r)
         return None
 
+    def postDump(self):
+        # records, in order, by position
+        self.records = self.context.preloads.add(self, 'records', dict(enumerate(self.records)))
+
     def writeRecords(self):
-        for r in self.records:
+        for r in self.records.values():
             r['id'] = self.context.makeItemId('GenotypeAllelePair', r['_allelepair_key'])
             self.makeReference(r, '_allele_key_1', 'allele1', 'Allele' )
             self.makeReference(r, '_mutantcellline_key_1', 'mutantCellLine1', 'CellLine' )
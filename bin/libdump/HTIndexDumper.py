@@ -18,6 +18,12 @@ from collections import defaultdict
 from .OboParser import OboParser
 
 class HTIndexDumper(AbstractItemDumper):
+    PRODUCES   = ['HTExperiment', 'HTVariable', 'HTSample', 'Reference']
+    REFERENCES = ['Organism', 'Genotype', 'EMAPATerm']
+    # experiment notes, and sample notes (for HTSampleDumper)
+    # (HTEXPT_NOTETYPE_KEY and HTSAMPLE_NOTETYPE_KEY)
+    NOTES = [(1047, None), (1048, None)]
+
     QTMPLT = '''
         SELECT
             e._experiment_key,
@@ -126,36 +132,32 @@ class HTIndexDumper(AbstractItemDumper):
             self.ek2pmids.setdefault(ek, []).append(r['pmid'])
             self.pmids.add(r['pmid'])
 
-    # Loads PMID-to-refs_key for all Pubs in MGI.
+    # Loads PMID-to-refs_key for the PMIDs of HT experiments that are in MGI.
+    # (The PubMed ids of all Pubs come from the run's accession index.)
     def loadPmids2Refkeys (self) :
         self.pmid2rk = {}
-        q = '''
-        SELECT accid, _object_key
-        FROM ACC_Accession
-        WHERE _mgitype_key = 1
-        AND _logicaldb_key = 29
-        '''
-        for r in self.context.sql(q):
-            self.pmid2rk[r['accid']] = r['_object_key']
+        ids = self.context.accessions.get(self.context.QUERYPARAMS['REF_TYPEKEY'], self.context.QUERYPARAMS['PUBMED_LDBKEY'])
+        for pmid in self.pmids:
+            rks = ids.find(pmid)
+            if rks:
+                self.pmid2rk[pmid] = rks[0]
 
     # In MGI, HT Experiments have no direct reference associations; they only have PMID property values.
     # Many of these PMIDs already exist in MGI and can be converted to a publication reference; the Publication
     # dumper will create the objects.
     # Many PMIDs do not exist in MGI, so here we have to create objects (stubs) for them.
+    # Stubs are keyed by "PMID:<pmid>", which cannot clash with a _refs_key, and does not
+    # change when references are added to MGI.
     def makePubStubs (self):
-        # assign keys that
-        q = 'SELECT max(_refs_key) as maxkey FROM BIB_Refs'
-        maxkey = list(self.context.sql(q))[0]['maxkey']
-
         # Test each pubmed id associated with HT Experiments.
         # Create a Publication stub object for each one that is NOT already in MGI.
-        for pmid in self.pmids:
+        for pmid in sorted(self.pmids):
             if pmid in self.pmid2rk:
                 continue
-            maxkey += 1
-            self.pmid2rk[pmid] = maxkey
+            rk = 'PMID:' + pmid
+            self.pmid2rk[pmid] = rk
             r = {
-              "id" : self.context.makeItemId('Reference', maxkey),
+              "id" : self.context.makeItemId('Reference', rk),
               "pubMedId" : pmid
             }
             self.writeItem(r, self.REFTMPLT)
@@ -163,15 +165,8 @@ class HTIndexDumper(AbstractItemDumper):
     # Loads all notes associated with HTExperiments
     def loadNotes (self):
         self.ek2notes = {}
-        q = '''
-        SELECT n._object_key, c.note
-        FROM MGI_Note n, MGI_NoteChunk c
-        WHERE c._note_key = n._note_key
-        AND n._notetype_key = %(HTEXPT_NOTETYPE_KEY)d
-        ''' % self.context.QUERYPARAMS
-        for r in self.context.sql(q):
-            ek = r['_object_key']
-            self.ek2notes[ek] = self.quote(r['note'])
+        for ek, notes in self.context.notes.get(self.context.QUERYPARAMS['HTEXPT_NOTETYPE_KEY']).items():
+            self.ek2notes[ek] = self.quote(notes[-1][1])
 
     # Writes the HT Variable vocabulary (_vocab_key = 122)
     def writeVariableTerms (self) :
@@ -327,15 +322,8 @@ class HTSampleDumper (AbstractItemDumper) :
 
     def loadNotes (self):
         self.sk2notes = {}
-        q = '''
-        SELECT n._object_key, c.note
-        FROM MGI_Note n, MGI_NoteChunk c
-        WHERE c._note_key = n._note_key
-        AND n._notetype_key = %(HTSAMPLE_NOTETYPE_KEY)d
-        ''' % self.context.QUERYPARAMS
-        for r in self.context.sql(q):
-            sk = r['_object_key']
-            self.sk2notes[sk] = self.quote(r['note'])
+        for sk, notes in self.context.notes.get(self.context.QUERYPARAMS['HTSAMPLE_NOTETYPE_KEY']).items():
+            self.sk2notes[sk] = self.quote(notes[-1][1])
 
     def processRecord (self, r) :
         ek = r['_experiment_key']
@@ -14,6 +14,8 @@ from .AbstractItemDumper import *
 from .DataSourceDumper import DataSetDumper
 
 class HomologyDumper(AbstractItemDumper):
+    PRODUCES   = ['Homologue', 'DataSet']
+    REFERENCES = ['Marker', 'DataSource']
 
     DATASETNAME = "Mouse/Human Orthologies from MGI"
 
@@ -45,7 +47,7 @@ class HomologyDumper(AbstractItemDumper):
     def flushOnePair(self, a, b):
         htype = "paralogue" if a['_organism_key'] == b['_organism_key']  else "orthologue"
         r = {
-            "id" : self.context.makeItemId("Homologue"),
+            "id" : self.context.makeItemId("Homologue", content=(a['_marker_key'], b['_marker_key'])),
             "type" : htype,
             "gene" : self.context.makeItemRef("Marker", a['_marker_key']),
             "homologue" : self.context.makeItemRef("Marker", b['_marker_key']),
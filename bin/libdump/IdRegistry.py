@@ -0,0 +1,198 @@
+#
+# IdRegistry.py
+#
+# Compact bookkeeping for item ids. An item id is a string "n_m", where n is the item
+# type key and m is a sequence number within the type (see DumperContext.makeGlobalKey).
+# For each type, the registry keeps:
+#   - the next sequence number to allocate
+#   - the mapping from local keys (generally MGI database keys) to sequence numbers.
+#     Non-negative integer keys are stored in paged arrays of unsigned ints, where 0 means
+#     no mapping. Pages are allocated as needed, so sparse key ranges stay cheap.
+#     Any other keys go into a dict.
+#   - which sequence numbers have been written out, as a growable bitset.
+#   - which sequence numbers this run has handed out for content keys, whether or not
+#     the items were written (see DumperContext.contentKey), as another bitset.
+# This takes a small fraction of the memory of the equivalent dicts and set of strings,
+# and checking a reference needs no string formatting or hashing.
+#
+# The registry also stands in for the set of ids written: it supports "id in registry"
+# and registry.add(id).
+#
+
+import sys
+from array import array
+
+PAGEBITS = 12
+PAGESIZE = 1 << PAGEBITS
+PAGEMASK = PAGESIZE - 1
+EMPTYPAGE = bytes(array('I').itemsize * PAGESIZE)
+
+class TypeIds:
+    __slots__ = ('n', 'nextId', 'pages', 'other', 'nKeys', 'written', 'nWritten', 'claimed', 'nClaimed')
+
+    def __init__(self, n):
+        self.n = n
+        self.nextId = 1
+        self.pages = {}          # page number -> array of sequence numbers
+        self.other = {}          # other keys -> sequence number
+        self.nKeys = 0           # number of local keys mapped
+        self.written = bytearray()
+        self.nWritten = 0
+        self.claimed = bytearray()
+        self.nClaimed = 0
+
+    # Allocates and returns the next sequence number.
+    def allocate(self):
+        m = self.nextId
+        self.nextId += 1
+        return m
+
+    # Returns the sequence number mapped to local key k, or 0.
+    def get(self, k):
+        if type(k) is int and k >= 0:
+            page = self.pages.get(k >> PAGEBITS)
+            return page[k & PAGEMASK] if page is not None else 0
+        return self.other.get(k, 0)
+
+    # Returns the sequence number mapped to local key k if that item
+    # has been written, otherwise 0.
+    # (This is the hot path for references, so get() and isWritten() are inlined.)
+    def getWritten(self, k):
+        if type(k) is int and k >= 0:
+            page = self.pages.get(k >> PAGEBITS)
+            if page is None:
+                return 0
+            m = page[k & PAGEMASK]
+        else:
+            m = self.other.get(k, 0)
+        try:
+            return m if self.written[m >> 3] & (1 << (m & 7)) else 0
+        except IndexError:
+            return 0
+
+    # Maps local key k to sequence number m.
+    def put(self, k, m):
+        if type(k) is int and k >= 0:
+            page = self.pages.get(k >> PAGEBITS)
+            if page is None:
+                page = self.pages[k >> PAGEBITS] = array('I', EMPTYPAGE)
+            if not page[k & PAGEMASK]:
+                self.nKeys += 1
+            page[k & PAGEMASK] = m
+        else:
+            if k not in self.other:
+                self.nKeys += 1
+            self.other[k] = m
+
+    def isWritten(self, m):
+        i = m >> 3
+        return i < len(self.written) and bool(self.written[i] & (1 << (m & 7)))
+
+    def markWritten(self, m):
+        i = m >> 3
+        w = self.written
+        if i >= len(w):
+            w.extend(bytes(max(i + 1 - len(w), len(w))))
+        b = 1 << (m & 7)
+        if not w[i] & b:
+            w[i] |= b
+            self.nWritten += 1
+
+    def unmarkWritten(self, m):
+        i = m >> 3
+        w = self.written
+        b = 1 << (m & 7)
+        if i < len(w) and w[i] & b:
+            w[i] &= ~b
+            self.nWritten -= 1
+
+    def clearWritten(self):
+        self.written = bytearray()
+        self.nWritten = 0
+
+    def isClaimed(self, m):
+        i = m >> 3
+        return i < len(self.claimed) and bool(self.claimed[i] & (1 << (m & 7)))
+
+    def claim(self, m):
+        i = m >> 3
+        c = self.claimed
+        if i >= len(c):
+            c.extend(bytes(max(i + 1 - len(c), len(c))))
+        b = 1 << (m & 7)
+        if not c[i] & b:
+            c[i] |= b
+            self.nClaimed += 1
+
+    # (Also sets up the claims of a TypeIds pickled before they were kept.)
+    def clearClaimed(self):
+        self.claimed = bytearray()
+        self.nClaimed = 0
+
+    # Iterates over (local key, sequence number) for all mapped keys.
+    def items(self):
+        for p, page in self.pages.items():
+            base = p << PAGEBITS
+            for i, m in enumerate(page):
+                if m:
+                    yield base + i, m
+        yield from self.other.items()
+
+    def memoryUsage(self):
+        return sys.getsizeof(self.pages) \
+            + sum([sys.getsizeof(p) for p in self.pages.values()]) \
+            + sys.getsizeof(self.other) + sum([sys.getsizeof(k) for k in self.other]) \
+            + sys.getsizeof(self.written) + sys.getsizeof(self.claimed)
+
+# Iterates over the numbers whose bits are set in bitset bits (bytes or bytearray).
+def iterBits(bits):
+    for i, byte in enumerate(bits):
+        if byte:
+            for j in range(8):
+                if byte & (1 << j):
+                    yield (i << 3) | j
+
+class IdRegistry:
+    def __init__(self):
+        self.types = {}           # type key -> TypeIds
+        self.otherWritten = set() # written ids not of the form n_m
+
+    # Returns the TypeIds for type key n, creating it if needed.
+    def get(self, n):
+        t = self.types.get(n)
+        if t is None:
+            t = self.types[n] = TypeIds(n)
+        return t
+
+    def _parse(self, id):
+        try:
+            n, m = id.split('_')
+            return int(n), int(m)
+        except ValueError:
+            return None, None
+
+    def add(self, id):
+        n, m = self._parse(id)
+        if n is None:
+            self.otherWritten.add(id)
+        else:
+            self.get(n).markWritten(m)
+
+    def __contains__(self, id):
+        n, m = self._parse(id)
+        if n is None:
+            return id in self.otherWritten
+        t = self.types.get(n)
+        return t is not None and t.isWritten(m)
+
+    def __len__(self):
+        return sum([t.nWritten for t in self.types.values()]) + len(self.otherWritten)
+
+    # Returns a list of (type key, #keys mapped, #ids written, next id, bytes used),
+    # one per type, sorted by bytes used (largest first).
+    def memoryReport(self):
+        rpt = []
+        for n, t in self.types.items():
+            rpt.append((n, t.nKeys, t.nWritten, t.nextId, t.memoryUsage()))
+        rpt.sort(key=lambda x: -x[4])
+        return rpt
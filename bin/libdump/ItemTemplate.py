@@ -0,0 +1,151 @@
+#
+# ItemTemplate.py
+#
+# Compiled item templates. An item template (ITMPLT) is a %-style format string that is
+# filled from a record, after which "Not Applicable" attributes and empty attributes and
+# references are removed with regular expressions (see AbstractItemDumper.NA_RE, NV_RE).
+# Running those expressions over every item costs more than building the item.
+#
+# Most items have nothing to suppress. For those, an ItemTemplate fills the whole template
+# and a quick substring check shows neither expression can match, so no scan is needed.
+# For the rest, it uses the template parsed, once, into blocks of lines, and renders each
+# block on its own:
+#   - literal blocks (no slots) are rendered, suppression included, at compile time.
+#   - attribute and reference blocks are a single line holding a single value slot,
+#     e.g., <attribute name="symbol" value="%(symbol)s" />. Whether an empty or
+#     "Not Applicable" value removes the line is worked out at compile time, so rendering
+#     only needs to look at the value.
+#   - other blocks (collections, pre-built elements inserted by the dumper, etc.) are
+#     filled and then scanned only if they could contain something to remove.
+# Blocks start at lines beginning with "<". No match of either expression can span
+# such a boundary, so suppressing block by block gives the same result as suppressing the
+# whole item. Whenever a value could interact with the expressions (quotes, markup,
+# newlines), that block falls back to filling and scanning. The output is identical
+# to filling and scanning the whole template.
+#
+
+import re
+
+class ItemTemplate:
+    SLOT_RE = re.compile(r'%\(([^)]*)\)([#0 +-]*\d*(?:\.\d+)?[a-zA-Z])|%%|%')
+    BLOCK_START_RE = re.compile(r'\s*<')
+    # values that could take part in a match other than as a whole attribute value
+    UNSAFE_RE = re.compile(r'[\n"<=>]')
+    # a value the NA expression treats as "Not Applicable"
+    NA_VALUE_RE = re.compile(r'Not Applicable\Z', re.I)
+    PROBE = 'x'
+
+    LITERAL = 0
+    VALUE = 1
+    RAW = 2
+
+    #
+    # Args:
+    #  tmplt (string) The item template.
+    #  regexes (list) Suppression expressions, applied in order. Each match is removed.
+    #
+    def __init__(self, tmplt, regexes):
+        self.tmplt = tmplt
+        self.regexes = [rx for rx in regexes if rx is not None]
+        self.blocks = self.compile(tmplt)
+
+    # Returns False if neither expression can match s: NV_RE needs '=""', and NA_RE
+    # needs "cable" in some mix of cases. (Every character re.I matches to one of
+    # c,a,b,l,e lowercases to it, so testing s.lower() is safe, and far quicker than
+    # a case-insensitive search.)
+    #
+    def maybeSuppress(self, s):
+        return '=""' in s or 'cable' in s.lower()
+
+    # Applies the suppression expressions to s.
+    #
+    def suppress(self, s):
+        for rx in self.regexes:
+            s = rx.sub('', s)
+        return s
+
+    # Parses the template into a list of blocks. Returns None if the template uses
+    # anything other than named slots and %%, in which case items are rendered
+    # the old way. Blocks with slots other than %(name)s are always filled and scanned.
+    #
+    def compile(self, tmplt):
+        if not self.regexes:
+            return None
+        lines = tmplt.split('\n')
+        groups = [[lines[0]]]
+        for line in lines[1:]:
+            if self.BLOCK_START_RE.match(line):
+                groups.append([line])
+            else:
+                groups[-1].append(line)
+        blocks = []
+        for i, g in enumerate(groups):
+            text = '\n'.join(g) + ('\n' if i < len(groups) - 1 else '')
+            parts = [] # alternating literal strings and slot names
+            lit = []
+            pos = 0
+            plain = True # all slots are %(name)s
+            for m in self.SLOT_RE.finditer(text):
+                lit.append(text[pos:m.start()])
+                pos = m.end()
+                if m.group(0) == '%%':
+                    lit.append('%')
+                elif m.group(1) is None:
+                    return None
+                else:
+                    plain = plain and m.group(2) == 's'
+                    parts.append(''.join(lit))
+                    parts.append(m.group(1))
+                    lit = []
+            lit.append(text[pos:])
+            parts.append(''.join(lit))
+            blocks.append(self.compileBlock(text, parts) if plain else (self.RAW, text))
+        return blocks
+
+    def compileBlock(self, text, parts):
+        if len(parts) == 1:
+            return (self.LITERAL, self.suppress(parts[0]))
+        if len(parts) == 3:
+            pre, name, post = parts
+            if pre.endswith('="') and post.startswith('"') and '\n' not in pre + post.rstrip('\n'):
+                probed = pre + self.PROBE + post
+                if self.suppress(probed) == probed:
+                    empty = self.suppress(pre + post)
+                    na = self.suppress(pre + 'Not Applicable' + post)
+                    if na != self.suppress(pre + 'NOT APPLICABLE' + post):
+                        na = None   # the value survives; fill and scan
+                    return (self.VALUE, pre, name, post, empty, na)
+        return (self.RAW, text)
+
+    # Renders record r. Most items have nothing to suppress, and are done after
+    # filling the whole template and one quick check.
+    #
+    def render(self, r):
+        s = self.tmplt % r
+        if self.blocks is None:
+            return self.suppress(s)
+        if not self.maybeSuppress(s):
+            return s
+        out = []
+        for b in self.blocks:
+            kind = b[0]
+            if kind == self.LITERAL:
+                out.append(b[1])
+            elif kind == self.VALUE:
+                v = r[b[2]]
+                if type(v) is not str:
+                    v = str(v)
+                if not v:
+                    out.append(b[4])
+                elif len(v) == 14 and self.NA_VALUE_RE.match(v):
+                    out.append(b[5] if b[5] is not None else self.suppress(b[1] + v + b[3]))
+                elif self.UNSAFE_RE.search(v) is None:
+                    out.append(b[1] + v + b[3])
+                else:
+                    out.append(self.suppress(b[1] + v + b[3]))
+            else:
+                s = b[1] % r
+                if self.maybeSuppress(s):
+                    s = self.suppress(s)
+                out.append(s)
+        return ''.join(out)
@@ -2,6 +2,9 @@ from .AbstractItemDumper import *
 
 
 class LocationDumper(AbstractItemDumper):
+    PRODUCES   = ['Location']
+    REFERENCES = ['Marker', 'Chromosome']
+
     QTMPLT = '''
     SELECT c._marker_key, mc._chromosome_key, c.startcoordinate, c.endcoordinate, c.strand, c.version as assembly
     FROM MRK_Location_Cache c, MRK_Chromosome mc, MRK_Marker m
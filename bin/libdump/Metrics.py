@@ -0,0 +1,238 @@
+#
+# Metrics.py
+#
+# Structured metrics for a dump run, written as a JSON report (metrics.json, next to
+# the outputs) at the end. Recorded:
+#   - for each dumper, and each of its phases (preDump, mainDump, postDump): wall time,
+#     CPU time, and peak RSS
+#   - for each query run through the context: how it was fetched (cursor, copy or cache),
+#     time to first row, fetch time (excluding the time spent processing rows), total time,
+#     rows, and bytes received (for copy and cache; a cursor does not tell). A query run
+#     ahead by a dumper (see AbstractItemDumper.PRELOADS) is marked prefetched, with the
+#     time the dumper then waited for its rows (waitTime).
+#   - for each preload index a dumper holds (see Preloads): items, estimated bytes, and
+#     whether it was moved to disk to stay within the memory budget
+#   - for each output file: items written and bytes on disk
+#
+# Times are in seconds; start times are relative to the start of the run. CPU time is
+# the process's (all threads). Peak RSS is the high water mark of the process while
+# the dumper or phase ran: on Linux, it is reset (through /proc/self/clear_refs) when
+# each one starts; elsewhere it is the peak so far.
+#
+# Metrics recorded in worker processes (--jobs) are sent back to the parent along with
+# the rest of the worker's results (see DumperScheduler).
+#
+
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import datetime
+import resource
+
+class Span:
+    __slots__ = ('metrics', 'rec', 'wall0', 'cpu0', 'peak')
+
+    def __init__(self, metrics, rec):
+        self.metrics = metrics
+        self.rec = rec
+        self.peak = 0
+
+    def __enter__(self):
+        self.metrics.stack.append(self)
+        self.metrics.resetPeak()
+        self.rec['start'] = round(time.time() - self.metrics.started, 3)
+        self.wall0 = time.perf_counter()
+        self.cpu0 = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        m = self.metrics
+        self.rec['wallTime'] = round(time.perf_counter() - self.wall0, 3)
+        self.rec['cpuTime'] = round(time.process_time() - self.cpu0, 3)
+        # the peak since the last reset (ours, or that of the last nested span), or
+        # that of any nested span, whichever is higher
+        self.peak = max(self.peak, m.readPeak())
+        self.rec['peakRss'] = self.peak
+        m.stack.pop()
+        if m.stack:
+            parent = m.stack[-1]
+            parent.peak = max(parent.peak, self.peak)
+        return False
+
+    # Returns a span for a phase of this dumper.
+    def phase(self, name):
+        rec = {}
+        self.rec['phases'][name] = rec
+        return Span(self.metrics, rec)
+
+class Metrics:
+    FORMAT = 1
+    SPACE_RE = re.compile(r'\s+')
+
+    def __init__(self):
+        self.started = time.time()
+        self.cpu0 = time.process_time()
+        self.stack = []         # open spans
+        self.canResetPeak = True
+        self.reset()
+
+    # Clears what has been recorded (e.g., in a new worker process).
+    def reset(self):
+        self.dumpers = []       # dumper records, as they start
+        self.queries = []       # query records, as they run
+        self.fileItems = {}     # output file name -> items written
+
+    def getState(self):
+        return (self.dumpers, self.queries, self.fileItems)
+
+    # Adds metrics recorded elsewhere (e.g., in a worker process).
+    def addState(self, state):
+        dumpers, queries, fileItems = state
+        self.dumpers.extend(dumpers)
+        self.queries.extend(queries)
+        for f, n in fileItems.items():
+            self.fileItems[f] = self.fileItems.get(f, 0) + n
+
+    def resetPeak(self):
+        if self.canResetPeak:
+            try:
+                with open('/proc/self/clear_refs', 'w') as fd:
+                    fd.write('5')
+            except (IOError, OSError):
+                self.canResetPeak = False
+
+    # Returns the peak RSS (bytes).
+    def readPeak(self):
+        try:
+            with open('/proc/self/status') as fd:
+                for line in fd:
+                    if line.startswith('VmHWM:'):
+                        return int(line.split()[1]) * 1024
+        except (IOError, OSError):
+            pass
+        r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return r if sys.platform == 'darwin' else r * 1024
+
+    # Returns a span (a context manager) measuring a dumper. A dumper run by another
+    # (e.g., FeatureDumper runs MouseFeatureDumper) records that one as its parent.
+    def dumper(self, d):
+        parent = None
+        for s in reversed(self.stack):
+            if 'phases' in s.rec:
+                parent = s.rec['name']
+                break
+        rec = {'name' : d.__class__.__name__, 'parent' : parent, 'pid' : os.getpid(), 'phases' : {}}
+        self.dumpers.append(rec)
+        return Span(self, rec)
+
+    # Records preload index rec for the dumper running.
+    def preload(self, rec):
+        for s in reversed(self.stack):
+            if 'phases' in s.rec:
+                s.rec.setdefault('preloads', []).append(rec)
+                return
+
+    # Returns a new query record, for query q.
+    def query(self, q):
+        dumper = None
+        for s in reversed(self.stack):
+            if 'phases' in s.rec:
+                dumper = s.rec['name']
+                break
+        text = self.SPACE_RE.sub(' ', str(q)).strip()
+        rec = {
+            'dumper'       : dumper,
+            'id'           : hashlib.sha1(text.encode('utf-8')).hexdigest()[:12],
+            'sql'          : text,
+            'source'       : None,
+            'start'        : round(time.time() - self.started, 3),
+            'firstRowTime' : None,
+            'fetchTime'    : 0.0,
+            'totalTime'    : 0.0,
+            'rows'         : 0,
+            'bytes'        : None,
+        }
+        self.queries.append(rec)
+        return rec
+
+    # Yields the rows of iterator it, timing the fetches for query record rec.
+    def timeRows(self, it, rec):
+        clock = time.perf_counter
+        t0 = clock()
+        fetch = 0.0
+        n = 0
+        it = iter(it)
+        try:
+            while True:
+                t = clock()
+                try:
+                    r = next(it)
+                except StopIteration:
+                    fetch += clock() - t
+                    break
+                fetch += clock() - t
+                if n == 0:
+                    rec['firstRowTime'] = round(clock() - t0, 6)
+                n += 1
+                yield r
+        finally:
+            rec['fetchTime'] = round(fetch, 6)
+            rec['totalTime'] = round(clock() - t0, 6)
+            rec['rows'] = n
+
+    # Returns a row parser wrapping p, which times the processing of rows for query
+    # record rec. Call done() when the query has finished.
+    def timeParser(self, p, rec):
+        clock = time.perf_counter
+        t0 = clock()
+        acc = [0.0, 0]      # processing time, rows
+        def timed(r, **kwargs):
+            t = clock()
+            if acc[1] == 0:
+                rec['firstRowTime'] = round(t - t0, 6)
+            acc[1] += 1
+            try:
+                return p(r, **kwargs)
+            finally:
+                acc[0] += clock() - t
+        def done():
+            total = clock() - t0
+            rec['totalTime'] = round(total, 6)
+            rec['fetchTime'] = round(total - acc[0], 6)
+            rec['rows'] = acc[1]
+        return timed, done
+
+    # Writes the report to path. run holds anything else to report about the run
+    # (command line, totals, ...). Output files are looked for next to the report.
+    def write(self, path, run={}):
+        ru = resource.getrusage(resource.RUSAGE_CHILDREN)
+        report = {
+            'format'     : self.FORMAT,
+            'started'    : datetime.datetime.fromtimestamp(self.started).isoformat(timespec='seconds'),
+            'finished'   : datetime.datetime.now().isoformat(timespec='seconds'),
+            'wallTime'   : round(time.time() - self.started, 3),
+            'cpuTime'    : round(time.process_time() - self.cpu0, 3),
+            'workersCpuTime' : round(ru.ru_utime + ru.ru_stime, 3),
+            'peakRss'    : max([d.get('peakRss', 0) for d in self.dumpers] + [self.readPeak()]),
+            'run'        : run,
+            'dumpers'    : sorted(self.dumpers, key=lambda d: d['start']),
+            'queries'    : sorted(self.queries, key=lambda q: q['start']),
+            'files'      : self.files(os.path.dirname(path)),
+        }
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as fd:
+            json.dump(report, fd, indent=1, default=str)
+        os.replace(tmp, path)
+
+    def files(self, dir):
+        files = {}
+        for f, n in sorted(self.fileItems.items()):
+            p = os.path.join(dir, f)
+            files[f] = {
+                'items' : n,
+                'bytes' : os.path.getsize(p) if os.path.exists(p) else None,
+            }
+        return files
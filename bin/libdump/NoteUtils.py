@@ -11,20 +11,30 @@
 #                  (you should always combine with _mgitype_key)
 #    _mgitype_key - key of the MGI type (ACC_MGIType) you want notes for
 #    _notetype_key - key of the notetype (MGI_NoteType) you want.
+# plus, optionally, context - a DumperContext to run the query through (so it is logged,
+# cached, and recorded in the metrics), or else pool - a connection pool to run it on.
 #
 # Example: iterate over the "General" notes for allele key = 138:
 #       for n in libdump.NoteUtils.iterNotes(_object_key=138, _notetype_key=1020):
 #               print n['note']
 #
+# For dumpers, the context has a NoteLoader (context.notes), which loads the notes of the
+# (notetype, mgitype) pairs dumpers that run back to back need in a single pass (see below).
+#
 
 from . import mgidbconnect as db
+from contextlib import contextmanager
 
 
-def iterNotes( **kwargs ):
+def iterNotes( pool=None, context=None, **kwargs ):
         note = None# current note to yield
         qry = buildQuery( ** kwargs )
-        db.setConnectionFromPropertiesFile()
-        notechunks = db.sql( qry )
+        if context is not None:
+            notechunks = context.sql( qry )
+        else:
+            if pool is None:
+                db.setConnectionFromPropertiesFile()
+            notechunks = db.sql( qry, pool=pool )
         for nc in notechunks:
             if nc['sequencenum'] == 1:
                 if note:
@@ -57,6 +67,140 @@ def buildQuery( _object_key = None, _notetype_key = None, _mgitype_key=None ):
         whereClause = " AND ".join(whereParts)
         return QTMPLT % whereClause
 
+# Loads notes, for dumpers that run back to back, in one pass over MGI_Note/MGI_NoteChunk.
+#
+# Each dumper lists the (_notetype_key, _mgitype_key) pairs it (or any dumper it runs)
+# needs in NOTES; a _mgitype_key of None means any type. The run registers the NOTES of
+# its dumpers up front, in the order they run. Dumpers with notes that follow one another
+# (with no dumper without notes in between) form a group. The first time a dumper of a
+# group asks for notes, the loader runs one query for the pairs of the whole group,
+# streams the chunks in order, and joins each note's chunks once. So notes are only held
+# from shortly before the dumpers that use them run, not for the whole run.
+#
+# A dumper gets its notes with get() or iterate(). The first get() of a pair hands its
+# notes to the context's Preloads, as the running dumper's preload: they are measured,
+# count against --memory-budget (and may be moved to disk), and are freed when that
+# dumper is done, which is also when the loader drops them (see using()). A pair
+# registered by several dumpers is loaded again for the next one.
+#
+# With --jobs, each worker loads the notes of its own dumper only (see only()).
+#
+# Notes are as stored: chunks are joined, but nothing is stripped.
+#
+class NoteLoader:
+    QTMPLT = '''
+        SELECT n._note_key, n._notetype_key, n._object_key, n._mgitype_key, nc.sequencenum, nc.note
+        FROM MGI_Note n, MGI_NoteChunk nc
+        WHERE n._note_key = nc._note_key
+        AND (%s)
+        ORDER BY n._object_key, n._note_key, nc.sequencenum
+        '''
+
+    def __init__(self, context):
+        self.context = context
+        self.users = {}     # pair -> number of dumpers (still to finish) that registered it
+        self.groups = []    # pairs of each group of dumpers, in run order, not loaded yet
+        self.grouping = False # the last dumper registered has notes
+        self.loaded = {}    # pair -> {_object_key -> [(_note_key, note), ...]}
+        self.held = set()   # pairs handed to the preloads
+
+    # Registers pairs needed by a dumper that will run (also if none).
+    def register(self, pairs):
+        for p in pairs:
+            self.users[p] = self.users.get(p, 0) + 1
+        if pairs and self.grouping:
+            self.groups[-1].extend(pairs)
+        elif pairs:
+            self.groups.append(list(pairs))
+        self.grouping = bool(pairs)
+
+    # In a worker process, running a dumper that needs pairs: the other dumpers run
+    # elsewhere, so only these are loaded.
+    def only(self, pairs):
+        self.groups = [list(pairs)] if pairs else []
+
+    # Dumpers that registered pairs release them when done (within the block).
+    @contextmanager
+    def using(self, pairs):
+        try:
+            yield
+        finally:
+            self.release(pairs)
+
+    def release(self, pairs):
+        for p in pairs:
+            n = self.users.get(p, 0) - 1
+            if n > 0:
+                self.users[p] = n
+            else:
+                self.users.pop(p, None)
+            if n <= 0 or p in self.held:
+                # (held notes are freed along with the dumper's preloads)
+                self.loaded.pop(p, None)
+                self.held.discard(p)
+
+    # Loads pair p, with the other pairs of the first group not loaded yet that has it.
+    def load(self, p):
+        todo = [p]
+        for g in self.groups:
+            if p in g:
+                todo = [q for q in dict.fromkeys(g) if q in self.users and q not in self.loaded]
+                # (emptied rather than removed: dumpers registered later may still join it)
+                del g[:]
+                break
+        if p not in todo:
+            todo.append(p)
+        conds = []
+        ixs = {}
+        for nt, mt in todo:
+            ixs[(nt, mt)] = self.loaded[(nt, mt)] = {}
+            if mt is None:
+                conds.append('n._notetype_key = %d' % nt)
+            else:
+                conds.append('(n._notetype_key = %d AND n._mgitype_key = %d)' % (nt, mt))
+        q = self.QTMPLT % ' OR '.join(conds)
+        key = None
+        chunks = []
+        for r in self.context.sqliter(q, rows='tuple'):
+            if r[0] != key:
+                if chunks:
+                    self.add(prev, chunks, ixs)
+                key = r[0]
+                prev = r
+                chunks = []
+            if r[5] is not None:
+                chunks.append(r[5])
+        if chunks:
+            self.add(prev, chunks, ixs)
+        self.context.log('Loaded notes for %d note types.' % len(todo))
+
+    def add(self, r, chunks, ixs):
+        text = ''.join(chunks)
+        nk, nt, ok, mt = r[0], r[1], r[2], r[3]
+        for p in ((nt, mt), (nt, None)):
+            ix = ixs.get(p)
+            if ix is not None:
+                ix.setdefault(ok, []).append((nk, text))
+
+    # Returns the notes of a pair: a dict from object key to a list of
+    # (_note_key, note), in _note_key order. Object keys are in order.
+    def get(self, _notetype_key, _mgitype_key=None):
+        p = (_notetype_key, _mgitype_key)
+        if p not in self.loaded:
+            self.load(p)
+        if p not in self.held:
+            self.loaded[p] = self.context.preloads.add(self, 'notes%s' % (p,), self.loaded[p])
+            self.held.add(p)
+        return self.loaded[p]
+
+    # Iterates over the notes of a pair, as dicts (as iterNotes does, except that the
+    # notes are not stripped), in object key, then note key order.
+    def iterate(self, _notetype_key, _mgitype_key=None):
+        for ok, notes in self.get(_notetype_key, _mgitype_key).items():
+            for nk, text in notes:
+                yield { '_note_key': nk, '_notetype_key': _notetype_key, '_object_key': ok,
+                        '_mgitype_key': _mgitype_key, 'note': text }
+
 def __test__():
         # print all notes for allele 138
         for n in iterNotes(_object_key = 138, _mgitype_key = 11):
@@ -1,6 +1,9 @@
 from .AbstractItemDumper import *
 
 class OrganismDumper(AbstractItemDumper):
+    PRODUCES   = ['Organism']
+    REFERENCES = []
+
     # This dumper used to query the MGI_Organism, 
     # Now it just dumps records based on config. See DumperContext.py
     QTMPLT = []
@@ -0,0 +1,233 @@
+#
+# OutputWriter.py
+#
+# Pipelined output for item files. Rendered items are collected into batches, which
+# go through a bounded queue to a writer thread. The writer thread encodes them and
+# writes them to binary files with large buffers. This way, fetching from the database
+# and formatting items overlap with writing to disk, rather than the dumper waiting
+# on every write.
+#
+# OutputFile looks enough like a text file (write, flush, close, closed) for
+# the code that writes item files (see DumperContext.openOutput).
+#
+# The writer thread is started on first use, and again in a forked process
+# (threads do not survive a fork). A failed write is re-raised in the dumping
+# thread at its next write, flush, or close.
+#
+# Output may be compressed (gzip or zstd). Each batch is compressed on its own, as a
+# gzip member or zstd frame, by a pool of threads (both compressors release the GIL),
+# and written in order. A file of concatenated members/frames is a valid compressed
+# file, so part files (see DumperScheduler) can also simply be concatenated.
+# zstd needs the zstandard package.
+#
+
+import os
+import gzip
+import queue
+import shutil
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+class OutputFile:
+    def __init__(self, writer, path, append=False):
+        self.writer = writer
+        self.name = path
+        self.raw = None
+        self.pending = []
+        self.npending = 0
+        self.closed = False
+        self.writer.submit(self, 'open', 'ab' if append else 'wb')
+
+    def write(self, s):
+        self.pending.append(s)
+        self.npending += len(s)
+        if self.npending >= self.writer.batchSize:
+            self.send()
+
+    # Hands the pending batch to the writer thread.
+    #
+    def send(self):
+        if self.pending:
+            self.writer.submit(self, 'write', ''.join(self.pending))
+            self.pending = []
+            self.npending = 0
+
+    # Flush barrier. Returns once everything written so far is in the file.
+    #
+    def flush(self):
+        if self.closed:
+            return
+        self.send()
+        self.writer.submit(self, 'flush')
+        self.writer.sync()
+
+    def close(self):
+        if self.closed:
+            return
+        self.send()
+        self.writer.submit(self, 'close')
+        self.closed = True
+
+    # Appends the contents of file path, as is. If output is compressed,
+    # path must have been written compressed, with the same method.
+    #
+    def copyFrom(self, path):
+        self.send()
+        self.writer.submit(self, 'copy', path)
+
+class OutputWriter:
+    # compression method -> (file name suffix, default level)
+    COMPRESSORS = {
+        'gzip' : ('.gz', 6),
+        'zstd' : ('.zst', 3),
+    }
+
+    def __init__(self, queueSize=64, batchSize=1<<18, bufferSize=1<<22, encoding='utf-8',
+                 compress=None, compressLevel=None, compressThreads=None):
+        # Max number of batches waiting to be written. If 0, batches are written
+        # in the calling thread.
+        self.queueSize = queueSize
+        # Approximate number of characters per batch.
+        self.batchSize = batchSize
+        # Buffer size of each output file.
+        self.bufferSize = bufferSize
+        self.encoding = encoding
+        self.pid = None
+        self.queue = None
+        self.thread = None
+        self.error = None
+        # Compression method (None, 'gzip', or 'zstd'), level, and number of threads.
+        self.compress = compress
+        self.suffix = ''
+        if compress:
+            if compress not in self.COMPRESSORS:
+                raise RuntimeError('Unknown compression method: %s. Use one of: %s' % \
+                    (compress, ', '.join(sorted(self.COMPRESSORS))))
+            if compress == 'zstd':
+                try:
+                    import zstandard
+                except ImportError:
+                    raise RuntimeError('zstd compression needs the zstandard package.')
+                self.zstandard = zstandard
+                self.local = threading.local()
+            self.suffix, level = self.COMPRESSORS[compress]
+            self.compressLevel = level if compressLevel is None else compressLevel
+            self.compressThreads = compressThreads or min(8, os.cpu_count() or 1)
+        self.executor = None
+        self.executorPid = None
+        self.inflight = deque() # (file, future) for batches being compressed, in order
+
+    # Opens a file for writing (or appending), and returns an OutputFile for it.
+    #
+    def open(self, path, append=False):
+        return OutputFile(self, path, append)
+
+    def start(self):
+        self.pid = os.getpid()
+        self.error = None
+        self.queue = queue.Queue(self.queueSize)
+        self.thread = threading.Thread(target=self.run, name='OutputWriter', daemon=True)
+        self.thread.start()
+
+    # Queues a command (open, write, flush, close) for file f.
+    #
+    def submit(self, f, cmd, data=None):
+        if self.queueSize <= 0:
+            self.process(f, cmd, data)
+            return
+        if self.thread is None or self.pid != os.getpid():
+            self.start()
+        self.check()
+        self.queue.put((f, cmd, data))
+
+    # Waits until everything queued so far has been written.
+    #
+    def sync(self):
+        if self.thread is not None and self.pid == os.getpid():
+            self.queue.join()
+        self.check()
+
+    # Waits for everything to be written, then stops the writer thread.
+    #
+    def stop(self):
+        if self.thread is not None and self.pid == os.getpid():
+            self.queue.put((None, None, None))
+            self.thread.join()
+        self.thread = None
+        if self.queueSize <= 0:
+            self.drain()
+        if self.executor is not None and self.executorPid == os.getpid():
+            self.executor.shutdown()
+        self.executor = None
+        self.check()
+
+    def check(self):
+        if self.error is not None:
+            e, self.error = self.error, None
+            raise e
+
+    def process(self, f, cmd, data):
+        if cmd == 'write':
+            data = data.encode(self.encoding)
+            if self.compress:
+                future = self.getExecutor().submit(self.compressBlock, data)
+                self.inflight.append((f, future))
+                self.drain(2 * self.compressThreads)
+            else:
+                f.raw.write(data)
+            return
+        self.drain()
+        if cmd == 'open':
+            f.raw = open(f.name, data, buffering=self.bufferSize)
+        elif cmd == 'flush':
+            f.raw.flush()
+        elif cmd == 'close':
+            f.raw.close()
+        elif cmd == 'copy':
+            with open(data, 'rb') as src:
+                shutil.copyfileobj(src, f.raw, self.bufferSize)
+
+    # Writes out compressed batches, in order, until no more than n are in flight.
+    #
+    def drain(self, n=0):
+        while len(self.inflight) > n:
+            f, future = self.inflight.popleft()
+            f.raw.write(future.result())
+
+    def getExecutor(self):
+        if self.executor is None or self.executorPid != os.getpid():
+            self.executor = ThreadPoolExecutor(self.compressThreads)
+            self.executorPid = os.getpid()
+        return self.executor
+
+    # Runs in a compression thread.
+    #
+    def compressBlock(self, data):
+        if self.compress == 'gzip':
+            return gzip.compress(data, self.compressLevel, mtime=0)
+        c = getattr(self.local, 'compressor', None)
+        if c is None:
+            c = self.local.compressor = self.zstandard.ZstdCompressor(level=self.compressLevel)
+        return c.compress(data)
+
+    # Runs in the writer thread.
+    #
+    def run(self):
+        while True:
+            f, cmd, data = self.queue.get()
+            try:
+                if self.error is None:
+                    if f is None:
+                        self.drain()
+                    else:
+                        self.process(f, cmd, data)
+            except Exception as e:
+                # kept for check() to raise; batches still being compressed are dropped
+                self.error = e
+                self.inflight.clear()
+            finally:
+                self.queue.task_done()
+            # stop() is waiting for the thread, error or not
+            if f is None:
+                return
@@ -0,0 +1,298 @@
+#
+# Preloads.py
+#
+# Bookkeeping for the indexes dumpers preload (e.g., ExpressionDumper.assay,
+# FeatureDumper.mk2refs): how big each one is, and a memory budget for them
+# (dumpMgiItemXml.py --memory-budget).
+#
+# A dumper hands each index to the context once it is built, and keeps what it gets back:
+#       self.mk2refs = self.context.preloads.add(self, 'mk2refs', self.mk2refs)
+# The index's footprint (deep size; estimated from a sample for big indexes) is logged
+# and recorded in the dumper's metrics. If the indexes held so far, plus this one, would
+# go over the budget, the index is written to a file and a DiskIndex is returned in
+# its place: a read-only mapping with the same keys, values and order, whose values
+# are read (memory-mapped) from the file when asked for. Each value read is a fresh
+# copy, so an index must be complete (no more changes) when it is added.
+#
+# Indexes count against the budget until the top-level dumper that was running when
+# they were added has finished (a dumper's helpers and the dumpers it runs share its
+# budget). Then they are freed: emptied (so the memory goes even if something still
+# refers to the index), or, for those on disk, their files are removed.
+#
+# Without a budget, indexes are only measured (and freed).
+#
+# Preloads the context holds for several dumpers (e.g., context.annotationComments,
+# built by AnnotationCommentDumper for AnnotationDumper) are declared, by attribute
+# name, with the names of the dumpers that use them:
+#       self.preloads.share('annotationComments', ['AnnotationDumper'])
+# Once the run's dumpers are known (see plan), such an attribute is deleted as soon as
+# every one of its users the run runs has finished (or right away if there are none;
+# the attribute is deleted again if it is set after that). Without a plan (e.g., with
+# --explain), shared preloads are kept.
+#
+# Whenever anything is freed, the garbage collector is run and the RSS reclaimed is
+# logged. (How much goes back to the system depends on the allocator; small objects
+# are often kept for reuse by the process.)
+#
+
+import gc
+import os
+import sys
+import mmap
+import pickle
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
+from contextlib import contextmanager
+
+# Returns the size of obj and everything it holds (containers only; objects from
+# libdump, modules, classes and functions are not followed). Objects in seen are
+# not counted again.
+def deepSize(obj, seen):
+    size = 0
+    todo = [obj]
+    getsizeof = sys.getsizeof
+    while todo:
+        o = todo.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        size += getsizeof(o)
+        if isinstance(o, dict):
+            todo.extend(o.keys())
+            todo.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            todo.extend(o)
+        elif hasattr(o, '__slots__') and not isinstance(o, type) and type(o).__module__ != 'builtins':
+            for a in o.__slots__:
+                if hasattr(o, a):
+                    todo.append(getattr(o, a))
+    return size
+
+# Returns a size given as bytes, or with a K, M or G suffix (e.g., 8G), in bytes.
+def parseSize(s):
+    s = s.strip().upper().rstrip('B')
+    mult = {'K' : 1 << 10, 'M' : 1 << 20, 'G' : 1 << 30}.get(s[-1:], 1)
+    return int(float(s[:-1] if mult > 1 else s) * mult)
+
+# Returns the footprint of index d (a dict or list): its deep size, estimated from
+# a sample of SAMPLE entries if it has more.
+SAMPLE = 2000
+def footprint(d):
+    n = len(d)
+    if n <= SAMPLE:
+        return deepSize(d, set())
+    items = list(d.items()) if isinstance(d, dict) else d
+    step = n // SAMPLE
+    seen = set()
+    size = sum([deepSize(items[i], seen) for i in range(0, n, step)])
+    return sys.getsizeof(d) + size * n // len(range(0, n, step))
+
+# Returns the process's resident set size (bytes), or None if it cannot be read.
+def rss():
+    try:
+        with open('/proc/self/statm') as fd:
+            return int(fd.read().split()[1]) * mmap.PAGESIZE
+    except (IOError, OSError, ValueError):
+        return None
+
+class DiskIndex(Mapping):
+    def __init__(self, path, d):
+        self.path = path
+        keys = list(d.keys())
+        self.offsets = array('Q', [0])
+        with open(path, 'wb') as fd:
+            for v in d.values():
+                fd.write(pickle.dumps(v, pickle.HIGHEST_PROTOCOL))
+                self.offsets.append(fd.tell())
+        if all([type(k) is int for k in keys]):
+            # keys in order, and sorted with their row numbers, for binary search
+            self.rowKeys = array('q', keys)
+            rows = sorted(range(len(keys)), key=keys.__getitem__)
+            self.sortedKeys = array('q', [keys[i] for i in rows])
+            self.sortedRows = array('I', rows)
+            self.rows = None
+        else:
+            self.rowKeys = keys
+            self.rows = dict([(k, i) for i, k in enumerate(keys)])
+        self.fd = open(path, 'rb')
+        self.mm = mmap.mmap(self.fd.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets[-1] else b''
+
+    def row(self, k):
+        if self.rows is not None:
+            return self.rows.get(k, -1)
+        if type(k) is not int:
+            return -1
+        i = bisect_left(self.sortedKeys, k)
+        return self.sortedRows[i] if i < len(self.sortedKeys) and self.sortedKeys[i] == k else -1
+
+    def value(self, i):
+        return pickle.loads(self.mm[self.offsets[i]:self.offsets[i+1]])
+
+    def __getitem__(self, k):
+        i = self.row(k)
+        if i < 0:
+            raise KeyError(k)
+        return self.value(i)
+
+    def __contains__(self, k):
+        return self.row(k) >= 0
+
+    def __iter__(self):
+        return iter(self.rowKeys)
+
+    def __len__(self):
+        return len(self.rowKeys)
+
+    # (in one pass over the file)
+    def items(self):
+        for i, k in enumerate(self.rowKeys):
+            yield k, self.value(i)
+
+    def values(self):
+        for i in range(len(self.rowKeys)):
+            yield self.value(i)
+
+    def memoryUsage(self):
+        if self.rows is not None:
+            return sys.getsizeof(self.rowKeys) + sys.getsizeof(self.rows) + sys.getsizeof(self.offsets)
+        return sum([sys.getsizeof(x) for x in (self.rowKeys, self.sortedKeys, self.sortedRows, self.offsets)])
+
+    def close(self):
+        if self.mm:
+            self.mm.close()
+        self.fd.close()
+        os.remove(self.path)
+
+class Preloads:
+    def __init__(self, context, budget=None):
+        self.context = context
+        self.budget = budget
+        self.dir = os.path.join(context.dir, '.spill')
+        self.depth = 0          # dumpers running (nested)
+        self.resident = 0       # bytes held by the indexes added (and kept in memory) so far
+        self.added = []         # (name, index) added, to free when the top-level dumper is done
+        self.spilled = []       # DiskIndexes to close when the top-level dumper is done
+        self.nFiles = 0
+        self.shared = {}        # context attribute -> names of the dumpers using it
+        self.pending = None     # dumper name -> number of runs of it still to finish (see plan)
+
+    # Declares context attribute name a preload shared by the dumpers named users.
+    def share(self, name, users):
+        self.shared[name] = set(users)
+
+    # Registers the dumpers (classes) the run will run. From then on, shared preloads are
+    # freed when their users are done.
+    def plan(self, classes):
+        self.pending = {}
+        for c in classes:
+            self.pending[c.__name__] = self.pending.get(c.__name__, 0) + 1
+        self.reclaim(self.unshare)
+
+    # Within the block, dumper runs. Indexes added while it (or its helpers, or the
+    # dumpers it runs) are running are freed when the top-level one is done.
+    @contextmanager
+    def scope(self, dumper):
+        self.depth += 1
+        try:
+            yield
+        finally:
+            self.depth -= 1
+            if self.depth == 0:
+                self.finished(dumper.__class__.__name__)
+
+    # Top-level dumper name is done (in this process, or, with --jobs, in a worker
+    # whose results the parent has merged). Frees its indexes, and the shared
+    # preloads it was the last user of.
+    def finished(self, name):
+        def free():
+            freed = self.release()
+            if self.pending is not None:
+                n = self.pending.get(name, 0) - 1
+                if n > 0:
+                    self.pending[name] = n
+                else:
+                    self.pending.pop(name, None)
+            return freed + self.unshare()
+        self.reclaim(free, name)
+
+    # Frees the indexes added since the last release. Returns their names.
+    def release(self):
+        names = []
+        for name, d in self.added:
+            if not isinstance(d, DiskIndex):
+                d.clear()
+            names.append(name)
+        for ix in self.spilled:
+            ix.close()
+        if self.spilled:
+            try:
+                os.rmdir(self.dir)
+            except OSError:
+                pass # not empty (e.g., another worker's files)
+        self.added = []
+        self.spilled = []
+        self.resident = 0
+        return names
+
+    # Deletes the shared preloads no dumper still to finish uses. Returns their names.
+    def unshare(self):
+        if self.pending is None:
+            return []
+        names = []
+        for a, users in sorted(self.shared.items()):
+            if hasattr(self.context, a) and not users.intersection(self.pending):
+                delattr(self.context, a)
+                names.append('context.' + a)
+        return names
+
+    # Calls free (which frees preloads, and returns their names); if anything was
+    # freed, collects garbage and logs the memory reclaimed.
+    def reclaim(self, free, name=None):
+        before = rss()
+        names = free()
+        if not names:
+            return
+        gc.collect()
+        after = rss()
+        msg = 'Freed preloads%s: %s.' % (' of ' + name if name else '', ', '.join(names))
+        if before is not None and after is not None:
+            msg += ' RSS %.1f MB -> %.1f MB (%.1f MB reclaimed).' % \
+                (before / 1048576., after / 1048576., (before - after) / 1048576.)
+        self.context.log(msg)
+
+    # Adds index d (a dict, complete), named name, of owner (a dumper, or a helper).
+    # Returns d, or a DiskIndex in its place. Either is freed when the top-level dumper
+    # is done, so the owner must not use it after that.
+    def add(self, owner, name, d):
+        name = '%s.%s' % (owner.__class__.__name__, name)
+        size = footprint(d)
+        rec = {'name' : name, 'items' : len(d), 'bytes' : size, 'spilled' : False}
+        if self.budget is not None and self.resident + size > self.budget and len(d):
+            ix = self.spill(name, d)
+            if ix is not None:
+                rec['spilled'] = True
+                rec['residentBytes'] = ix.memoryUsage()
+                self.context.log('Preload %s: %d items, %d bytes; over the memory budget, moved to disk.' % (name, len(d), size))
+                self.context.metrics.preload(rec)
+                self.added.append((name, ix))
+                return ix
+        self.resident += size
+        self.added.append((name, d))
+        self.context.log('Preload %s: %d items, %d bytes.' % (name, len(d), size))
+        self.context.metrics.preload(rec)
+        return d
+
+    def spill(self, name, d):
+        os.makedirs(self.dir, exist_ok=True)
+        self.nFiles += 1
+        path = os.path.join(self.dir, '%d.%d.idx' % (os.getpid(), self.nFiles))
+        try:
+            ix = DiskIndex(path, d)
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            if os.path.exists(path):
+                os.remove(path)
+            self.context.log('Preload %s cannot be moved to disk (%s); kept in memory.' % (name, e))
+            return None
+        self.spilled.append(ix)
+        return ix
@@ -0,0 +1,246 @@
+#
+# Profiler.py
+#
+# Profiling of dumpers (dumpMgiItemXml.py --profile). Each profiled dumper's dump()
+# is run under cProfile (mode 'cpu') or tracemalloc (mode 'mem'), and reports are
+# written in <dir>/profile:
+#
+#   cpu: <Name>.prof      cProfile stats (for pstats, snakeviz, ...)
+#        <Name>.cpu.txt   the top functions, by cumulative and by internal time
+#   mem: <Name>.mem.txt   memory live at the end of mainDump, when the preloaded
+#                         indexes are usually at their biggest:
+#                           - the dumper's largest attributes (e.g., mk2refs, assay),
+#                             by deep size
+#                           - live allocations by owner, i.e., the class and method
+#                             (e.g., DerivedAnnotationHelper.__addkeys__) that made
+#                             them, which also covers indexes only held in locals
+#                           - the top allocation sites, with tracebacks
+#
+# The spec is 'cpu' or 'mem', optionally followed by the dumpers to profile, e.g.,
+# 'mem:Allele,Expression' (names as for -c). A dumper run by another one (e.g.,
+# MouseFeatureDumper, by FeatureDumper) is profiled on its own when selected by name;
+# under cpu, if its parent is being profiled, it is only part of the parent's profile
+# (cProfile cannot nest).
+#
+# A dumper dumped more than once gets numbered reports (<Name>.2.prof, ...). Under
+# --jobs, each worker process writes the reports of the dumpers it ran.
+#
+
+import os
+import sys
+import ast
+import time
+import pstats
+import cProfile
+import tracemalloc
+from contextlib import contextmanager
+from .Preloads import deepSize
+
+class Profiler:
+    MODES = ('cpu', 'mem')
+    # modules whose allocations are attributed to whoever called them
+    PLUMBING = ('mgidbconnect.py', 'QueryCache.py', 'Metrics.py', 'Profiler.py', 'common.py')
+    PLUMBING_FUNCTIONS = ('DumperContext.sql', 'DumperContext.sqliter')
+    FRAMES = 25         # traceback depth kept by tracemalloc
+    MB = float(1 << 20)
+
+    def __init__(self, spec, dir, top=25):
+        mode, _, names = spec.partition(':')
+        if mode not in self.MODES:
+            raise RuntimeError('Unknown profile mode: %s (expected one of: %s)' % (mode, ', '.join(self.MODES)))
+        self.mode = mode
+        self.dumpers = None
+        if names:
+            self.dumpers = set([n if n.endswith('Dumper') else n + 'Dumper' for n in names.split(',')])
+        self.dir = os.path.join(dir, 'profile')
+        self.top = top
+        self.cpuActive = None   # the dumper whose cProfile is running
+        self.memStack = []      # [peak] per profiled dumper (mem), innermost last
+        self.memMain = {}       # id(dumper) -> (snapshot, traced, attribute sizes), at the end of mainDump
+        self.runs = {}          # dumper name -> times profiled
+        self.owners = {}        # file name -> [(first line, last line, owner)]
+
+    def wants(self, d):
+        return self.dumpers is None or d.__class__.__name__ in self.dumpers
+
+    # Returns the path for a report on dumper d, with the given suffix.
+    def path(self, d, suffix):
+        name = d.__class__.__name__
+        n = self.runs.get(name, 1)
+        if n > 1:
+            name = '%s.%d' % (name, n)
+        if not os.path.exists(self.dir):
+            os.makedirs(self.dir, exist_ok=True)
+        return os.path.join(self.dir, name + suffix)
+
+    # Context manager around dumper d's dump().
+    @contextmanager
+    def dumper(self, d):
+        if not self.wants(d):
+            yield
+            return
+        name = d.__class__.__name__
+        self.runs[name] = self.runs.get(name, 0) + 1
+        if self.mode == 'cpu':
+            with self.cpu(d):
+                yield
+        else:
+            with self.mem(d):
+                yield
+
+    @contextmanager
+    def cpu(self, d):
+        if self.cpuActive is not None:
+            d.context.log('Profiler: %s is profiled as part of %s.' % \
+                (d.__class__.__name__, self.cpuActive.__class__.__name__))
+            yield
+            return
+        p = cProfile.Profile()
+        self.cpuActive = d
+        p.enable()
+        try:
+            yield
+        finally:
+            p.disable()
+            self.cpuActive = None
+            path = self.path(d, '.prof')
+            p.dump_stats(path)
+            with open(self.path(d, '.cpu.txt'), 'w') as fd:
+                for key in ('cumulative', 'tottime'):
+                    fd.write('%s, top %d functions by %s time\n' % (d.__class__.__name__, self.top, key))
+                    pstats.Stats(p, stream=fd).strip_dirs().sort_stats(key).print_stats(self.top)
+            d.context.log('Profiler: CPU profile of %s written to %s.' % (d.__class__.__name__, path))
+
+    @contextmanager
+    def mem(self, d):
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start(self.FRAMES)
+        tracemalloc.reset_peak()
+        self.memStack.append([0])
+        try:
+            yield
+        finally:
+            peak = max(self.memStack.pop()[0], tracemalloc.get_traced_memory()[1])
+            if self.memStack:
+                self.memStack[-1][0] = max(self.memStack[-1][0], peak)
+            main = self.memMain.pop(id(d), None)
+            if main is not None:
+                path = self.path(d, '.mem.txt')
+                with open(path, 'w') as fd:
+                    self.writeMemReport(fd, d, peak, *main)
+                d.context.log('Profiler: memory report of %s written to %s.' % (d.__class__.__name__, path))
+            if started:
+                tracemalloc.stop()
+
+    # Called by dumper d at the end of its mainDump. Takes the memory snapshot.
+    def afterMainDump(self, d):
+        if self.mode != 'mem' or not self.memStack or not self.wants(d):
+            return
+        t0 = time.time()
+        snapshot = tracemalloc.take_snapshot()
+        traced = tracemalloc.get_traced_memory()[0]
+        self.memMain[id(d)] = (snapshot, traced, self.attributeSizes(d))
+        d.context.log('Profiler: memory snapshot of %s taken (%.1fs).' % (d.__class__.__name__, time.time() - t0))
+
+    #
+    # Memory reports
+    #
+
+    def writeMemReport(self, fd, d, peak, snapshot, traced, attrs):
+        mb = self.MB
+        name = d.__class__.__name__
+        fd.write('%s: memory (tracemalloc, %d frames)\n' % (name, self.FRAMES))
+        fd.write('Traced at end of mainDump: %.1f MB. Peak during dump: %.1f MB.\n\n' % (traced / mb, peak / mb))
+
+        fd.write('Largest attributes at end of mainDump (deep size):\n')
+        for size, aname, desc in sorted(attrs, key=lambda a: -a[0])[:self.top]:
+            fd.write('%10.1f MB  %s.%s  %s\n' % (size / mb, name, aname, desc))
+
+        fd.write('\nLive allocations at end of mainDump, by owner:\n')
+        snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+        stats = snapshot.statistics('traceback')
+        owners = {}
+        for s in stats:
+            o = self.owner(s.traceback)
+            size, count = owners.get(o, (0, 0))
+            owners[o] = (size + s.size, count + s.count)
+        fd.write('%13s %12s  %s\n' % ('size', 'blocks', 'owner'))
+        for o, (size, count) in sorted(owners.items(), key=lambda x: -x[1][0])[:self.top]:
+            fd.write('%10.1f MB %12d  %s\n' % (size / mb, count, o))
+
+        fd.write('\nTop %d allocation sites:\n' % self.top)
+        for s in snapshot.statistics('lineno')[:self.top]:
+            f = s.traceback[-1]
+            fd.write('%10.1f MB %12d  %s:%d  (%s)\n' % (s.size / mb, s.count, f.filename, f.lineno, self.owner(s.traceback)))
+
+        fd.write('\nTop %d allocation tracebacks:\n' % self.top)
+        for s in stats[:self.top]:
+            fd.write('\n%10.1f MB %12d blocks\n' % (s.size / mb, s.count))
+            for line in s.traceback.format(most_recent_first=True):
+                fd.write('    %s\n' % line)
+
+    # Returns the owner of allocations with the given traceback: 'Class.method' for the
+    # innermost frame in libdump (plumbing aside), or else the innermost file:line.
+    def owner(self, tb):
+        here = os.path.dirname(os.path.abspath(__file__))
+        for f in reversed(tb):      # tracebacks are oldest frame first
+            if os.path.dirname(os.path.abspath(f.filename)) != here:
+                continue
+            base = os.path.basename(f.filename)
+            if base in self.PLUMBING:
+                continue
+            fn = self.function(f.filename, f.lineno)
+            if fn not in self.PLUMBING_FUNCTIONS:
+                return fn
+        f = tb[-1]
+        return '%s:%d' % (os.path.basename(f.filename), f.lineno)
+
+    # Returns the qualified name of the function containing the given line.
+    def function(self, fname, lineno):
+        spans = self.owners.get(fname)
+        if spans is None:
+            spans = []
+            try:
+                with open(fname) as fd:
+                    tree = ast.parse(fd.read())
+            except (IOError, OSError, SyntaxError):
+                tree = None
+            def visit(node, prefix):
+                for n in ast.iter_child_nodes(node):
+                    if isinstance(n, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+                        q = prefix + n.name
+                        spans.append((n.lineno, n.end_lineno, q))
+                        visit(n, q + '.')
+            if tree is not None:
+                visit(tree, '')
+            self.owners[fname] = spans
+        best = None
+        for first, last, q in spans:
+            # innermost wins, but a nested function counts as its enclosing method
+            if first <= lineno <= last and (best is None or first >= best[0]):
+                best = (first, last, q)
+        if best is None:
+            return os.path.basename(fname)[:-3]
+        parts = best[2].split('.')
+        return '.'.join(parts[:2])
+
+    # Returns [(deep size, attribute name, description)] for d's container attributes.
+    # Attributes that are objects (e.g., helpers) are listed by their own attributes.
+    def attributeSizes(self, d):
+        seen = set([id(d), id(d.context), id(d.parentDumper)])
+        sizes = []
+        def add(obj, prefix):
+            for a, v in list(vars(obj).items()):
+                if hasattr(v, '__dict__') and not isinstance(v, type) and type(v).__module__.startswith(__package__ or 'libdump'):
+                    if id(v) not in seen:
+                        seen.add(id(v))
+                        add(v, prefix + a + '.')
+                    continue
+                if isinstance(v, (dict, list, tuple, set, frozenset)):
+                    sizes.append((deepSize(v, seen), prefix + a, self.describe(v)))
+        add(d, '')
+        return sizes
+
+    def describe(self, v):
+        return '(%s, %d items)' % (type(v).__name__, len(v))
@@ -2,6 +2,9 @@
 from .AbstractItemDumper import *
 
 class ProteinDumper(AbstractItemDumper):
+    PRODUCES   = ['Sequence']
+    REFERENCES = ['Marker', 'Organism']
+
     QTMPLT = '''
         SELECT distinct mc._organism_key, mc.accid, mc._marker_key
         FROM SEQ_Marker_Cache mc
@@ -27,7 +30,7 @@ class ProteinDumper(AbstractItemDumper):
     def flushCurr(self):
         if self.currAcc:
             r = {}
-            r['id'] = self.context.makeItemId('Sequence')
+            r['id'] = self.context.makeItemId('Sequence', content=(self.currAcc,))
             r['primaryAccession'] = self.currAcc
             r['genes'] = ''.join(self.currMrefs)
             r['organism'] = self.context.makeItemRef('Organism', self.currOk)
@@ -2,6 +2,9 @@ from .AbstractItemDumper import *
 import string
 
 class PublicationDumper(AbstractItemDumper):
+    PRODUCES   = ['Reference', 'Author']
+    REFERENCES = []
+
     QTMPLT = '''
     SELECT 
         r._refs_key, 
@@ -47,36 +50,17 @@ class PublicationDumper(AbstractItemDumper):
     '''
     def preDump(self):
         self.authors = {}
-        #
-        def makeIdIndex(ldb):
-            dups = set()
-            q = '''
-            select accid
-            from acc_accession
-            where _logicaldb_key = %d
-            and _mgitype_key = 1
-            and preferred = 1
-            group by accid
-            having count(*) > 1
-            ''' % ldb
-            for r in self.context.sql(q):
-                dups.add(r['accid'])
+        # PubMed ids and DOIs, from the run's accession index (see DumperContext.accessions)
+        self.pmids = self.context.accessions.get(self.context.QUERYPARAMS['REF_TYPEKEY'], self.context.QUERYPARAMS['PUBMED_LDBKEY'])
+        self.dois = self.context.accessions.get(self.context.QUERYPARAMS['REF_TYPEKEY'], self.context.QUERYPARAMS['DOI_LDBKEY'])
 
-            ix = {}
-            q = '''
-            select _object_key, accid
-            from acc_accession
-            where _logicaldb_key = %d
-            and _mgitype_key = 1
-            and preferred = 1
-            ''' % ldb
-            for r in self.context.sql(q):
-                if r['accid'] not in dups:
-                    ix[r['_object_key']] = r['accid']
-            return ix
-        #
-        self.rk2pmid = makeIdIndex(29)
-        self.rk2doi  = makeIdIndex(65)
+    # Returns the first preferred id of reference rk in ids (an AccessionSet) that is
+    # not preferred for some other reference as well, or None.
+    def uniqueId(self, ids, rk):
+        for accid in ids.get(rk, preferred=True):
+            if len(ids.find(accid, preferred=True)) == 1:
+                return accid
+        return None
 
     # Calculates a citation string from the attributes.
     # Default format:
@@ -125,8 +109,8 @@ class PublicationDumper(AbstractItemDumper):
             return None
         # end of hack
         ##########
-        r['pubMedId'] = self.rk2pmid.get(rk, None)
-        r['doi'] = self.rk2doi.get(rk, None)
+        r['pubMedId'] = self.uniqueId(self.pmids, rk)
+        r['doi'] = self.uniqueId(self.dois, rk)
 
         #---------------------------------------
         #
@@ -141,7 +125,7 @@ class PublicationDumper(AbstractItemDumper):
         for a in anames:
             if a not in self.authors:
                 if r['pubMedId'] is None:
-                        self.authors[a] = self.context.makeGlobalKey('Author')
+                        self.authors[a] = self.context.makeGlobalKey('Author', content=(a,))
                         arec = {'id':self.authors[a], 'name':self.quote(a)}
                         self.writeItem( arec, self.ATMPLT )
                         arefs.append('<reference ref_id="%s"/>'%self.authors[a])
@@ -0,0 +1,180 @@
+#
+# QueryCache.py
+#
+# On-disk cache of query results, for rerunning the dumper against the same MGI
+# database dump (e.g., after a downstream failure). Results are keyed by a hash of
+# the SQL text and the database's lastdump_date (MGI_dbinfo), so a new dump never
+# sees results from an old one.
+#
+# The cache directory must outlive the run's output directory (a rerun writes to a new
+# one), so it defaults to one per user, outside it (see defaultDir); refresh.py's
+# mgi-base source keeps it next to its output directories.
+#
+# Layout:
+#   <cache dir>/<dump tag>/<hash>.qc
+# where the dump tag is lastdump_date as yyyy-mm-ddThh-mm-ss. When a cache is opened,
+# directories of other dump dates are removed, except for the most recent (keep-1).
+#
+# Each file holds a header (format version, query text, column names), then the rows in
+# chunks of up to CHUNKSIZE. A chunk is stored column by column (one tuple of values
+# per column), pickled and zlib compressed. A None marks the end. A result is written
+# to a temporary file while the query runs, and renamed into place only once all rows
+# have been read, so an interrupted query leaves nothing behind.
+#
+# Rows come back the way the query would return them: dicts for rows='dict', Rows for
+# rows='tuple' (see mgidbconnect.rowMaker).
+#
+
+import os
+import re
+import time
+import zlib
+import pickle
+import shutil
+import hashlib
+import datetime
+from . import mgidbconnect as db
+
+class QueryCache:
+    FORMAT = 1
+    CHUNKSIZE = 65536
+    SUFFIX = '.qc'
+    TAG_RE = re.compile(r'\d{4}-\d\d-\d\dT\d\d-\d\d-\d\d\Z')
+    # only results of these are cached
+    QUERY_RE = re.compile(r'\s*(select|with)\b', re.I)
+
+    # Returns the cache directory used unless another is given: querycache under
+    # $XDG_CACHE_HOME/mousemine_dumper (by default, ~/.cache/mousemine_dumper).
+    @staticmethod
+    def defaultDir():
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+        return os.path.join(base, 'mousemine_dumper', 'querycache')
+
+    #
+    # Args:
+    #  dir (string) Cache directory.
+    #  dumpdate (datetime) MGI_dbinfo.lastdump_date of the database being dumped.
+    #  keep (int) Number of dump dates to keep results for, including this one.
+    #
+    def __init__(self, dir, dumpdate, keep=2):
+        self.dir = os.path.abspath(dir)
+        if isinstance(dumpdate, datetime.datetime):
+            self.tag = dumpdate.strftime('%Y-%m-%dT%H-%M-%S')
+        else:
+            self.tag = datetime.datetime.combine(dumpdate, datetime.time()).strftime('%Y-%m-%dT%H-%M-%S')
+        self.tagdir = os.path.join(self.dir, self.tag)
+        self.keep = keep
+        self.resetStats()
+        if not os.path.exists(self.tagdir):
+            os.makedirs(self.tagdir)
+        self.evicted = self.evict()
+
+    def resetStats(self):
+        self.nHits = 0          # queries answered from the cache
+        self.nMisses = 0        # queries run against the database (and stored)
+        self.nRows = 0          # rows read from the cache
+        self.nBytes = 0         # bytes written to the cache
+
+    def getStats(self):
+        return {
+            'hits'   : self.nHits,
+            'misses' : self.nMisses,
+            'rows'   : self.nRows,
+            'bytes'  : self.nBytes,
+        }
+
+    # Adds stats collected elsewhere (e.g., in a worker process).
+    def addStats(self, s):
+        self.nHits   += s['hits']
+        self.nMisses += s['misses']
+        self.nRows   += s['rows']
+        self.nBytes  += s['bytes']
+
+    # Removes results for all but the most recent dump dates. Returns the list of
+    # dump tags removed.
+    #
+    def evict(self):
+        tags = [t for t in os.listdir(self.dir) \
+            if self.TAG_RE.match(t) and t != self.tag and os.path.isdir(os.path.join(self.dir, t))]
+        tags.sort(reverse=True)
+        removed = tags[max(0, self.keep - 1):]
+        for t in removed:
+            shutil.rmtree(os.path.join(self.dir, t), ignore_errors=True)
+        return removed
+
+    def cacheable(self, q):
+        return type(q) is str and self.QUERY_RE.match(q) is not None
+
+    def path(self, q):
+        h = hashlib.sha1(('%d\0%s\0%s' % (self.FORMAT, self.tag, q)).encode('utf-8')).hexdigest()
+        return os.path.join(self.tagdir, h + self.SUFFIX)
+
+    # Returns an iterator over the rows of query q, of the given type ('dict' or 'tuple').
+    # If the result is cached, it comes from the cache. Otherwise, fetch() is called for
+    # an iterator over the rows from the database, and they are stored as they go by.
+    # If stats (a dict) is given and the result is cached, stats['source'] is set to
+    # 'cache' and stats['bytes'] to the size of the cache file.
+    #
+    def iterate(self, q, fetch, rows, stats=None):
+        p = self.path(q)
+        if os.path.exists(p):
+            if stats is not None:
+                stats['source'] = 'cache'
+                stats['bytes'] = os.path.getsize(p)
+            return self.read(p, q, rows)
+        return self.store(p, q, fetch())
+
+    def read(self, p, q, rows):
+        self.nHits += 1
+        with open(p, 'rb') as fd:
+            hdr = pickle.load(fd)
+            if hdr.get('format') != self.FORMAT or hdr.get('query') != q:
+                raise RuntimeError('Query cache file %s does not match its query. Remove it, or run with --no-cache.' % p)
+            make = db.rowMaker(hdr['columns'], rows)
+            while True:
+                try:
+                    chunk = pickle.load(fd)
+                except EOFError:
+                    raise RuntimeError('Query cache file %s is truncated. Remove it, or run with --no-cache.' % p)
+                if chunk is None:
+                    break
+                cols = pickle.loads(zlib.decompress(chunk))
+                n = len(cols[0]) if cols else 0
+                self.nRows += n
+                for vals in zip(*cols):
+                    yield make(vals)
+
+    def store(self, p, q, it):
+        self.nMisses += 1
+        tmp = '%s.%d.tmp' % (p, os.getpid())
+        fd = open(tmp, 'wb')
+        try:
+            columns = None
+            chunk = []
+            for r in it:
+                if columns is None:
+                    columns = list(r.keys())
+                    pickle.dump({'format':self.FORMAT, 'query':q, 'columns':columns, 'time':time.time()}, fd, pickle.HIGHEST_PROTOCOL)
+                chunk.append(tuple(r) if isinstance(r, tuple) else tuple(r.values()))
+                if len(chunk) >= self.CHUNKSIZE:
+                    self.writeChunk(fd, chunk)
+                    chunk = []
+                yield r
+            if columns is None:
+                pickle.dump({'format':self.FORMAT, 'query':q, 'columns':[], 'time':time.time()}, fd, pickle.HIGHEST_PROTOCOL)
+            if chunk:
+                self.writeChunk(fd, chunk)
+            pickle.dump(None, fd)
+            self.nBytes += fd.tell()
+            fd.close()
+            os.replace(tmp, p)
+        finally:
+            # not all rows were read (or something failed); keep nothing
+            if not fd.closed:
+                fd.close()
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def writeChunk(self, fd, chunk):
+        cols = list(zip(*chunk))
+        pickle.dump(zlib.compress(pickle.dumps(cols, pickle.HIGHEST_PROTOCOL), 1), fd, pickle.HIGHEST_PROTOCOL)
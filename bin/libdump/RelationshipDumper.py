@@ -4,6 +4,9 @@ from .DataSourceDumper import DataSetDumper
 import itertools
 
 class RelationshipDumper(AbstractItemDumper):
+    PRODUCES   = ['DirectedRelationship', 'DataSet']
+    REFERENCES = ['Reference', 'DataSource']
+
     qCategories = '''
     SELECT c._category_key, c.name, st.name as stype, ot.name as otype
     FROM MGI_Relationship_Category c, ACC_MGItype st, ACC_MGIType ot
@@ -58,6 +61,7 @@ class RelationshipDumper(AbstractItemDumper):
             cls = 'AND c._category_key in (%s)' % (",".join(map(str,categoryKeys)))
         for c in self.context.sql(self.qCategories + cls):
             self.categories[c['_category_key']] = c
+            self.REFERENCES = self.REFERENCES + [c['stype'], c['otype']]
 
     def normalizeName(self, n, capitalizeFirst=True):
         s = n.lower().replace("-"," ").replace("_"," ").split()
@@ -0,0 +1,163 @@
+#
+# Snapshot.py
+#
+# Local SQLite snapshots of the MGI tables and columns the dumpers read (see
+# mgischema.py). A dump reading a snapshot (dumpMgiItemXml.py --sqlite FILE or
+# --snapshot DIR, see mgidbconnect.SqliteBackend) runs at local disk speed: the big
+# tables (ACC_Accession, VOC_Annot, VOC_Evidence, MGI_Note, MRK_Location_Cache, ...),
+# which several dumpers read, are not fetched again from the MGI server each time.
+#
+#   SqliteWriter    writes such a database, indexed on the key columns (also used by
+#                   bench/mkFixture.py for the synthetic benchmark database)
+#   takeSnapshot    copies the tables from the MGI database to a new snapshot
+#   checkSnapshot   checks that every dumper's queries can run against a snapshot
+#   snapshotFor     returns the snapshot in a directory for the MGI database's current
+#                   dump date, taking it first if there isn't one yet. So a snapshot is
+#                   taken once per MGI dump date, however many times the dump is run.
+#
+# mgischema.py lists the columns by hand, so a dumper may come to read one it misses.
+# A new snapshot is therefore checked before it is installed: each dumper's queries,
+# including the SINCE_KEYS ones (--since), are planned against it (as by --explain, see
+# Explainer), and if any cannot be (e.g., no such column), the snapshot is discarded
+# and the missing columns reported: they must be added to mgischema.py.
+#
+# A snapshot is a copy as of when it was taken, including MGI_dbinfo, so the query
+# cache, checkpoints and --since work against it as they do against the database.
+#
+
+import os
+import sys
+import glob
+import time
+import decimal
+import sqlite3
+import shutil
+import tempfile
+from .mgischema import TABLES, TIMESTAMP, DATE
+from . import mgidbconnect as db
+
+# rows are copied in batches of this many
+BATCH = 20000
+
+# numeric columns (e.g., coordinates) are stored as floats, which columns declared int
+# turn back into integers
+sqlite3.register_adapter(decimal.Decimal, float)
+
+def indexedColumns(cols):
+    return [c for c, t in cols if c.startswith('_') and c.endswith('_key')]
+
+class SqliteWriter:
+    def __init__(self, path):
+        if os.path.exists(path):
+            os.remove(path)
+        self.db = sqlite3.connect(path)
+        self.db.execute('PRAGMA journal_mode = OFF')
+        self.db.execute('PRAGMA synchronous = OFF')
+        for t, cols in TABLES.items():
+            self.db.execute('CREATE TABLE %s (%s)' % (t, ', '.join(['%s %s' % c for c in cols])))
+
+    def write(self, table, rows):
+        cols = TABLES[table]
+        dates = [i for i, (c, t) in enumerate(cols) if t in (TIMESTAMP, DATE)]
+        if dates:
+            rows = [tuple([v.isoformat(' ') if i in dates and v is not None else v for i, v in enumerate(r)]) for r in rows]
+        self.db.executemany('INSERT INTO %s VALUES (%s)' % (table, ','.join('?' * len(cols))), rows)
+
+    def finish(self):
+        for t, cols in TABLES.items():
+            for c in indexedColumns(cols):
+                self.db.execute('CREATE INDEX idx_%s_%s ON %s (%s)' % (t, c, t, c))
+        self.db.execute('ANALYZE')
+        self.db.commit()
+        self.db.close()
+
+def _log(m):
+    sys.stderr.write(m + '\n')
+
+# Plans the queries of all dumpers (libdump.ALL_DUMPERS) against the snapshot at path.
+# Raises RuntimeError, listing them, if any query cannot be planned (e.g., it reads a
+# column the snapshot does not have).
+def checkSnapshot(path, log=_log):
+    from . import ALL_DUMPERS, getDumper
+    from .DumperContext import DumperContext
+    dumpers = [(getDumper(n), ()) for n in ALL_DUMPERS]
+    backend = db.BACKEND
+    dir = tempfile.mkdtemp(prefix='snapshotcheck.')
+    try:
+        db.setBackend(db.SqliteBackend(path))
+        # the reports and (empty) output files go to a scratch directory
+        cx = DumperContext(dir=dir, logfile=os.path.join(dir, 'check.log'), logconsole=False,
+            checkRefs=False, cache=False, explain=True)
+        for c, a in dumpers:
+            cx.notes.register(c.NOTES)
+        cx.explainer.run(dumpers)
+        cx.closeOutputs()
+        cx.closePool()
+        # a dumper that fails without rows had its queries planned anyway
+        for n, e in cx.explainer.failed:
+            log('Snapshot check: %s failed without rows: %s' % (n, e))
+        errors = cx.explainer.errors()
+    finally:
+        db.setBackend(backend)
+        shutil.rmtree(dir, ignore_errors=True)
+    if errors:
+        raise RuntimeError('Snapshot %s cannot serve %d dumper queries (see mgischema.py):\n%s' % \
+            (path, len(errors), '\n'.join(['  %s (%s): %s' % (r['id'], ', '.join(r['dumpers']), r['error']) for r in errors])))
+    log('Snapshot checked: every dumper query can run against it.')
+
+# Copies the tables from the MGI database (the current connection, through pool) to a
+# new snapshot at path. The snapshot is written to a temporary file first, and checked
+# (see checkSnapshot), so path only ever holds a complete and usable one.
+def takeSnapshot(path, pool, log=_log):
+    tmp = path + '.tmp'
+    w = SqliteWriter(tmp)
+    t0 = time.time()
+    for t, cols in TABLES.items():
+        t1 = time.time()
+        q = 'SELECT %s FROM %s' % (', '.join([c for c, ty in cols]), t)
+        n = 0
+        batch = []
+        for r in db.sqliter(q, pool=pool, rows='tuple', copy=True):
+            batch.append(tuple(r))
+            if len(batch) >= BATCH:
+                w.write(t, batch)
+                n += len(batch)
+                batch = []
+        w.write(t, batch)
+        n += len(batch)
+        log('%-32s %10d rows %8.1fs' % (t, n, time.time() - t1))
+    t1 = time.time()
+    w.finish()
+    try:
+        checkSnapshot(tmp, log)
+    except Exception:
+        os.remove(tmp)
+        raise
+    os.replace(tmp, path)
+    log('Snapshot copied in %.1fs, indexed in %.1fs: %s (%d bytes).' % \
+        (t1 - t0, time.time() - t1, path, os.path.getsize(path)))
+
+def snapshotPath(dir, dumpDate):
+    return os.path.join(dir, 'mgi.%s.sqlite' % dumpDate.strftime('%Y%m%d.%H%M%S'))
+
+# Returns the path of the snapshot in directory dir for the MGI database's current dump
+# date, taking the snapshot if there isn't one. Snapshots of earlier dump dates are
+# removed once the new one is complete.
+def snapshotFor(dir, log=_log):
+    pool = db.ConnectionPool(1)
+    try:
+        dumpDate = db.sql('SELECT lastdump_date FROM MGI_dbinfo', pool=pool)[0]['lastdump_date']
+        path = snapshotPath(dir, dumpDate)
+        if os.path.exists(path):
+            log('Using the snapshot of %s: %s' % (dumpDate, path))
+            return path
+        log('Taking a snapshot of the MGI database (dump date %s)...' % dumpDate)
+        os.makedirs(dir, exist_ok=True)
+        takeSnapshot(path, pool, log)
+    finally:
+        pool.closeAll()
+    for f in glob.glob(os.path.join(dir, 'mgi.*.sqlite')):
+        if f != path:
+            log('Removing the old snapshot %s' % f)
+            os.remove(f)
+    return path
@@ -1,6 +1,9 @@
 from .AbstractItemDumper import *
 
 class StrainDumper(AbstractItemDumper):
+    PRODUCES   = ['Strain', 'StrainAttribute']
+    REFERENCES = ['Organism', 'Reference']
+
     QTMPLT='''
     SELECT a.accid, s._strain_key, s.strain AS name, t.term AS straintype, s.standard
     FROM
@@ -3,6 +3,9 @@ from .AbstractItemDumper import *
 from .DataSourceDumper import DataSetDumper
 
 class SynonymDumper(AbstractItemDumper):
+    PRODUCES   = ['Synonym']
+    REFERENCES = ['Marker', 'Allele']
+
     QTMPLT = ['''
     /* get allele, strain, etc., synonyms from MGI_Synonyms table */
     SELECT s.synonym, s._object_key, s._mgitype_key
@@ -50,24 +53,25 @@ class SynonymDumper(AbstractItemDumper):
     def __init__(self, context, mgiTypeKeys=[2,10,11]):
         AbstractItemDumper.__init__(self,context)
         self.mgiTypeKeys = mgiTypeKeys
+        self.REFERENCES = self.REFERENCES + [self.context.TK2TNAME[k] for k in mgiTypeKeys]
 
     def preDump(self):
         self.context.QUERYPARAMS['MGITYPEKEYS'] = ",".join(map(str,self.mgiTypeKeys))
 
     def processRecord(self, r, qindex):
         if qindex == 0:
-            r['id'] = self.context.makeItemId('Synonym')
+            r['id'] = self.context.makeItemId('Synonym', content=(r['_mgitype_key'], r['_object_key'], r['synonym']))
             r['value'] = self.quote(r['synonym'])
             r['subject'] = self.context.makeItemRef( r['_mgitype_key'], r['_object_key'])
             return r
         elif qindex == 1:
-            r['id'] = self.context.makeItemId('Synonym')
+            r['id'] = self.context.makeItemId('Synonym', content=('Marker', r['_marker_key'], r['label']))
             r['value'] = self.quote(r['label'])
             r['subject'] = self.context.makeItemRef( 'Marker', r['_marker_key'])
             return r
         elif qindex == 2 or qindex == 3:
             # load secondary ids for markers and alleles
-            r['id'] = self.context.makeItemId('Synonym')
+            r['id'] = self.context.makeItemId('Synonym', content=(r['_mgitype_key'], r['_object_key'], r['accid']))
             r['value'] = self.quote(r['accid'])
             r['subject'] = self.context.makeItemRef( r['_mgitype_key'], r['_object_key'])
             return r
@@ -54,7 +54,6 @@
 
 import sys
 import os
-import urllib.request, urllib.parse, urllib.error
 
 from .AbstractItemDumper import *
 from .DataSourceDumper import DataSetDumper
@@ -70,6 +69,9 @@ SYNTENIC_REGION_SOID = "SO:0005858"
 #
 
 class SyntenyDumper(AbstractItemDumper):
+    PRODUCES   = ['SyntenicRegion', 'SyntenyBlock', 'Location', 'SOTerm', 'DataSet']
+    REFERENCES = ['Chromosome', 'Organism', 'DataSource']
+
     QTMPLT = '''
 SELECT distinct
         m1.symbol AS msymbol,
@@ -157,7 +159,9 @@ SELECT distinct
         self.ORGANISMS = {}
         self.smap = { 'f':'+', 'r':'-', '+':'+', '-':'-'}
         self.allPairs = []
-        self.mkey = 1 + self.context.sql('select max(_marker_key) as k from mrk_marker')[0]['k']
+        # (no rows with --explain)
+        rows = self.context.sql('select max(_marker_key) as k from mrk_marker')
+        self.mkey = 1 + ((rows[0]['k'] if rows else None) or 0)
         self.soref = self.context.makeGlobalKey('SOTerm',int(SYNTENIC_REGION_SOID.split(":")[1]))
         return True
 
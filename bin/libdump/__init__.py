@@ -1,35 +1,97 @@
-from .DumperContext      import DumperContext
-
-from .AlleleDumper       import AlleleDumper
-from .AnnotationDumper   import AnnotationDumper
-from .CellLineDumper     import CellLineDumper
-from .ChromosomeDumper   import ChromosomeDumper
-from .CrossReferenceDumper import CrossReferenceDumper
-from .DataSourceDumper   import DataSourceDumper
-from .ExpressionDumper   import ExpressionDumper
-from .HTIndexDumper      import HTIndexDumper
-from .FeatureDumper      import FeatureDumper, MouseFeatureDumper, NonMouseFeatureDumper
-from .GenotypeDumper     import GenotypeDumper
-from .HomologyDumper     import HomologyDumper
-from .LocationDumper     import LocationDumper
-from .OboParser          import OboParser
-from .OrganismDumper     import OrganismDumper
-from .ProteinDumper      import ProteinDumper
-from .PublicationDumper  import PublicationDumper
-from .RelationshipDumper import RelationshipDumper
-from .StrainDumper       import StrainDumper
-from .SynonymDumper      import SynonymDumper
-from .SyntenyDumper      import SyntenyDumper
-from .AnnotationCommentDumper import AnnotationCommentDumper
-from . import NoteUtils
+import importlib
+
+# Classes, by name, and the modules that define them. They are imported when first
+# asked for (getDumper('AlleleDumper'), or libdump.AlleleDumper), so a run only
+# imports the dumpers it runs, and scripts that just query MGI (from libdump import
+# mgidbconnect) import none of them.
+# (Once a module has been imported, the package attribute of the same name may be the
+# module rather than the class, as for any submodule, so scripts use getDumper.)
+DUMPERS = {
+    'AlleleDumper'           : 'AlleleDumper',
+    'AnnotationDumper'       : 'AnnotationDumper',
+    'CellLineDumper'         : 'CellLineDumper',
+    'ChromosomeDumper'       : 'ChromosomeDumper',
+    'CrossReferenceDumper'   : 'CrossReferenceDumper',
+    'DataSourceDumper'       : 'DataSourceDumper',
+    'ExpressionDumper'       : 'ExpressionDumper',
+    'HTIndexDumper'          : 'HTIndexDumper',
+    'FeatureDumper'          : 'FeatureDumper',
+    'MouseFeatureDumper'     : 'FeatureDumper',
+    'NonMouseFeatureDumper'  : 'FeatureDumper',
+    'GenotypeDumper'         : 'GenotypeDumper',
+    'HomologyDumper'         : 'HomologyDumper',
+    'LocationDumper'         : 'LocationDumper',
+    'OrganismDumper'         : 'OrganismDumper',
+    'ProteinDumper'          : 'ProteinDumper',
+    'PublicationDumper'      : 'PublicationDumper',
+    'RelationshipDumper'     : 'RelationshipDumper',
+    'StrainDumper'           : 'StrainDumper',
+    'SynonymDumper'          : 'SynonymDumper',
+    'SyntenyDumper'          : 'SyntenyDumper',
+    'AnnotationCommentDumper': 'AnnotationCommentDumper',
+    }
+
+# The dumpers a full run runs, in order. The order of dumpers is important. The objects
+# dumped later in the process may refer to objects dumped earlier.
+# It is assumed that all ontologies have already been loaded.
+ALL_DUMPERS = [
+    'PublicationDumper',
+    'DataSourceDumper',
+    'OrganismDumper',
+    'ChromosomeDumper',
+    'StrainDumper',
+    'FeatureDumper',
+    'ProteinDumper',
+    'LocationDumper',
+    'HomologyDumper',
+    'SyntenyDumper',
+    'AlleleDumper',
+    'CellLineDumper',
+    'GenotypeDumper',
+    'ExpressionDumper',
+    'HTIndexDumper',
+    'AnnotationCommentDumper',
+    'AnnotationDumper',
+    'RelationshipDumper',
+    'SynonymDumper',
+    'CrossReferenceDumper',
+    ]
+
+CLASSES = dict(DUMPERS,
+    DumperContext   = 'DumperContext',
+    DumperScheduler = 'DumperScheduler',
+    OboParser       = 'OboParser',
+    )
+
+def load(name):
+    v = globals()[name] = getattr(importlib.import_module('.' + CLASSES[name], __name__), name)
+    return v
+
+def __getattr__(name):
+    if name in CLASSES:
+        return load(name)
+    elif name == 'NoteUtils':
+        v = importlib.import_module('.NoteUtils', __name__)
+    else:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    globals()[name] = v
+    return v
+
+def __dir__():
+    return sorted(set(globals()) | set(CLASSES) | set(['NoteUtils']))
+
+# Returns the dumper class named name (e.g., 'AlleleDumper').
+def getDumper(name):
+    if name not in DUMPERS:
+        raise RuntimeError('No such dumper: %s' % name)
+    return load(name)
 
 def installMethods(module):
     import types
     for srcn, srcx in list(module.__dict__.items()):
-        tgtx = globals().get(srcn, None)
+        tgtx = load(srcn) if srcn in CLASSES else globals().get(srcn, None)
         if type(tgtx) is type and type(srcx) is type:
             for sn, sx in list(srcx.__dict__.items()):
                 if type(sx) is types.FunctionType:
                     setattr(tgtx, sn, sx)
                     print("Installed: %s into %s"%(sn,tgtx))
-
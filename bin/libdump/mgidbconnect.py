@@ -8,9 +8,14 @@ import os
 import re
 import sys
 import types
-
-import psycopg2
-import psycopg2.extras
+import threading
+import time
+import collections
+import functools
+import io
+import queue
+import datetime
+import decimal
 
 # Connection parameters
 HOST = None
@@ -61,36 +66,642 @@ def setConnectionFromPropertiesFile(dname=None, fname="~/.intermine/mousemine.pr
 
 #
 def connect(host=None,database=None, user=None, password=None):
-    con = psycopg2.connect( host=host or HOST, database=database or DATABASE, user=user or USER, password=password or PASSWORD )
+    con = getBackend().connect( host=host or HOST, database=database or DATABASE, user=user or USER, password=password or PASSWORD )
     return con
 
+#
+# Backends. Queries go to the backend set with setBackend(): by default, the MGI
+# Postgres database given by the connection parameters above (PostgresBackend), or
+# else a local SQLite snapshot of the MGI tables the dumpers read (SqliteBackend; see
+# snapshotMgi.py and Snapshot.py). Queries are written for Postgres; a backend
+# translates them to its own dialect.
+#
+# A backend provides:
+#   name
+#   connect(**cparms) - a new DB-API connection. Connections have .closed, cursor(),
+#       rollback() and close(), as psycopg2's do.
+#   cursor(connection, rows, name) - a cursor returning rows of the given type ('dict'
+#       or 'tuple'); a named cursor is fetched from incrementally, where supported
+#   translate(query) - the query in the backend's dialect
+#   columns(cursor) - the names of the columns of the cursor's current result
+#   returnsRows(cursor) - True if the last query executed returned rows
+#   canCopy - True if queries can be run as COPY ... TO STDOUT (see below)
+#   Error, DisconnectErrors - the backend's exception classes
+#
+class PostgresBackend:
+    name = 'postgres'
+    canCopy = True
+
+    def __init__(self):
+        # psycopg2 is only needed when Postgres is used
+        import psycopg2
+        import psycopg2.extras
+        self.psycopg2 = psycopg2
+        self.Error = psycopg2.Error
+        self.DisconnectErrors = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+    def connect(self, **cparms):
+        return self.psycopg2.connect(**cparms)
+
+    def cursor(self, connection, rows='dict', name=None):
+        factory = self.psycopg2.extras.RealDictCursor if rows == 'dict' else None
+        if name is None:
+            return connection.cursor(cursor_factory=factory)
+        return connection.cursor(name=name, cursor_factory=factory)
+
+    def translate(self, query):
+        return query
+
+    def columns(self, cur):
+        return [d[0] for d in cur.description]
+
+    def returnsRows(self, cur):
+        return cur.statusmessage.startswith('SELECT')
+
+#
+# SQLite. Gives the same rows as Postgres for the dumpers' queries: column names are
+# folded to lower case unless quoted (as Postgres does), and timestamp and date columns
+# come back as datetimes and dates. The dialect shims cover the Postgres constructs the
+# queries use (see SQLITE_SHIMS); they are applied outside string literals. The database
+# is read only, and read through a memory map (up to SQLITE_MMAP_SIZE; SQLite may cap
+# it lower): the tables several dumpers read are served from the page cache, without
+# copying them through read calls, and worker processes (--jobs) share those pages.
+#
+SQLITE_MMAP_SIZE = 1 << 40
+SQLITE_QUOTED_RE = re.compile(r'"([^"]+)"')
+SQLITE_LITERAL_RE = re.compile(r"('(?:[^']|'')*')")
+SQLITE_CAST_TYPE = r'\s*::\s*(\w+(?:\s*\(\s*\d+\s*\))?)'
+SQLITE_LITERAL_CAST_RE = re.compile(r'\A' + SQLITE_CAST_TYPE)
+SQLITE_SHIMS = [
+    # x::type -> CAST(x AS type)
+    (re.compile(r'\b([\w.]+)' + SQLITE_CAST_TYPE), r'CAST(\1 AS \2)'),
+    (re.compile(r'\bstring_agg\s*\(', re.I), 'group_concat('),
+    (re.compile(r'\bilike\b', re.I), 'LIKE'),
+    (re.compile(r'\blimit\s+all\b', re.I), 'LIMIT -1'),
+    (re.compile(r'\bnow\s*\(\s*\)', re.I), 'CURRENT_TIMESTAMP'),
+]
+
+class SqliteBackend:
+    name = 'sqlite'
+    canCopy = False
+
+    def __init__(self, path):
+        import sqlite3
+        self.sqlite3 = sqlite3
+        self.path = os.path.abspath(path)
+        if not os.path.exists(self.path):
+            raise RuntimeError("No such SQLite database: %s" % self.path)
+        self.Error = sqlite3.Error
+        self.DisconnectErrors = (sqlite3.OperationalError, sqlite3.InterfaceError)
+        sqlite3.register_converter('timestamp', lambda b: datetime.datetime.fromisoformat(b.decode()))
+        sqlite3.register_converter('date', lambda b: datetime.date.fromisoformat(b.decode()))
+        self.translations = {}
+
+    def connect(self, **cparms):
+        c = self.sqlite3.connect('file:%s?mode=ro' % self.path, uri=True,
+            detect_types=self.sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        c.execute('PRAGMA mmap_size = %d' % SQLITE_MMAP_SIZE)
+        # sorts and temporary indexes (e.g., for DISTINCT and GROUP BY) stay in memory
+        c.execute('PRAGMA temp_store = MEMORY')
+        return SqliteConnection(c)
+
+    def cursor(self, connection, rows='dict', name=None):
+        return SqliteCursor(self, connection.db.cursor(), rows)
+
+    def translate(self, query):
+        t = self.translations.get(query)
+        if t is None:
+            # odd parts are string literals
+            parts = SQLITE_LITERAL_RE.split(query)
+            for i in range(1, len(parts), 2):
+                m = SQLITE_LITERAL_CAST_RE.match(parts[i+1])
+                if m:
+                    parts[i] = 'CAST(%s AS %s)' % (parts[i], m.group(1))
+                    parts[i+1] = parts[i+1][m.end():]
+            for i in range(0, len(parts), 2):
+                for r, s in SQLITE_SHIMS:
+                    parts[i] = r.sub(s, parts[i])
+            t = ''.join(parts)
+            self.translations[query] = t
+        return t
+
+    def columns(self, cur):
+        return cur.columns
+
+    def returnsRows(self, cur):
+        return cur.description is not None
+
+# A sqlite3 connection, as the rest of this module uses connections.
+class SqliteConnection:
+    def __init__(self, db):
+        self.db = db
+        self.closed = 0
+
+    def cursor(self):
+        return self.db.cursor()
+
+    def rollback(self):
+        self.db.rollback()
+
+    def close(self):
+        self.db.close()
+        self.closed = 1
+
+# A sqlite3 cursor, returning rows of the given type, with column names as Postgres has them.
+class SqliteCursor:
+    def __init__(self, backend, cur, rows):
+        self.backend = backend
+        self.cur = cur
+        self.rows = rows
+        self.columns = None
+        self.itersize = None
+
+    @property
+    def description(self):
+        return self.cur.description
+
+    def execute(self, query):
+        self.cur.execute(self.backend.translate(query))
+        if self.cur.description is not None:
+            quoted = set(SQLITE_QUOTED_RE.findall(query))
+            self.columns = [d[0] if d[0] in quoted else d[0].lower() for d in self.cur.description]
+
+    def __iter__(self):
+        if self.rows == 'dict':
+            columns = self.columns
+            return (dict(zip(columns, r)) for r in self.cur)
+        return iter(self.cur)
+
+    def close(self):
+        self.cur.close()
+
+BACKEND = None
+
+# Returns the current backend, setting up the default (Postgres) one if needed.
+def getBackend():
+    global BACKEND
+    if BACKEND is None:
+        BACKEND = PostgresBackend()
+    return BACKEND
+
+def setBackend(backend):
+    global BACKEND
+    BACKEND = backend
+
+#
+# A pool of open database connections, so that sql() and sqliter() can reuse 
+# connections rather than open a new one for every call.
+#   maxsize - the number of idle connections kept open. Callers needing more at once
+#       (e.g. nested queries) get extra connections, which are closed when returned.
+#       A maxsize of 0 turns pooling off (but still collects stats).
+#   checkAfter - a connection that has been idle for this many seconds is tested
+#       (SELECT 1) before being handed out again. Dead connections are replaced.
+# The pool is thread safe. Connections cannot be shared across processes, so 
+# a forked child starts with an empty pool of its own.
+#
+class ConnectionPool:
+    def __init__(self, maxsize=4, checkAfter=60, **cparms):
+        self.maxsize = maxsize
+        self.checkAfter = checkAfter
+        self.cparms = cparms
+        self.lock = threading.Lock()
+        self.idle = [] # list of (connection, time returned)
+        self.pid = os.getpid()
+        # Connections inherited from a parent process. Never used or closed (closing
+        # would end the parent's session), just kept from being garbage collected.
+        self.orphans = []
+        self.resetStats()
+
+    def resetStats(self):
+        self.nRequests = 0      # connections handed out
+        self.nConnects = 0      # connections opened
+        self.nReconnects = 0    # dead connections replaced
+        self.connectTime = 0.0  # total time spent opening connections
+
+    def getStats(self):
+        return {
+            'requests'    : self.nRequests,
+            'connects'    : self.nConnects,
+            'reconnects'  : self.nReconnects,
+            'connectTime' : self.connectTime,
+        }
+
+    # Adds stats from another pool (e.g., one in a worker process).
+    def addStats(self, stats):
+        with self.lock:
+            self.nRequests += stats['requests']
+            self.nConnects += stats['connects']
+            self.nReconnects += stats['reconnects']
+            self.connectTime += stats['connectTime']
+
+    def _checkPid(self):
+        # call with the lock held
+        if self.pid != os.getpid():
+            self.orphans.extend([c for c,t in self.idle])
+            self.idle = []
+            self.pid = os.getpid()
+            self.resetStats()
+
+    def _connect(self):
+        t = time.time()
+        con = connect(**self.cparms)
+        with self.lock:
+            self.nConnects += 1
+            self.connectTime += time.time() - t
+        return con
+
+    def _isHealthy(self, con, idleTime):
+        if con.closed:
+            return False
+        if idleTime < self.checkAfter:
+            return True
+        try:
+            cur = con.cursor()
+            cur.execute('SELECT 1')
+            cur.close()
+            con.rollback()
+            return True
+        except getBackend().Error:
+            return False
+
+    def getConnection(self):
+        while True:
+            with self.lock:
+                self._checkPid()
+                self.nRequests += 1
+                if not self.idle:
+                    break
+                con, t = self.idle.pop()
+            if self._isHealthy(con, time.time() - t):
+                return con
+            with self.lock:
+                self.nRequests -= 1
+                self.nReconnects += 1
+            self.discard(con)
+        return self._connect()
+
+    def putConnection(self, con):
+        if con.closed:
+            return
+        try:
+            # end any open transaction (also closes named cursors)
+            con.rollback()
+        except getBackend().Error:
+            self.discard(con)
+            return
+        with self.lock:
+            if self.pid == os.getpid() and len(self.idle) < self.maxsize:
+                self.idle.append((con, time.time()))
+                return
+        con.close()
+
+    # Replaces a connection found to be dead while in use.
+    def reconnect(self, con):
+        self.discard(con)
+        with self.lock:
+            self.nReconnects += 1
+        return self._connect()
+
+    def discard(self, con):
+        try:
+            con.close()
+        except getBackend().Error:
+            pass
+
+    def closeAll(self):
+        with self.lock:
+            self._checkPid()
+            idle = self.idle
+            self.idle = []
+        for con, t in idle:
+            self.discard(con)
+
+#
+# Executes a query on a cursor from connection, returning rows of the given type
+# (see the backend's cursor()). If the connection came from the pool and turns out
+# to be dead, replaces it and tries once more.
+# Returns (connection, cursor).
+#
+def _execute(connection, pool, query, rows='tuple', name=None):
+    backend = getBackend()
+    try:
+        cur = backend.cursor(connection, rows, name)
+        cur.execute(query)
+        return connection, cur
+    except backend.DisconnectErrors:
+        if pool is None or not connection.closed:
+            raise
+    connection = pool.reconnect(connection)
+    cur = backend.cursor(connection, rows, name)
+    cur.execute(query)
+    return connection, cur
+
+#
+# Lightweight rows. With rows='tuple', queries return the cursor's plain tuples, each
+# made into a Row: a namedtuple whose class is built from the cursor description.
+# Values can be read by column name, r['accid'] or r.accid, as well as by position,
+# without building a dict per row. Rows are read-only; see AbstractItemDumper.ItemRecord
+# for adding computed fields.
+#
+class RowMixin:
+    __slots__ = ()
+    COLUMNS = ()
+    INDEX = {}
+
+    def __getitem__(self, k):
+        if type(k) is str:
+            return tuple.__getitem__(self, self.INDEX[k])
+        return tuple.__getitem__(self, k)
+
+    def __contains__(self, k):
+        return k in self.INDEX
+
+    def get(self, k, default=None):
+        i = self.INDEX.get(k)
+        return default if i is None else tuple.__getitem__(self, i)
+
+    def keys(self):
+        return self.COLUMNS
+
+    def asDict(self):
+        return dict(zip(self.COLUMNS, self))
+
+# column names -> Row class
+ROW_CLASSES = {}
+
+#
+def rowClass(columns):
+    columns = tuple(columns)
+    cls = ROW_CLASSES.get(columns)
+    if cls is None:
+        base = collections.namedtuple('Row', columns, rename=True)
+        cls = type('Row', (RowMixin, base), {
+            '__slots__' : (),
+            'COLUMNS'   : columns,
+            'INDEX'     : dict([(c,i) for i,c in enumerate(columns)]),
+            })
+        ROW_CLASSES[columns] = cls
+    return cls
+
+# Returns an iterator over the rows of cursor cur, of the given type ('dict' or 'tuple').
+# (The description of a named cursor is only available after the first fetch.)
+#
+def _iterRows(cur, rows):
+    if rows == 'dict':
+        yield from cur
+        return
+    it = iter(cur)
+    for first in it:
+        make = functools.partial(tuple.__new__, rowClass(getBackend().columns(cur)))
+        yield make(first)
+        yield from map(make, it)
+
+def _checkRows(rows):
+    if rows not in ('dict', 'tuple'):
+        raise RuntimeError("Unknown row type: %s" % rows)
+
+#
+# Bulk extraction. With copy=True, a query is run as COPY (query) TO STDOUT in text
+# format, and the stream is parsed as it arrives, rather than fetched through a cursor.
+# The server sends rows as fast as the client can take them, with no per-fetch round
+# trips or per-row type adaptation by psycopg2.
+#
+# Column names and types come from running the query with LIMIT 0 first. Values are
+# converted from text according to the column type, giving the same Python values a
+# cursor would. Queries that are not SELECTs, or that return a column of a type not
+# in COPY_CONVERTERS (arrays, json, etc.), go through a cursor as usual.
+#
+# Rows are produced as they are for the cursor path: dicts for rows='dict', Rows for
+# rows='tuple'. To try the copy path against a database, see __testCopy__ below.
+#
+
+#
+def _parseBool(v):
+    return v == 't'
+
+# type oid -> conversion function (None means the text itself)
+COPY_CONVERTERS = {
+    16   : _parseBool,                          # bool
+    18   : None,                                # char
+    19   : None,                                # name
+    20   : int,                                 # int8
+    21   : int,                                 # int2
+    23   : int,                                 # int4
+    25   : None,                                # text
+    26   : int,                                 # oid
+    700  : float,                               # float4
+    701  : float,                               # float8
+    1042 : None,                                # bpchar
+    1043 : None,                                # varchar
+    1082 : datetime.date.fromisoformat,         # date
+    1083 : datetime.time.fromisoformat,         # time
+    1114 : datetime.datetime.fromisoformat,     # timestamp
+    1184 : datetime.datetime.fromisoformat,     # timestamptz
+    1700 : decimal.Decimal,                     # numeric
+}
+
+# Number of rows handed over at a time by the copy thread (see _copyIter)
+COPYBATCH = 1000
+COPYQUEUE = 64
+
+COPY_QUERY_RE = re.compile(r'\s*(select|with)\b', re.I)
+COPY_ESC_RE = re.compile(r'\\(?:([0-7]{1,3})|x([0-9a-fA-F]{1,2})|(.))', re.S)
+COPY_ESCAPES = { 'b':'\b', 'f':'\f', 'n':'\n', 'r':'\r', 't':'\t', 'v':'\v' }
+
+#
+def _copyUnescape(m):
+    if m.group(1):
+        return chr(int(m.group(1), 8))
+    elif m.group(2):
+        return chr(int(m.group(2), 16))
+    c = m.group(3)
+    return COPY_ESCAPES.get(c, c)
+
+#
+def _copyConvert(c, v):
+    return v if c is None else c(v)
+
+# Returns a function that parses one line of COPY text output into a list of values.
+#
+def _copyLineParser(converters):
+    def parse(line):
+        vals = line.split('\t')
+        if '\\' in line:
+            # test for NULL before unescaping: an escaped value can unescape to \N
+            return [None if v == '\\N' else _copyConvert(c, COPY_ESC_RE.sub(_copyUnescape, v)) \
+                for v,c in zip(vals, converters)]
+        return [None if v == '\\N' else (v if c is None else c(v)) for v,c in zip(vals, converters)]
+    return parse
+
+# Works out how to copy query q. Returns (connection, plan), where plan is
+# (column names, line parser), or None if q must go through a cursor.
+#
+def _copyPlan(connection, pool, q):
+    q = q.strip().rstrip(';')
+    if not getBackend().canCopy or not COPY_QUERY_RE.match(q):
+        return connection, None
+    connection, cur = _execute(connection, pool, 'SELECT * FROM (%s) _copyplan LIMIT 0' % q)
+    desc = cur.description
+    cur.close()
+    if any([d[1] not in COPY_CONVERTERS for d in desc]):
+        return connection, None
+    columns = [d[0] for d in desc]
+    return connection, (columns, _copyLineParser([COPY_CONVERTERS[d[1]] for d in desc]))
+
+# Returns a function that makes a row of the given type ('dict' or 'tuple') from
+# a list of values for the given columns.
+#
+def rowMaker(columns, rows):
+    if rows == 'dict':
+        return lambda vals: dict(zip(columns, vals))
+    return functools.partial(tuple.__new__, rowClass(columns))
+
+#
+# Text sink for cursor.copy_expert. (Being a text file, psycopg2 hands it decoded
+# strings.) Passes each complete line to emit. Raises if stop is set, which aborts
+# the COPY.
+#
+class _CopySink(io.TextIOBase):
+    def __init__(self, emit, stop=None):
+        self.emit = emit
+        self.stop = stop
+        self.partial = ''
+        self.nBytes = 0     # characters received
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if self.stop is not None and self.stop.is_set():
+            raise RuntimeError("COPY cancelled.")
+        n = len(data)
+        self.nBytes += n
+        if self.partial:
+            data = self.partial + data
+            self.partial = ''
+        if data.endswith('\n') and data.count('\n') == 1:
+            # the usual case: psycopg2 writes one row at a time
+            self.emit(data[:-1])
+            return n
+        lines = data.split('\n')
+        self.partial = lines.pop()
+        for line in lines:
+            self.emit(line)
+        return n
+
+# Runs COPY for query q, calling emit with each row. Returns the number of
+# characters received.
+#
+def _copy(connection, q, plan, rows, emit):
+    columns, parse = plan
+    make = rowMaker(columns, rows)
+    cur = connection.cursor()
+    sink = _CopySink(lambda line: emit(make(parse(line))))
+    try:
+        cur.copy_expert('COPY (%s) TO STDOUT' % q.strip().rstrip(';'), sink)
+    finally:
+        cur.close()
+    return sink.nBytes
+
+# Runs COPY for query q in another thread, and yields the rows. Rows are handed over
+# in batches through a bounded queue, so parsing overlaps with the consumer's work.
+# If stats (a dict) is given, stats['bytes'] is set to the number of characters received.
+#
+def _copyIter(connection, q, plan, rows, stats=None):
+    columns, parse = plan
+    make = rowMaker(columns, rows)
+    rq = queue.Queue(COPYQUEUE)
+    stop = threading.Event()
+    END = object()
+
+    def run():
+        batch = []
+        def emit(line):
+            batch.append(line)
+            if len(batch) >= COPYBATCH:
+                rq.put(batch[:])
+                del batch[:]
+        cur = connection.cursor()
+        sink = _CopySink(emit, stop)
+        try:
+            cur.copy_expert('COPY (%s) TO STDOUT' % q.strip().rstrip(';'), sink)
+            if stats is not None:
+                stats['bytes'] = sink.nBytes
+            rq.put(batch)
+            rq.put(END)
+        except Exception as e:
+            rq.put(e)
+        finally:
+            cur.close()
+
+    t = threading.Thread(target=run, name='CopyReader', daemon=True)
+    t.start()
+    try:
+        while True:
+            b = rq.get()
+            if b is END:
+                break
+            elif isinstance(b, Exception):
+                raise b
+            for line in b:
+                yield make(parse(line))
+    finally:
+        # if the consumer stopped early, abort the COPY and let the thread finish
+        stop.set()
+        while t.is_alive():
+            try:
+                rq.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        t.join()
+
 # Cursor name parameters
 NAMELEN = 10
 ITERSIZE = 1000000
 import random
 import string
 
+# If stats (a dict) is given, stats['source'] is set to how the rows were fetched ('cursor'
+# or 'copy'), and for copy, stats['bytes'] to the number of characters received.
 #
-def sqliter(query, connection=None):
+def sqliter(query, connection=None, pool=None, rows='dict', copy=False, stats=None):
+    _checkRows(rows)
     closeCon = False
     if connection is None:
-        connection = connect()
-        closeCon = True
-
-    # generate a server-side (named) cursor
-    cn = 'C_' + ''.join(random.SystemRandom().choice(string.ascii_uppercase + string.digits) for _ in range(NAMELEN))
-    cur = connection.cursor(name=cn, cursor_factory=psycopg2.extras.RealDictCursor)
-    cur.itersize = ITERSIZE
-    cur.execute(query)
-    for r in cur:
-        yield r
-    cur.close()
+        if pool is None:
+            connection = connect()
+            closeCon = True
+        else:
+            connection = pool.getConnection()
+    else:
+        pool = None
 
-    if closeCon:
-        connection.close()
+    try:
+        plan = None
+        if copy:
+            connection, plan = _copyPlan(connection, pool, query)
+        if stats is not None:
+            stats['source'] = 'copy' if plan is not None else 'cursor'
+        if plan is not None:
+            yield from _copyIter(connection, query, plan, rows, stats)
+            return
+        # generate a server-side (named) cursor
+        cn = 'C_' + ''.join(random.SystemRandom().choice(string.ascii_uppercase + string.digits) for _ in range(NAMELEN))
+        connection, cur = _execute(connection, pool, query, rows=rows, name=cn)
+        cur.itersize = ITERSIZE
+        for r in _iterRows(cur, rows):
+            yield r
+        cur.close()
+    finally:
+        if pool:
+            pool.putConnection(connection)
+        elif closeCon:
+            connection.close()
 
+# stats: as for sqliter (for the last query, if there are several)
 #
-def sql(queries, parsers=None, args={}, connection=None):
+def sql(queries, parsers=None, args={}, connection=None, pool=None, rows='dict', copy=False, stats=None):
+    _checkRows(rows)
     single = False
     if type(queries) not in [list,tuple]:
         queries = [queries]
@@ -105,35 +716,58 @@ def sql(queries, parsers=None, args={}, connection=None):
 
     closeCon = False
     if connection is None:
-        connection = connect()
-        closeCon = True
+        if pool is None:
+            connection = connect()
+            closeCon = True
+        else:
+            connection = pool.getConnection()
+    else:
+        pool = None
 
     results = []
-    for i,q in enumerate(queries):
-        cur = connection.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        cur.execute(q)
-        p = parsers[i]
-        a = args[i]
-        if p == 'ignore':
-            results.append(None)
-        elif cur.statusmessage.startswith('SELECT'):
-            if p is None:
-                qr = []
-                for r in cur:
-                    #qr.append( dict(r) )
-                    qr.append( r )
-                results.append(qr)
+    try:
+        for i,q in enumerate(queries):
+            p = parsers[i]
+            a = args[i]
+            plan = None
+            if copy and p != 'ignore':
+                connection, plan = _copyPlan(connection, pool, q)
+            if stats is not None:
+                stats['source'] = 'copy' if plan is not None else 'cursor'
+            if plan is not None:
+                if p is None:
+                    qr = []
+                    n = _copy(connection, q, plan, rows, qr.append)
+                    results.append(qr)
+                else:
+                    n = _copy(connection, q, plan, rows, lambda r: p(r, **a))
+                    results.append(None)
+                if stats is not None:
+                    stats['bytes'] = n
+                continue
+            connection, cur = _execute(connection, pool, q, rows=rows)
+            if p == 'ignore':
+                results.append(None)
+            elif getBackend().returnsRows(cur):
+                if p is None:
+                    qr = []
+                    for r in _iterRows(cur, rows):
+                        #qr.append( dict(r) )
+                        qr.append( r )
+                    results.append(qr)
+                else:
+                    for r in _iterRows(cur, rows):
+                        #p( dict(r), **a )
+                        p( r, **a )
+                    results.append(None)
             else:
-                for r in cur:
-                    #p( dict(r), **a )
-                    p( r, **a )
                 results.append(None)
-        else:
-            results.append(None)
-        cur.close()
-
-    if closeCon:
-        connection.close()
+            cur.close()
+    finally:
+        if pool:
+            pool.putConnection(connection)
+        elif closeCon:
+            connection.close()
 
     if single:
         return results[0]
@@ -154,5 +788,38 @@ def __test__():
     for r in sqliter("select * from acc_mgitype"):
       print(r)
 
+#
+# Checks that the copy path returns the same rows as the cursor path, for
+# each query given on the command line (or a few defaults), e.g.,
+#   python mgidbconnect.py copy "select * from acc_accession limit 100000"
+# Uses the connection set up by setConnection (or the properties file).
+#
+def __testCopy__(queries=None):
+    queries = queries or [
+      'select * from acc_mgitype',
+      'select * from mrk_marker where _marker_key < 10000',
+      'select * from acc_accession where _mgitype_key = 2 limit 100000',
+      ]
+    pool = ConnectionPool(2)
+    ok = True
+    for q in queries:
+        for rows in ('dict', 'tuple'):
+            t0 = time.time()
+            a = list(sqliter(q, pool=pool, rows=rows))
+            t1 = time.time()
+            b = list(sqliter(q, pool=pool, rows=rows, copy=True))
+            t2 = time.time()
+            c = sql(q, pool=pool, rows=rows, copy=True)
+            same = a == b == c
+            ok = ok and same
+            print('%s rows=%s n=%d cursor=%.2fs copy=%.2fs %s' % \
+                ('OK  ' if same else 'DIFF', rows, len(a), t1-t0, t2-t1, q))
+    pool.closeAll()
+    return ok
+
 if __name__ == "__main__":
+    if sys.argv[1:2] == ['copy']:
+        if HOST is None:
+            setConnectionFromPropertiesFile()
+        sys.exit(0 if __testCopy__(sys.argv[2:]) else 1)
     __test__()
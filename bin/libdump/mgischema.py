@@ -0,0 +1,124 @@
+#
+# mgischema.py
+#
+# Column definitions for the subset of the MGI schema read by the dumpers: the tables
+# of a local snapshot (see Snapshot.py) and of the synthetic benchmark database (see
+# bench/mkFixture.py).
+#
+INT = 'int'
+TEXT = 'text'
+DATE = 'date'
+TIMESTAMP = 'timestamp'
+
+TABLES = {
+  'ACC_MGIType'     : [('_mgitype_key',INT), ('name',TEXT)],
+  'ACC_LogicalDB'   : [('_logicaldb_key',INT), ('name',TEXT), ('description',TEXT), ('_organism_key',INT)],
+  'ACC_ActualDB'    : [('_actualdb_key',INT), ('_logicaldb_key',INT), ('name',TEXT), ('url',TEXT)],
+  'ACC_Accession'   : [('_accession_key',INT), ('accid',TEXT), ('prefixpart',TEXT), ('numericpart',INT),
+                       ('_logicaldb_key',INT), ('_object_key',INT), ('_mgitype_key',INT),
+                       ('private',INT), ('preferred',INT), ('modification_date',TIMESTAMP)],
+  'MGI_dbinfo'      : [('public_version',TEXT), ('product_name',TEXT), ('lastdump_date',TIMESTAMP)],
+  'MGI_Organism'    : [('_organism_key',INT), ('commonname',TEXT), ('latinname',TEXT)],
+  'BIB_Refs'        : [('_refs_key',INT), ('_referencetype_key',INT), ('authors',TEXT), ('title',TEXT),
+                       ('journal',TEXT), ('vol',TEXT), ('issue',TEXT), ('date',TEXT), ('year',INT),
+                       ('pgs',TEXT), ('abstract',TEXT), ('modification_date',TIMESTAMP)],
+  'VOC_Vocab'       : [('_vocab_key',INT), ('_logicaldb_key',INT), ('name',TEXT)],
+  'VOC_Term'        : [('_term_key',INT), ('_vocab_key',INT), ('term',TEXT), ('abbreviation',TEXT),
+                       ('sequencenum',INT)],
+  'VOC_Term_EMAPA'  : [('_term_key',INT), ('startstage',INT), ('endstage',INT)],
+  'VOC_AnnotType'   : [('_annottype_key',INT), ('_mgitype_key',INT), ('_vocab_key',INT),
+                       ('_evidencevocab_key',INT), ('_qualifiervocab_key',INT), ('name',TEXT)],
+  'VOC_Annot'       : [('_annot_key',INT), ('_annottype_key',INT), ('_object_key',INT), ('_term_key',INT),
+                       ('_qualifier_key',INT), ('modification_date',TIMESTAMP)],
+  'VOC_Evidence'    : [('_annotevidence_key',INT), ('_annot_key',INT), ('_evidenceterm_key',INT),
+                       ('_refs_key',INT), ('inferredfrom',TEXT), ('creation_date',TIMESTAMP),
+                       ('modification_date',TIMESTAMP)],
+  'VOC_Evidence_Property' : [('_evidenceproperty_key',INT), ('_annotevidence_key',INT),
+                       ('_propertyterm_key',INT), ('stanza',INT), ('sequencenum',INT), ('value',TEXT)],
+  'MRK_Types'       : [('_marker_type_key',INT), ('name',TEXT)],
+  'MRK_Marker'      : [('_marker_key',INT), ('_organism_key',INT), ('_marker_status_key',INT),
+                       ('_marker_type_key',INT), ('symbol',TEXT), ('name',TEXT), ('chromosome',TEXT),
+                       ('modification_date',TIMESTAMP)],
+  'MRK_Chromosome'  : [('_chromosome_key',INT), ('_organism_key',INT), ('chromosome',TEXT),
+                       ('sequencenum',INT)],
+  'MRK_Location_Cache' : [('_marker_key',INT), ('_organism_key',INT), ('chromosome',TEXT),
+                       ('genomicchromosome',TEXT), ('startcoordinate',INT), ('endcoordinate',INT),
+                       ('strand',TEXT), ('version',TEXT)],
+  'MRK_MCV_Cache'   : [('_marker_key',INT), ('_mcvterm_key',INT), ('term',TEXT), ('qualifier',TEXT)],
+  'MRK_Reference'   : [('_marker_key',INT), ('_refs_key',INT), ('jnum',INT)],
+  'MRK_Notes'       : [('_marker_key',INT), ('note',TEXT)],
+  'MRK_Label'       : [('_label_key',INT), ('_marker_key',INT), ('_organism_key',INT),
+                       ('_orthologorganism_key',INT), ('label',TEXT), ('labeltype',TEXT)],
+  'MRK_Cluster'     : [('_cluster_key',INT), ('_clustersource_key',INT)],
+  'MRK_ClusterMember' : [('_clustermember_key',INT), ('_cluster_key',INT), ('_marker_key',INT),
+                       ('sequencenum',INT)],
+  'SEQ_Marker_Cache': [('_marker_key',INT), ('_organism_key',INT), ('_logicaldb_key',INT),
+                       ('_marker_type_key',INT), ('accid',TEXT)],
+  'MGI_Note'        : [('_note_key',INT), ('_object_key',INT), ('_mgitype_key',INT), ('_notetype_key',INT)],
+  'MGI_NoteChunk'   : [('_note_key',INT), ('sequencenum',INT), ('note',TEXT)],
+  'MGI_Synonym'     : [('_synonym_key',INT), ('_object_key',INT), ('_mgitype_key',INT), ('synonym',TEXT)],
+  'MGI_RefAssocType': [('_refassoctype_key',INT), ('_mgitype_key',INT), ('assoctype',TEXT)],
+  'MGI_Reference_Assoc' : [('_assoc_key',INT), ('_refs_key',INT), ('_object_key',INT),
+                       ('_mgitype_key',INT), ('_refassoctype_key',INT)],
+  'MGI_Relationship_Category' : [('_category_key',INT), ('name',TEXT), ('_mgitype_key_1',INT),
+                       ('_mgitype_key_2',INT)],
+  'MGI_Relationship': [('_relationship_key',INT), ('_category_key',INT), ('_object_key_1',INT),
+                       ('_object_key_2',INT), ('_relationshipterm_key',INT), ('_qualifier_key',INT),
+                       ('_evidence_key',INT), ('_refs_key',INT)],
+  'MGI_Relationship_Property' : [('_relationshipproperty_key',INT), ('_relationship_key',INT),
+                       ('_propertyname_key',INT), ('value',TEXT), ('sequencenum',INT)],
+  'MGI_Property'    : [('_property_key',INT), ('_object_key',INT), ('_propertytype_key',INT),
+                       ('_propertyterm_key',INT), ('value',TEXT)],
+  'PRB_Strain'      : [('_strain_key',INT), ('strain',TEXT), ('_straintype_key',INT), ('standard',INT)],
+  'PRB_Strain_Marker' : [('_strainmarker_key',INT), ('_strain_key',INT), ('_marker_key',INT),
+                       ('_allele_key',INT)],
+  'ALL_Allele'      : [('_allele_key',INT), ('_marker_key',INT), ('_strain_key',INT), ('symbol',TEXT),
+                       ('name',TEXT), ('iswildtype',INT), ('isextinct',INT), ('ismixed',INT),
+                       ('_allele_type_key',INT), ('_mode_key',INT), ('_transmission_key',INT),
+                       ('_collection_key',INT), ('modification_date',TIMESTAMP)],
+  'ALL_Allele_Mutation' : [('_allele_key',INT), ('_mutation_key',INT)],
+  'ALL_Label'       : [('_allele_key',INT), ('label',TEXT), ('labeltypename',TEXT)],
+  'ALL_CellLine'    : [('_cellline_key',INT), ('cellline',TEXT), ('ismutant',INT),
+                       ('_cellline_type_key',INT), ('_strain_key',INT), ('_derivation_key',INT)],
+  'ALL_Allele_CellLine' : [('_assoc_key',INT), ('_allele_key',INT), ('_mutantcellline_key',INT)],
+  'ALL_CellLine_Derivation' : [('_derivation_key',INT), ('name',TEXT), ('_vector_key',INT),
+                       ('_vectortype_key',INT), ('_parentcellline_key',INT), ('_derivationtype_key',INT),
+                       ('_creator_key',INT), ('_refs_key',INT)],
+  'GXD_Genotype'    : [('_genotype_key',INT), ('_strain_key',INT), ('isconditional',INT), ('note',TEXT),
+                       ('_existsas_key',INT), ('modification_date',TIMESTAMP)],
+  'GXD_AllelePair'  : [('_allelepair_key',INT), ('_genotype_key',INT), ('_allele_key_1',INT),
+                       ('_allele_key_2',INT), ('_mutantcellline_key_1',INT), ('_mutantcellline_key_2',INT),
+                       ('_marker_key',INT), ('_pairstate_key',INT), ('_compound_key',INT),
+                       ('sequencenum',INT)],
+  'GXD_AlleleGenotype' : [('_genotype_key',INT), ('_allele_key',INT), ('_marker_key',INT)],
+  'GXD_AssayType'   : [('_assaytype_key',INT), ('assaytype',TEXT)],
+  'GXD_Assay'       : [('_assay_key',INT), ('_assaytype_key',INT), ('_marker_key',INT), ('_refs_key',INT),
+                       ('_probeprep_key',INT), ('_antibodyprep_key',INT), ('_imagepane_key',INT),
+                       ('creation_date',TIMESTAMP)],
+  'GXD_ProbePrep'   : [('_probeprep_key',INT), ('_probe_key',INT)],
+  'GXD_AntibodyPrep': [('_antibodyprep_key',INT), ('_antibody_key',INT)],
+  'IMG_Image'       : [('_image_key',INT), ('xdim',INT), ('figurelabel',TEXT)],
+  'IMG_ImagePane'   : [('_imagepane_key',INT), ('_image_key',INT)],
+  'GXD_Specimen'    : [('_specimen_key',INT), ('_assay_key',INT), ('_genotype_key',INT), ('sex',TEXT),
+                       ('age',TEXT), ('sequencenum',INT), ('specimenlabel',TEXT)],
+  'GXD_Strength'    : [('_strength_key',INT), ('strength',TEXT)],
+  'GXD_Pattern'     : [('_pattern_key',INT), ('pattern',TEXT)],
+  'GXD_InSituResult': [('_result_key',INT), ('_specimen_key',INT), ('_strength_key',INT),
+                       ('_pattern_key',INT), ('resultnote',TEXT)],
+  'GXD_ISResultStructure' : [('_result_key',INT), ('_emapa_term_key',INT), ('_stage_key',INT)],
+  'GXD_InSituResultImage' : [('_result_key',INT), ('_imagepane_key',INT)],
+  'GXD_GelLane'     : [('_gellane_key',INT), ('_assay_key',INT), ('_genotype_key',INT),
+                       ('_gelcontrol_key',INT), ('sex',TEXT), ('age',TEXT), ('sequencenum',INT)],
+  'GXD_GelLaneStructure' : [('_gellane_key',INT), ('_emapa_term_key',INT), ('_stage_key',INT)],
+  'GXD_GelBand'     : [('_gelband_key',INT), ('_gellane_key',INT), ('_strength_key',INT)],
+  'GXD_TheilerStage': [('_stage_key',INT), ('stage',INT)],
+  'GXD_HTExperiment': [('_experiment_key',INT), ('name',TEXT), ('description',TEXT),
+                       ('release_date',TIMESTAMP), ('last_curated_date',TIMESTAMP),
+                       ('evaluated_date',TIMESTAMP), ('_evaluationstate_key',INT),
+                       ('_curationstate_key',INT), ('_studytype_key',INT), ('_experimenttype_key',INT),
+                       ('_source_key',INT)],
+  'GXD_HTExperimentVariable' : [('_experimentvariable_key',INT), ('_experiment_key',INT), ('_term_key',INT)],
+  'GXD_HTSample'    : [('_sample_key',INT), ('_experiment_key',INT), ('_relevance_key',INT), ('name',TEXT),
+                       ('_organism_key',INT), ('_sex_key',INT), ('_emapa_key',INT), ('_stage_key',INT),
+                       ('_genotype_key',INT), ('age',TEXT), ('agemin',TEXT), ('agemax',TEXT)],
+}
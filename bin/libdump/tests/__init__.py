@@ -0,0 +1,5 @@
+#
+# Unit tests for libdump. Run from the bin directory:
+#       python -m unittest discover -s libdump/tests -t .
+# (or python -m pytest libdump/tests)
+#
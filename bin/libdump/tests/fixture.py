@@ -0,0 +1,78 @@
+#
+# fixture.py
+#
+# A small synthetic MGI database (see bench/mkFixture.py), as a SQLite file, for tests
+# that run dumpMgiItemXml.py end to end. It is built once per test run, and is the same
+# every time (same scale and seed).
+#
+
+import os
+import sys
+import gzip
+import atexit
+import shutil
+import sqlite3
+import tempfile
+import subprocess
+
+BIN = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SCALE = 0.1
+
+_root = None
+
+# Returns the directory holding the fixture and scratch directories, removed when the
+# tests are done.
+def rootDir():
+    global _root
+    if _root is None:
+        _root = tempfile.mkdtemp(prefix='libdumptest.')
+        atexit.register(shutil.rmtree, _root, True)
+    return _root
+
+# Returns a new scratch directory.
+def scratchDir():
+    return tempfile.mkdtemp(dir=rootDir())
+
+# Returns the path of the fixture database, building it if needed.
+def fixtureDb():
+    path = os.path.join(rootDir(), 'fixture.sqlite')
+    if not os.path.exists(path):
+        sys.path.insert(0, os.path.join(BIN, 'bench'))
+        try:
+            from mkFixture import Generator
+        finally:
+            sys.path.pop(0)
+        from libdump.Snapshot import SqliteWriter
+        sink = SqliteWriter(path + '.tmp')
+        Generator(sink, SCALE).generate()
+        sink.finish()
+        os.replace(path + '.tmp', path)
+    return path
+
+# Returns a copy of the fixture database, to be changed by a test, and a connection to it.
+def fixtureCopy():
+    path = os.path.join(scratchDir(), 'fixture.sqlite')
+    shutil.copy(fixtureDb(), path)
+    return path, sqlite3.connect(path)
+
+# Runs dumpMgiItemXml.py with the given arguments against database db (default: the
+# fixture), with a scratch directory as the user's cache directory. Returns its exit
+# status; the log is in <dir>/dump.log.
+def runDumper(dir, *args, db=None):
+    cmd = [sys.executable, os.path.join(BIN, 'dumpMgiItemXml.py'), '--sqlite', db or fixtureDb(),
+        '-d', dir, '-L', os.path.join(dir, 'dump.log')] + list(args)
+    os.makedirs(dir, exist_ok=True)
+    env = dict(os.environ, XDG_CACHE_HOME=os.path.join(rootDir(), 'cache'))
+    return subprocess.run(cmd, cwd=BIN, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode
+
+# Returns the contents of the output files (.xml or .xml.gz, decompressed) in dir, by name.
+def outputs(dir):
+    files = {}
+    for f in sorted(os.listdir(dir)):
+        if f.endswith('.xml'):
+            with open(os.path.join(dir, f), 'rb') as fd:
+                files[f] = fd.read()
+        elif f.endswith('.xml.gz'):
+            with gzip.open(os.path.join(dir, f), 'rb') as fd:
+                files[f[:-3]] = fd.read()
+    return files
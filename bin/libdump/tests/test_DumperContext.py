@@ -0,0 +1,61 @@
+#
+# test_DumperContext.py
+#
+
+import os
+import unittest
+from libdump import mgidbconnect as db
+from libdump.DumperContext import DumperContext
+from libdump.tests.fixture import fixtureDb, scratchDir
+
+class ContentKeyTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = db.BACKEND
+        db.setBackend(db.SqliteBackend(fixtureDb()))
+        self.dir = scratchDir()
+        self.ids = os.path.join(self.dir, 'ids.pkl')
+
+    def tearDown(self):
+        db.setBackend(self.backend)
+
+    # Runs f(context) in a context with stable ids, saving them at the end.
+    def withIds(self, f):
+        cx = DumperContext(dir=self.dir, logfile=os.path.join(self.dir, 'dump.log'), logconsole=False, cache=False, stableIds=self.ids)
+        try:
+            return f(cx)
+        finally:
+            cx.saveStableIds()
+            cx.closeOutputs()
+            cx.closePool()
+            cx.logfd.close()
+
+    # Items with the same content get their own ids, in the same order every run.
+    def testSameContent(self):
+        def f(cx):
+            ids = [cx.makeItemId('Synonym', content=(1, 'x')) for i in range(3)]
+            for id in ids:
+                cx.idsWritten.add(id)
+            return ids
+        first = self.withIds(f)
+        self.assertEqual(len(set(first)), 3)
+        self.assertEqual(self.withIds(f), first)
+
+    # An item abandoned after getting its id (e.g., for a dangling reference) keeps
+    # its key, so the next item with the same content does not take it over, and keeps
+    # its id in a run where the first one is written.
+    def testAbandoned(self):
+        def f(write):
+            def g(cx):
+                abandoned = cx.makeItemId('Synonym', content=(1, 'x'))
+                if write:
+                    cx.idsWritten.add(abandoned)
+                id = cx.makeItemId('Synonym', content=(1, 'x'))
+                cx.idsWritten.add(id)
+                return abandoned, id
+            return g
+        abandoned, id = self.withIds(f(False))
+        self.assertNotEqual(abandoned, id)
+        self.assertEqual(self.withIds(f(True)), (abandoned, id))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+#
+# test_IdRegistry.py
+#
+
+import unittest
+from libdump.IdRegistry import IdRegistry, TypeIds, iterBits, PAGESIZE
+
+class TypeIdsTest(unittest.TestCase):
+    def testAllocate(self):
+        t = TypeIds(2)
+        self.assertEqual([t.allocate() for i in range(3)], [1, 2, 3])
+        self.assertEqual(t.nextId, 4)
+
+    # Keys either side of a page boundary land in different pages, and don't disturb
+    # each other.
+    def testPageBoundary(self):
+        t = TypeIds(2)
+        keys = [0, PAGESIZE - 1, PAGESIZE, 2 * PAGESIZE - 1, 2 * PAGESIZE, 5 * PAGESIZE + 7]
+        for k in keys:
+            t.put(k, t.allocate())
+        self.assertEqual([t.get(k) for k in keys], list(range(1, len(keys) + 1)))
+        self.assertEqual(sorted(t.pages), [0, 1, 2, 5])
+        self.assertEqual(t.get(1), 0)
+        self.assertEqual(t.get(PAGESIZE + 1), 0)
+        self.assertEqual(t.get(3 * PAGESIZE), 0)
+        self.assertEqual(t.nKeys, len(keys))
+        self.assertEqual(sorted(t.items()), sorted(zip(keys, range(1, len(keys) + 1))))
+
+    def testRemap(self):
+        t = TypeIds(2)
+        t.put(PAGESIZE, 1)
+        t.put(PAGESIZE, 2)
+        t.put('x', 3)
+        t.put('x', 4)
+        self.assertEqual(t.nKeys, 2)
+        self.assertEqual((t.get(PAGESIZE), t.get('x')), (2, 4))
+
+    # Keys that are not non-negative ints go into the dict.
+    def testOtherKeys(self):
+        t = TypeIds(2)
+        for m, k in enumerate([-1, 'MGI:1', b'\x01\x02', (1, 2)], 1):
+            t.put(k, m)
+        self.assertEqual(t.pages, {})
+        self.assertEqual([t.get(k) for k in [-1, 'MGI:1', b'\x01\x02', (1, 2)]], [1, 2, 3, 4])
+        self.assertEqual(t.get('MGI:2'), 0)
+
+    def testWritten(self):
+        t = TypeIds(2)
+        t.put(PAGESIZE - 1, 7)
+        t.put(PAGESIZE, 1000)
+        self.assertEqual(t.getWritten(PAGESIZE - 1), 0)
+        t.markWritten(7)
+        t.markWritten(1000)
+        t.markWritten(1000)
+        self.assertEqual(t.nWritten, 2)
+        self.assertEqual((t.getWritten(PAGESIZE - 1), t.getWritten(PAGESIZE)), (7, 1000))
+        self.assertEqual(t.getWritten(PAGESIZE + 1), 0)
+        self.assertEqual(t.getWritten(10 * PAGESIZE), 0)
+        self.assertTrue(t.isWritten(1000))
+        self.assertFalse(t.isWritten(999))
+        self.assertFalse(t.isWritten(100000))
+        self.assertEqual(list(iterBits(t.written)), [7, 1000])
+        t.unmarkWritten(7)
+        t.unmarkWritten(7)
+        self.assertEqual(t.nWritten, 1)
+        self.assertEqual(t.getWritten(PAGESIZE - 1), 0)
+        t.clearWritten()
+        self.assertEqual((t.nWritten, t.getWritten(PAGESIZE)), (0, 0))
+
+    # Claims are kept apart from the written marks.
+    def testClaimed(self):
+        t = TypeIds(2)
+        t.claim(5)
+        t.claim(5)
+        t.claim(900)
+        self.assertEqual(t.nClaimed, 2)
+        self.assertTrue(t.isClaimed(900))
+        self.assertFalse(t.isClaimed(6))
+        self.assertFalse(t.isWritten(5))
+        t.clearClaimed()
+        self.assertEqual((t.nClaimed, t.isClaimed(5)), (0, False))
+
+class IdRegistryTest(unittest.TestCase):
+    def testWrittenIds(self):
+        r = IdRegistry()
+        r.add('3_%d' % PAGESIZE)
+        r.add('3_1')
+        r.add('other')
+        self.assertIn('3_%d' % PAGESIZE, r)
+        self.assertIn('other', r)
+        self.assertNotIn('3_2', r)
+        self.assertNotIn('4_1', r)
+        self.assertEqual(len(r), 3)
+        self.assertEqual(r.get(3).nWritten, 2)
+
+    def testMemoryReport(self):
+        r = IdRegistry()
+        r.get(1).put(0, r.get(1).allocate())
+        t = r.get(2)
+        for k in range(0, 4 * PAGESIZE, PAGESIZE):
+            t.put(k, t.allocate())
+            t.markWritten(t.get(k))
+        self.assertEqual([x[:4] for x in r.memoryReport()], [(2, 4, 4, 5), (1, 1, 0, 2)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+#
+# test_ItemTemplate.py
+#
+
+import unittest
+from libdump.AbstractItemDumper import AbstractItemDumper
+from libdump.ItemTemplate import ItemTemplate
+
+NA_RE = AbstractItemDumper.NA_RE
+NV_RE = AbstractItemDumper.NV_RE
+
+TMPLT = '''
+<item class="Allele" id="%(id)s" >
+  <attribute name="symbol" value="%(symbol)s" />
+  <attribute name="name" value="%(name)s" />
+  <attribute name="isWildType" value="%(isWildType)s" />
+  <reference name="feature" ref_id="%(markerid)s" />
+  <collection name="publications">%(publications)s</collection>
+  %(description)s
+  </item>
+'''
+
+ITEM = {
+    'id'           : '11_1',
+    'symbol'       : 'Pax6<Sey>',
+    'name'         : 'small eye',
+    'isWildType'   : 'false',
+    'markerid'     : '2_3',
+    'publications' : '<reference ref_id="5_1" />',
+    'description'  : '<attribute name="description" value="" />',
+    }
+
+class ItemTemplateTest(unittest.TestCase):
+    def render(self, r, regexes=(NA_RE, NV_RE)):
+        return ItemTemplate(TMPLT, regexes).render(r)
+
+    # what AbstractItemDumper did before templates were compiled: fill, then scan
+    def expected(self, r, regexes=(NA_RE, NV_RE)):
+        s = TMPLT % r
+        for rx in regexes:
+            if rx is not None:
+                s = rx.sub('', s)
+        return s
+
+    def check(self, **kw):
+        r = dict(ITEM, **kw)
+        s = self.render(r)
+        self.assertEqual(s, self.expected(r))
+        return s
+
+    def testNothingToSuppress(self):
+        s = self.check(description='')
+        self.assertEqual(s, TMPLT % dict(ITEM, description=''))
+
+    def testEmptyAttribute(self):
+        s = self.check(name='')
+        self.assertNotIn('name="name"', s)
+        self.assertIn('name="symbol"', s)
+
+    def testEmptyReference(self):
+        s = self.check(markerid='')
+        self.assertNotIn('name="feature"', s)
+
+    # an empty attribute inserted by the dumper is suppressed too
+    def testEmptyInserted(self):
+        s = self.check()
+        self.assertNotIn('name="description"', s)
+
+    def testNotApplicable(self):
+        for v in ['Not Applicable', 'not applicable', 'NOT APPLICABLE']:
+            s = self.check(name=v)
+            self.assertNotIn('name="name"', s)
+        s = self.check(isWildType='Not Applicable', name='')
+        self.assertNotIn('isWildType', s)
+        self.assertNotIn('name="name"', s)
+
+    # only the whole value "Not Applicable" is suppressed
+    def testNotApplicableInText(self):
+        s = self.check(name='Not Applicable here')
+        self.assertIn('value="Not Applicable here"', s)
+
+    # values that could take part in a match fall back to filling and scanning
+    def testUnsafeValues(self):
+        self.check(name='a"b', symbol='')
+        self.check(name='x" />\n  <attribute name="y" value="', symbol='')
+        self.check(name='<', symbol='', markerid='')
+
+    def testNonStringValues(self):
+        s = self.check(name=0, symbol='')
+        self.assertIn('value="0"', s)
+
+    # with suppression off, nothing is removed
+    def testNoRegexes(self):
+        r = dict(ITEM, name='', isWildType='Not Applicable')
+        self.assertEqual(self.render(r, ()), TMPLT % r)
+        self.assertEqual(self.render(r, (None, NV_RE)), self.expected(r, (None, NV_RE)))
+        self.assertIn('Not Applicable', self.render(r, (None, NV_RE)))
+
+if __name__ == '__main__':
+    unittest.main()
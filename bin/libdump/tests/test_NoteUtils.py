@@ -0,0 +1,112 @@
+#
+# test_NoteUtils.py
+#
+
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from libdump.NoteUtils import NoteLoader
+from libdump.Preloads import Preloads
+from libdump.Metrics import Metrics
+
+# The parts of a DumperContext a NoteLoader uses, over an in-memory database.
+class Context:
+    def __init__(self, dir):
+        self.dir = dir
+        self.db = sqlite3.connect(':memory:')
+        self.db.execute('CREATE TABLE MGI_Note (_note_key int, _notetype_key int, _object_key int, _mgitype_key int)')
+        self.db.execute('CREATE TABLE MGI_NoteChunk (_note_key int, sequencenum int, note text)')
+        self.metrics = Metrics()
+        self.preloads = Preloads(self)
+        self.queries = []
+
+    def note(self, nk, nt, ok, mt, *chunks):
+        self.db.execute('INSERT INTO MGI_Note VALUES (?, ?, ?, ?)', (nk, nt, ok, mt))
+        for i, c in enumerate(chunks, 1):
+            self.db.execute('INSERT INTO MGI_NoteChunk VALUES (?, ?, ?)', (nk, i, c))
+
+    def sqliter(self, q, rows='dict'):
+        self.queries.append(q)
+        return iter(self.db.execute(q).fetchall())
+
+    def log(self, s):
+        pass
+
+class Dumper:
+    pass
+
+class NoteLoaderTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cx = Context(self.dir)
+        self.cx.note(1, 1014, 10, 2, 'gene ', 'function')
+        self.cx.note(2, 1014, 11, 2, 'other')
+        self.cx.note(3, 1020, 20, 11, 'allele note')
+        self.cx.note(4, 1047, 30, 42, 'ht')
+        self.cx.note(5, 1008, 40, 25, 'comment ', 'one')
+        self.cx.note(6, 1008, 40, 25, 'comment two')
+        self.notes = NoteLoader(self.cx)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    # Runs a dumper that needs pairs, calling f within it.
+    def dump(self, pairs, f):
+        with self.cx.preloads.scope(Dumper()), self.notes.using(pairs):
+            return f()
+
+    def testNotes(self):
+        self.notes.register([(1014, 2)])
+        notes = self.dump([(1014, 2)], lambda: dict(self.notes.get(1014, 2)))
+        self.assertEqual(notes, {10 : [(1, 'gene function')], 11 : [(2, 'other')]})
+        self.notes.register([(1008, 25)])
+        notes = self.dump([(1008, 25)], lambda: list(self.notes.iterate(1008, 25)))
+        self.assertEqual([(n['_note_key'], n['_object_key'], n['note']) for n in notes],
+            [(5, 40, 'comment one'), (6, 40, 'comment two')])
+
+    # One scan per group of dumpers with notes that run back to back, when the first of
+    # them asks; the notes are freed when the dumper using them is done.
+    def testGroups(self):
+        for pairs in [[(1014, 2)], [], [(1047, None)], [(1008, 25)], [], [(1020, None)]]:
+            self.notes.register(pairs)
+        self.dump([(1014, 2)], lambda: self.notes.get(1014, 2))
+        self.assertEqual(len(self.cx.queries), 1)
+        self.assertEqual(list(self.notes.loaded), [])
+        self.dump([], lambda: None)
+        ht = self.dump([(1047, None)], lambda: self.notes.get(1047))
+        self.assertEqual(len(self.cx.queries), 2)
+        self.assertEqual(ht, {})    # freed with the dumper's preloads
+        self.assertEqual(list(self.notes.loaded), [(1008, 25)])
+        self.assertEqual(len(self.dump([(1008, 25)], lambda: self.notes.get(1008, 25)[40])), 2)
+        self.assertEqual(len(self.cx.queries), 2)
+        self.assertEqual(list(self.notes.loaded), [])
+        self.dump([(1020, None)], lambda: self.notes.get(1020))
+        self.assertEqual(len(self.cx.queries), 3)
+
+    # Notes count against the memory budget, as the running dumper's preloads.
+    def testBudget(self):
+        self.cx.preloads.budget = 0
+        self.notes.register([(1014, 2)])
+        notes = self.dump([(1014, 2)], lambda: (type(self.notes.get(1014, 2)).__name__, dict(self.notes.get(1014, 2))))
+        self.assertEqual(notes, ('DiskIndex', {10 : [(1, 'gene function')], 11 : [(2, 'other')]}))
+
+    # A pair two dumpers registered is loaded again for the second.
+    def testSharedPair(self):
+        self.notes.register([(1020, None)])
+        self.notes.register([(1020, None)])
+        for i in range(2):
+            notes = self.dump([(1020, None)], lambda: dict(self.notes.get(1020)))
+            self.assertEqual(notes, {20 : [(3, 'allele note')]})
+        self.assertEqual(len(self.cx.queries), 2)
+
+    # A worker loads only its own dumper's notes.
+    def testOnly(self):
+        self.notes.register([(1047, None)])
+        self.notes.register([(1008, 25)])
+        self.notes.only([(1008, 25)])
+        self.dump([(1008, 25)], lambda: self.notes.get(1008, 25))
+        self.assertNotIn('1047', self.cx.queries[0])
+
+if __name__ == '__main__':
+    unittest.main()
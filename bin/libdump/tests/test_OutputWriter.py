@@ -0,0 +1,44 @@
+#
+# test_OutputWriter.py
+#
+
+import os
+import gzip
+import shutil
+import tempfile
+import unittest
+from libdump.OutputWriter import OutputWriter
+
+class OutputWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def testWriteCompressed(self):
+        w = OutputWriter(queueSize=4, batchSize=16, compress='gzip')
+        path = os.path.join(self.dir, 'x.xml.gz')
+        f = w.open(path)
+        for i in range(100):
+            f.write('<item id="%d" />\n' % i)
+        f.close()
+        w.stop()
+        with gzip.open(path, 'rt') as fd:
+            self.assertEqual(fd.read(), ''.join(['<item id="%d" />\n' % i for i in range(100)]))
+
+    # A batch that fails when stop() drains it is re-raised by stop(), rather than
+    # leaving stop() waiting on the writer thread.
+    def testErrorOnStop(self):
+        w = OutputWriter(queueSize=4, compress='gzip')
+        def fail(data):
+            raise IOError('disk full')
+        w.compressBlock = fail
+        f = w.open(os.path.join(self.dir, 'x.xml.gz'))
+        f.write('<item />')
+        f.send()
+        self.assertRaises(IOError, w.stop)
+        self.assertFalse(w.thread)
+
+if __name__ == '__main__':
+    unittest.main()
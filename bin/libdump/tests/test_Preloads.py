@@ -0,0 +1,56 @@
+#
+# test_Preloads.py
+#
+
+import os
+import shutil
+import tempfile
+import unittest
+from libdump.Preloads import DiskIndex, parseSize
+
+class DiskIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def check(self, d):
+        ix = DiskIndex(os.path.join(self.dir, 'x.idx'), d)
+        try:
+            self.assertEqual(len(ix), len(d))
+            self.assertEqual(list(ix), list(d))
+            self.assertEqual(list(ix.keys()), list(d.keys()))
+            self.assertEqual(list(ix.values()), list(d.values()))
+            self.assertEqual(list(ix.items()), list(d.items()))
+            self.assertEqual(dict(ix), d)
+            for k, v in d.items():
+                self.assertIn(k, ix)
+                self.assertEqual(ix[k], v)
+                self.assertEqual(ix.get(k), v)
+            self.assertNotIn(-1, ix)
+            self.assertNotIn('none', ix)
+            self.assertIsNone(ix.get(12345))
+        finally:
+            ix.close()
+        self.assertFalse(os.path.exists(os.path.join(self.dir, 'x.idx')))
+
+    # int keys (binary search), in insertion order rather than sorted
+    def testIntKeys(self):
+        self.check({5 : ['a'], 1 : ['b', 'c'], 3 : [], 1 << 40 : [(1, 'd')]})
+
+    def testOtherKeys(self):
+        self.check({'x' : 1, (1, 2) : {'y' : 2}, 3 : None})
+
+    def testEmpty(self):
+        self.check({})
+
+class ParseSizeTest(unittest.TestCase):
+    def testSizes(self):
+        self.assertEqual(parseSize('100'), 100)
+        self.assertEqual(parseSize('8G'), 8 << 30)
+        self.assertEqual(parseSize('1.5m'), 3 << 19)
+        self.assertEqual(parseSize('64KB'), 64 << 10)
+
+if __name__ == '__main__':
+    unittest.main()
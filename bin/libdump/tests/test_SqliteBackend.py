@@ -0,0 +1,80 @@
+#
+# test_SqliteBackend.py
+#
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from libdump import mgidbconnect as db
+
+class SqliteBackendTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        path = os.path.join(self.dir, 'mgi.sqlite')
+        c = sqlite3.connect(path)
+        c.execute('CREATE TABLE MRK_Marker (_Marker_key int, symbol text, chromosome text)')
+        c.executemany('INSERT INTO MRK_Marker VALUES (?, ?, ?)',
+            [(1, 'Pax6', '2'), (2, 'Kit', '5'), (3, 'kitl', '10')])
+        c.commit()
+        c.close()
+        self.backend = db.SqliteBackend(path)
+        self.conn = self.backend.connect()
+
+    def tearDown(self):
+        self.conn.close()
+        shutil.rmtree(self.dir)
+
+    def translate(self, q):
+        return self.backend.translate(q)
+
+    def query(self, q, rows='dict'):
+        cur = self.backend.cursor(self.conn, rows)
+        cur.execute(q)
+        return list(cur)
+
+    def testCast(self):
+        self.assertEqual(self.translate('SELECT m._marker_key::text FROM MRK_Marker m'),
+            'SELECT CAST(m._marker_key AS text) FROM MRK_Marker m')
+        self.assertEqual(self.translate('SELECT x :: varchar(10)'), 'SELECT CAST(x AS varchar(10))')
+        self.assertEqual(self.translate("SELECT '5'::int"), "SELECT CAST('5' AS int)")
+
+    def testStringAgg(self):
+        self.assertEqual(self.translate("SELECT STRING_AGG(symbol, ',') FROM MRK_Marker"),
+            "SELECT group_concat(symbol, ',') FROM MRK_Marker")
+
+    def testIlike(self):
+        self.assertEqual(self.translate("WHERE symbol ILIKE 'kit%'"), "WHERE symbol LIKE 'kit%'")
+        self.assertEqual(self.translate("WHERE symbol_ilike = 1"), "WHERE symbol_ilike = 1")
+
+    def testLimitAll(self):
+        self.assertEqual(self.translate('SELECT 1 limit  all'), 'SELECT 1 LIMIT -1')
+
+    def testNow(self):
+        self.assertEqual(self.translate('SELECT now( )'), 'SELECT CURRENT_TIMESTAMP')
+
+    # nothing inside string literals is translated
+    def testLiterals(self):
+        q = "SELECT 'a::text ilike now()', 'it''s::x' FROM t WHERE a ilike 'b'"
+        self.assertEqual(self.translate(q),
+            "SELECT 'a::text ilike now()', 'it''s::x' FROM t WHERE a LIKE 'b'")
+
+    def testTranslationsCached(self):
+        q = 'SELECT x::int'
+        self.assertIs(self.translate(q), self.translate(q))
+
+    # translated queries run, and column names are lower case unless quoted
+    def testRun(self):
+        rows = self.query("SELECT _Marker_key::text AS \"Key\", symbol FROM MRK_Marker "
+            "WHERE symbol ILIKE 'kit%' ORDER BY _Marker_key LIMIT ALL")
+        self.assertEqual(rows, [{'Key' : '2', 'symbol' : 'Kit'}, {'Key' : '3', 'symbol' : 'kitl'}])
+        rows = self.query("SELECT STRING_AGG(symbol, ',') AS s, now() IS NOT NULL AS n FROM "
+            "(SELECT symbol FROM MRK_Marker ORDER BY _marker_key)", rows='tuple')
+        self.assertEqual([tuple(r) for r in rows], [('Pax6,Kit,kitl', 1)])
+
+    def testMissingDatabase(self):
+        self.assertRaises(RuntimeError, db.SqliteBackend, os.path.join(self.dir, 'none.sqlite'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+#
+# test_dumpMgiItemXml.py
+#
+# Whole runs of dumpMgiItemXml.py against the fixture database (see fixture.py).
+#
+
+import os
+import re
+import json
+import pickle
+import unittest
+from libdump.tests.fixture import rootDir, scratchDir, fixtureCopy, runDumper, outputs
+
+def loadIdMap(dir):
+    with open(os.path.join(dir, '.idmap.pkl'), 'rb') as fd:
+        return pickle.load(fd)
+
+# the number of keys mapped by content (bytes keys, see DumperContext.contentKey)
+def nContentKeys(state):
+    return sum([len([k for k in t.other if type(k) is bytes]) for t in state['ids'].types.values()])
+
+# the items in the output files in dir, as id -> (class, body)
+def items(dir):
+    found = {}
+    for data in outputs(dir).values():
+        for c, id, body in re.findall(rb'<item class="([^"]*)" id="([^"]*)">(.*?)</item>', data, re.S):
+            found[id.decode()] = (c.decode(), body)
+    return found
+
+# the ids of the items in found with a reference named name to one of ids
+def referring(found, name, ids):
+    refs = set([('<reference name="%s" ref_id="%s"/>' % (name, id)).encode() for id in ids])
+    return set([id for id, (c, body) in found.items() if any([r in body for r in refs])])
+
+class DumperRunTest(unittest.TestCase):
+    # Generated items are only keyed by content if a later run needs their ids.
+    def testContentKeys(self):
+        plain = scratchDir()
+        self.assertEqual(runDumper(plain), 0)
+        state = loadIdMap(plain)
+        self.assertFalse(state['contentKeys'])
+        self.assertEqual(nContentKeys(state), 0)
+        kept = scratchDir()
+        self.assertEqual(runDumper(kept, '--keep-idmap'), 0)
+        state = loadIdMap(kept)
+        self.assertTrue(state['contentKeys'])
+        self.assertGreater(nContentKeys(state), 0)
+        # the same output either way
+        self.assertEqual(outputs(plain), outputs(kept))
+
+    # A snapshot's results are only cached if a cache directory is given, and the
+    # cache is kept outside the output directory, for reruns writing to a new one.
+    def testQueryCache(self):
+        out = scratchDir()
+        self.assertEqual(runDumper(out), 0)
+        self.assertFalse(os.path.exists(os.path.join(out, '.querycache')))
+        self.assertFalse(os.path.exists(os.path.join(rootDir(), 'cache')))
+        cache = os.path.join(scratchDir(), 'querycache')
+        first, second = scratchDir(), scratchDir()
+        self.assertEqual(runDumper(first, '--cache-dir', cache), 0)
+        self.assertEqual(runDumper(second, '--cache-dir', cache), 0)
+        self.assertEqual(sorted(os.listdir(first)), sorted(os.listdir(out)))
+        with open(os.path.join(second, 'metrics.json')) as fd:
+            stats = json.load(fd)['run']['queryCache']
+        self.assertGreater(stats['hits'], 0)
+        self.assertEqual(stats['misses'], 0)
+        self.assertEqual(outputs(first), outputs(second))
+        self.assertEqual(outputs(out), outputs(second))
+
+    # A run stopped by a failing dumper, then resumed from its last checkpoint, gives the
+    # same output as one that ran straight through.
+    def testResume(self):
+        broken, conn = fixtureCopy()
+        conn.execute('DROP TABLE GXD_HTExperiment')
+        conn.commit()
+        conn.close()
+        for args in [[], ['--compress', 'gzip'], ['-j', '3']]:
+            whole, resumed = scratchDir(), scratchDir()
+            self.assertEqual(runDumper(whole, *args), 0)
+            self.assertNotEqual(runDumper(resumed, *args, db=broken), 0)
+            self.assertTrue(os.path.exists(os.path.join(resumed, '.checkpoint', 'state.pkl')))
+            self.assertEqual(runDumper(resumed, '--resume', resumed, *args), 0)
+            with open(os.path.join(resumed, 'dump.log')) as fd:
+                self.assertIn('Resuming from checkpoint', fd.read())
+            self.assertFalse(os.path.exists(os.path.join(resumed, '.checkpoint')))
+            self.assertEqual(sorted(os.listdir(resumed)), sorted(os.listdir(whole)))
+            self.assertEqual(outputs(resumed), outputs(whole))
+
+    # A delta dump after an allele is deleted and another changed: the changed one and the
+    # items dumped again keep their ids, and exactly the deleted allele and its
+    # annotations are listed as deleted.
+    def testSince(self):
+        base, delta = scratchDir(), scratchDir()
+        self.assertEqual(runDumper(base, '--keep-idmap'), 0)
+        path, conn = fixtureCopy()
+        mgitype = conn.execute("SELECT _mgitype_key FROM ACC_MGIType WHERE name = 'Allele'").fetchone()[0]
+        # alleles in no genotype, so nothing else refers to them
+        gone, changed = [r[0] for r in conn.execute('''
+            SELECT _allele_key FROM ALL_Allele
+            WHERE _allele_key NOT IN (SELECT _allele_key FROM GXD_AlleleGenotype)
+            ORDER BY _allele_key
+            LIMIT 2''')]
+        annots = '''(SELECT _annot_key FROM VOC_Annot
+            WHERE _object_key = %d
+            AND _annottype_key IN (SELECT _annottype_key FROM VOC_AnnotType WHERE _mgitype_key = %d))''' % (gone, mgitype)
+        conn.execute("UPDATE MGI_dbinfo SET lastdump_date = '2026-10-08 04:00:00'")
+        conn.execute('DELETE FROM VOC_Evidence WHERE _annot_key IN ' + annots)
+        conn.execute('DELETE FROM VOC_Annot WHERE _annot_key IN ' + annots)
+        conn.execute('DELETE FROM MGI_Reference_Assoc WHERE _object_key = ? AND _mgitype_key = ?', (gone, mgitype))
+        conn.execute('DELETE FROM ALL_Allele WHERE _allele_key = ?', (gone,))
+        conn.execute("UPDATE ALL_Allele SET modification_date = '2026-10-05 00:00:00', name = name || ' x' WHERE _allele_key = ?", (changed,))
+        conn.commit()
+        conn.close()
+        self.assertEqual(runDumper(delta, '--since', base, db=path), 0)
+        before, after = items(base), items(delta)
+        alleles = loadIdMap(base)['ids'].get(mgitype)
+        goneId = '%d_%d' % (mgitype, alleles.get(gone))
+        changedId = '%d_%d' % (mgitype, alleles.get(changed))
+        annotIds = referring(before, 'subject', [goneId])
+        self.assertGreater(len(annotIds), 0)
+        expected = set([goneId]) | annotIds | referring(before, 'annotation', annotIds)
+        with open(os.path.join(delta, 'DeletedItems.txt')) as fd:
+            deleted = [l.split('\t')[0] for l in fd]
+        self.assertEqual(sorted(deleted), sorted(expected))
+        # no new ids; the items dumped again are as before, but for the changed allele
+        # (and the data sources, whose descriptions carry the dump date)
+        self.assertEqual(set(after) - set(before), set())
+        self.assertIn(changedId, after)
+        self.assertNotEqual(after[changedId], before[changedId])
+        self.assertEqual(set([id for id, (c, body) in after.items() if c != 'DataSource' and body != before[id][1]]), set([changedId]))
+
+    # Two runs with the same stable ids file give the same output, the second adding no ids.
+    def testStableIds(self):
+        ids = os.path.join(scratchDir(), 'ids.pkl')
+        first, second = scratchDir(), scratchDir()
+        self.assertEqual(runDumper(first, '--stable-ids', ids), 0)
+        self.assertEqual(runDumper(second, '--stable-ids', ids, '-j', '3'), 0)
+        with open(os.path.join(second, 'dump.log')) as fd:
+            self.assertIn('(0 new ids)', fd.read())
+        self.assertEqual(outputs(first), outputs(second))
+
+if __name__ == '__main__':
+    unittest.main()
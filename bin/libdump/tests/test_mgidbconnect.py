@@ -0,0 +1,54 @@
+#
+# test_mgidbconnect.py
+#
+
+import datetime
+import decimal
+import unittest
+from libdump import mgidbconnect as db
+
+class CopyParserTest(unittest.TestCase):
+    def parse(self, line, types):
+        return db._copyLineParser([db.COPY_CONVERTERS[t] for t in types])(line)
+
+    def testPlain(self):
+        self.assertEqual(self.parse('12\tabc\tt\t1.5', [23, 25, 16, 1700]),
+            [12, 'abc', True, decimal.Decimal('1.5')])
+        self.assertEqual(self.parse('2026-10-08\t2026-10-08 12:30:00\tf', [1082, 1114, 16]),
+            [datetime.date(2026, 10, 8), datetime.datetime(2026, 10, 8, 12, 30), False])
+
+    def testNull(self):
+        self.assertEqual(self.parse('\\N\t\\N\t', [23, 25, 25]), [None, None, ''])
+        # not NULL once other escapes are in the line
+        self.assertEqual(self.parse('\\N\ta\\tb', [25, 25]), [None, 'a\tb'])
+
+    # an escaped backslash followed by N is the text \N, not NULL
+    def testEscapedNull(self):
+        self.assertEqual(self.parse('\\\\N\t\\N', [25, 25]), ['\\N', None])
+
+    def testEscapes(self):
+        self.assertEqual(self.parse('a\\tb\\nc\\rd\\\\e', [25]), ['a\tb\nc\rd\\e'])
+        self.assertEqual(self.parse('\\b\\f\\v', [25]), ['\b\f\v'])
+        # any other escaped character is the character itself
+        self.assertEqual(self.parse('\\"\\q', [25]), ['"q'])
+
+    def testOctalAndHex(self):
+        self.assertEqual(self.parse('\\11x\\101\\0', [25]), ['\tx' + 'A' + '\0'])
+        # at most three octal digits
+        self.assertEqual(self.parse('\\1011', [25]), ['A1'])
+        self.assertEqual(self.parse('\\x41\\x9z', [25]), ['A\tz'])
+
+    # escapes in a converted column are unescaped before conversion
+    def testEscapedConverted(self):
+        self.assertEqual(self.parse('\\061\\062\t\\x31.5', [23, 701]), [12, 1.5])
+
+    def testSink(self):
+        lines = []
+        sink = db._CopySink(lines.append)
+        for data in ['a\tb\n', 'c\t', 'd\ne\tf\ng', '\th\n']:
+            sink.write(data)
+        self.assertEqual(lines, ['a\tb', 'c\td', 'e\tf', 'g\th'])
+        self.assertEqual(sink.nBytes, 16)
+
+if __name__ == '__main__':
+    unittest.main()
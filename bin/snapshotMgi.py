@@ -0,0 +1,60 @@
+#
+# snapshotMgi.py
+#
+# Usage:
+#       % python snapshotMgi.py [-p PROPERTIES] [--source NAME] FILE
+#       % python snapshotMgi.py [-p PROPERTIES] [--source NAME] --dir DIR
+#
+# Copies the MGI tables and columns the dumpers read (see libdump/mgischema.py) from
+# the MGI Postgres database to a local SQLite file, which dumpMgiItemXml.py can then
+# read with --sqlite FILE: dumps can be rerun at local disk speed, without network
+# round trips or load on the shared MGI server. See libdump/Snapshot.py.
+#
+# The new snapshot is checked against every dumper's queries before FILE is replaced;
+# if a query reads a column mgischema.py misses, the script fails, listing them.
+#
+# With --dir, the snapshot is kept in DIR per MGI dump date, as dumpMgiItemXml.py
+# --snapshot DIR does: it is only taken if DIR has none for the database's current
+# dump date, and older ones are removed. Otherwise FILE is replaced.
+#
+# Options:
+#       -p, --properties FILE  the connection to copy from (default: as the dumper)
+#       --source NAME          the data source in the properties file
+#       --dir DIR              keep the snapshot in DIR, per dump date
+#
+
+import sys
+import os
+import getopt
+
+from libdump import mgidbconnect as db
+from libdump import Snapshot
+
+def main():
+    opts, args = getopt.getopt(sys.argv[1:], 'p:', ['properties=', 'source=', 'dir='])
+    pfile = "~/.intermine/mousemine.properties"
+    source = None
+    dir = None
+    for o, v in opts:
+        if o in ('-p', '--properties'):
+            pfile = v
+        elif o == '--source':
+            source = v
+        elif o == '--dir':
+            dir = v
+    if len(args) != (0 if dir else 1):
+        sys.stderr.write('Usage: python snapshotMgi.py [-p PROPERTIES] [--source NAME] (FILE | --dir DIR)\n')
+        sys.exit(2)
+    db.setConnectionFromPropertiesFile(source, pfile)
+    if dir:
+        print(Snapshot.snapshotFor(dir))
+        return
+    pool = db.ConnectionPool(1)
+    try:
+        Snapshot.takeSnapshot(args[0], pool)
+    finally:
+        pool.closeAll()
+
+#
+if __name__ == '__main__':
+    main()